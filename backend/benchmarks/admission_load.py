@@ -0,0 +1,116 @@
+"""
+Load test for render admission control.
+
+Fires bursts of concurrent requests at a synthetic rendering route that holds
+--render-mb of memory for --render-seconds, once gated by the admission
+controller and once
+ungated, and prints status codes, latency and peak RSS for each. With the gate
+peak RSS stays near the budget and excess load gets 503 + Retry-After; without
+it RSS grows with concurrency.
+
+    cd backend
+    python -m benchmarks.admission_load --concurrency 4 16 64
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from fastapi import Depends, FastAPI, Response
+from starlette.concurrency import run_in_threadpool
+
+from utils.admission import (
+    AdmissionRejected,
+    RenderAdmissionController,
+    current_rss_mb,
+    get_render_admission,
+    peak_rss_mb,
+    render_admission,
+)
+
+
+def synthetic_render(render_mb: int, render_seconds: float) -> int:
+    buffer = bytearray(render_mb * 1024 * 1024)
+    # Touch every page so the allocation is resident
+    for i in range(0, len(buffer), 4096):
+        buffer[i] = 1
+    time.sleep(render_seconds)
+    return len(buffer)
+
+
+def build_app(args) -> FastAPI:
+    app = FastAPI()
+
+    @app.exception_handler(AdmissionRejected)
+    async def rejected(request, exc: AdmissionRejected):
+        return Response(status_code=503, headers={"Retry-After": str(exc.retry_after)})
+
+    @app.get("/gated")
+    async def gated(
+        admission: RenderAdmissionController = Depends(get_render_admission),
+    ):
+        await admission.run(synthetic_render, args.render_mb, args.render_seconds)
+        return {"ok": True}
+
+    @app.get("/ungated")
+    async def ungated():
+        await run_in_threadpool(synthetic_render, args.render_mb, args.render_seconds)
+        return {"ok": True}
+
+    return app
+
+
+async def burst(app: FastAPI, path: str, concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=120
+    ) as client:
+
+        async def one():
+            started = time.perf_counter()
+            response = await client.get(path)
+            return response.status_code, time.perf_counter() - started
+
+        rss_before = current_rss_mb()
+        results = await asyncio.gather(*(one() for _ in range(concurrency)))
+
+    latencies = sorted(seconds for _, seconds in results)
+    codes = {}
+    for code, _ in results:
+        codes[code] = codes.get(code, 0) + 1
+    return {
+        "path": path,
+        "concurrency": concurrency,
+        "codes": codes,
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1),
+        "rss_before_mb": round(rss_before, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+async def main(args):
+    render_admission.memory_budget_mb = args.budget_mb
+    render_admission.min_per_render_mb = args.render_mb
+    render_admission.per_render_mb = args.render_mb
+    render_admission.max_queue = args.queue
+    render_admission.queue_timeout = args.queue_timeout
+    app = build_app(args)
+    # Gated first: ru_maxrss never goes down, so the ungated run must be last
+    for path in ("/gated", "/ungated"):
+        for concurrency in args.concurrency:
+            print(await burst(app, path, concurrency))
+    print(render_admission.snapshot())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--render-mb", type=int, default=64)
+    parser.add_argument("--render-seconds", type=float, default=0.2)
+    parser.add_argument("--budget-mb", type=float, default=256)
+    parser.add_argument("--queue", type=int, default=8)
+    parser.add_argument("--queue-timeout", type=float, default=2)
+    asyncio.run(main(parser.parse_args()))
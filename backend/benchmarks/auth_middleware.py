@@ -0,0 +1,171 @@
+"""
+Benchmark for the authentication middleware.
+
+Drives / (excluded from auth) and /stats through main:app against
+benchmarks.fake_supabase, once with AuthMiddleware and once with the
+@app.middleware("http") function it replaced, rebuilt here unchanged.
+Each runs with the real verify_token, which asks Supabase for the user on
+every request, and with a verifier that caches it per token, as a sync
+function and as a coroutine function.
+
+    cd backend
+    python -m benchmarks.auth_middleware --requests 300 --concurrency 1 10
+"""
+
+import argparse
+import asyncio
+import re
+import time
+
+import httpx
+from fastapi import HTTPException
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from benchmarks.fake_supabase import seed
+from benchmarks.run import AUTH, SIZES, bench_route, start_backend
+
+
+def legacy_jwt_middleware(verifier):
+    """jwt_middleware as it was, with the verifier swappable."""
+    from utils.helpers import failure_response
+    from utils.timing import span
+
+    async def jwt_middleware(request, call_next):
+        excluded_paths = [
+            "/open-route",
+            "/docs",
+            "/openapi.json",
+            "/",
+            "/env-check",
+            "/v1/register",
+            "/login",
+        ]
+        wildcard_excluded_paths = ["/static/*"]
+
+        if request.method.lower() == "options":
+            return await call_next(request)
+
+        auth_header = request.headers.get("Authorization")
+
+        if request.url.path in excluded_paths:
+            return await call_next(request)
+
+        if any(
+            re.match(pattern, request.url.path) for pattern in wildcard_excluded_paths
+        ):
+            return await call_next(request)
+
+        if auth_header is None or not auth_header.startswith("Bearer "):
+            return failure_response("Access denied", {}, 401)
+
+        token = auth_header.split(" ")[1]
+        try:
+            with span("auth"):
+                user = verifier(token)
+            request.state.user = user["decoded_token"]
+            request.state.authenticated_client = user["authenticated_client"]
+        except HTTPException as e:
+            return failure_response(e.detail, status_code=e.status_code)
+
+        return await call_next(request)
+
+    return jwt_middleware
+
+
+def caching_verifiers(verify_token, ttl: float):
+    """A sync and an async verifier sharing one per-token cache."""
+    cache = {}
+
+    def cached(token):
+        hit = cache.get(token)
+        if hit is not None and time.monotonic() - hit[0] < ttl:
+            return hit[1]
+        user = verify_token(token)
+        cache[token] = (time.monotonic(), user)
+        return user
+
+    async def cached_async(token):
+        hit = cache.get(token)
+        if hit is not None and time.monotonic() - hit[0] < ttl:
+            return hit[1]
+        return await asyncio.to_thread(cached, token)
+
+    return cached, cached_async
+
+
+async def main(args):
+    fake, app_module = start_backend(args.latency_ms)
+    size = SIZES[args.size]
+    fake.load(seed(size["orders"], size["items"], size["customers"]))
+
+    from utils.auth import AuthMiddleware
+    from utils.helpers import verify_token
+
+    app = app_module.app
+    slot = next(
+        index
+        for index, middleware in enumerate(app.user_middleware)
+        if middleware.cls is AuthMiddleware
+    )
+    exclusions = app.user_middleware[slot].kwargs
+    cached, cached_async = caching_verifiers(verify_token, args.cache_ttl)
+
+    variants = [
+        (
+            "legacy",
+            "verify_token",
+            Middleware(
+                BaseHTTPMiddleware, dispatch=legacy_jwt_middleware(verify_token)
+            ),
+        ),
+        (
+            "asgi",
+            "verify_token",
+            Middleware(AuthMiddleware, verifier=verify_token, **exclusions),
+        ),
+        (
+            "legacy",
+            "cached",
+            Middleware(BaseHTTPMiddleware, dispatch=legacy_jwt_middleware(cached)),
+        ),
+        ("asgi", "cached", Middleware(AuthMiddleware, verifier=cached, **exclusions)),
+        (
+            "asgi",
+            "cached async",
+            Middleware(AuthMiddleware, verifier=cached_async, **exclusions),
+        ),
+    ]
+    routes = [("root", "GET", "/", None, {}), ("stats", "GET", "/stats", None, AUTH)]
+
+    print(
+        f"{'middleware':<11}{'verifier':<14}{'route':<7}{'conc':>5}"
+        f"{'p50 ms':>9}{'p99 ms':>9}{'rps':>9}{'err':>5}"
+    )
+    for kind, verifier_name, middleware in variants:
+        app.user_middleware[slot] = middleware
+        app.middleware_stack = None
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", timeout=300
+        ) as client:
+            for route in routes:
+                for concurrency in args.concurrency:
+                    result = await bench_route(
+                        client, route, args.requests, concurrency
+                    )
+                    print(
+                        f"{kind:<11}{verifier_name:<14}{route[0]:<7}{concurrency:>5}"
+                        f"{result['p50_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+                        f"{result['throughput_rps']:>9.0f}{result['errors']:>5}"
+                    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", default="small", choices=SIZES)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--latency-ms", type=float, default=5)
+    parser.add_argument("--cache-ttl", type=float, default=60)
+    asyncio.run(main(parser.parse_args()))
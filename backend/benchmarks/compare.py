@@ -0,0 +1,36 @@
+"""
+Compare two benchmarks.run result files route by route.
+
+    python -m benchmarks.compare /tmp/bench-old.json /tmp/bench-new.json
+"""
+
+import argparse
+import json
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "peak_rss_growth_mb")
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        data = json.load(f)
+    return {(run["size"], run["route"]): run for run in data["runs"]}, data
+
+
+def main(args):
+    before, before_meta = load(args.before)
+    after, after_meta = load(args.after)
+    print(f"{before_meta['revision']} -> {after_meta['revision']}")
+    for key in sorted(before.keys() & after.keys()):
+        cells = []
+        for metric in METRICS:
+            old, new = before[key][metric], after[key][metric]
+            change = (new - old) / old * 100 if old else 0.0
+            cells.append(f"{metric} {old}->{new} ({change:+.1f}%)")
+        print(f"{key[0]:<7} {key[1]:<22} " + "  ".join(cells))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    main(parser.parse_args())
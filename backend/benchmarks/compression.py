@@ -0,0 +1,145 @@
+"""
+Benchmark for response compression: CPU spent against bytes saved.
+
+Fetches real response bodies from the app against benchmarks.fake_supabase
+(/stats, a 100-row /orders page, a year of daily /stats/series and the CSV,
+NDJSON and XLSX exports for one financial year), then times compressing each
+with gzip and Brotli at several levels. Streamed exports are compressed the
+way CompressionMiddleware does it, flushing after every chunk.
+
+For each body and setting it prints the compressed size, the CPU time and
+how long the saved bytes would take to send at --mbps, so the two can be
+compared directly. XLSX is included to show why it is left alone.
+
+    cd backend
+    python -m benchmarks.compression --size medium --mbps 10
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import date, timedelta
+
+from benchmarks.run import SIZES, start_backend
+from benchmarks.fake_supabase import seed
+
+SETTINGS = [
+    ("gzip", 1),
+    ("gzip", 6),
+    ("gzip", 9),
+    ("br", 1),
+    ("br", 4),
+    ("br", 6),
+    ("br", 9),
+]
+
+
+async def fetch_chunks(app, url: str) -> list:
+    """The body messages the app sends for url, before any compression."""
+    path, _, query = url.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "server": ("bench", 80),
+        "client": ("127.0.0.1", 1234),
+        "root_path": "",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "headers": [
+            (b"authorization", b"Bearer bench"),
+            (b"accept-encoding", b"identity"),
+        ],
+    }
+    chunks = []
+    requests = [{"type": "http.request", "body": b"", "more_body": False}]
+    done = asyncio.Event()
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start" and message["status"] != 200:
+            raise RuntimeError(f"{url}: HTTP {message['status']}")
+        if message["type"] == "http.response.body" and message.get("body"):
+            chunks.append(message["body"])
+
+    await app(scope, receive, send)
+    done.set()
+    return chunks
+
+
+def fetch_bodies(app, fy: str) -> list:
+    """(label, chunks) per endpoint, chunks as the app streams them."""
+    to_date = date.today()
+    from_date = to_date - timedelta(days=364)
+    return [
+        (label, asyncio.run(fetch_chunks(app, url)))
+        for label, url in [
+            ("stats", "/stats"),
+            ("orders page 100", "/orders?limit=100"),
+            ("stats/series 365d", f"/stats/series?from={from_date}&to={to_date}"),
+            ("export csv", f"/export/orders?fy={fy}&format=csv"),
+            ("export ndjson", f"/export/orders?fy={fy}&format=ndjson"),
+            ("export xlsx", f"/export/orders?fy={fy}&format=xlsx"),
+        ]
+    ]
+
+
+def compress(encoder_class, level: int, chunks: list) -> int:
+    encoder = encoder_class(level)
+    size = 0
+    for index, chunk in enumerate(chunks):
+        size += len(encoder.compress(chunk, final=index == len(chunks) - 1))
+    return size
+
+
+def main(args):
+    fake, _ = start_backend(0)
+    size = SIZES[args.size]
+    fake.load(seed(size["orders"], size["items"], size["customers"]))
+
+    import main as app_module
+    from utils.compression import ENCODERS, brotli
+
+    bodies = fetch_bodies(app_module.app, args.fy)
+    bytes_per_ms = args.mbps * 1e6 / 8 / 1000
+
+    print(
+        f"{'payload':<19}{'chunks':>7}{'bytes':>10}  {'setting':<8}"
+        f"{'out':>9}{'ratio':>7}{'cpu ms':>9}{'saved ms':>10}"
+        f"   (saved ms = send time at {args.mbps:g} Mbit/s)"
+    )
+    for label, chunks in bodies:
+        total = sum(len(chunk) for chunk in chunks)
+        for coding, level in SETTINGS:
+            if coding == "br" and brotli is None:
+                continue
+            runs = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                out = compress(ENCODERS[coding], level, chunks)
+                runs.append((time.perf_counter() - started) * 1000)
+            print(
+                f"{label:<19}{len(chunks):>7}{total:>10}  {f'{coding}-{level}':<8}"
+                f"{out:>9}{total / out:>7.1f}{min(runs):>9.2f}"
+                f"{(total - out) / bytes_per_ms:>10.2f}"
+            )
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", default="medium", choices=SIZES)
+    parser.add_argument("--fy", default="2025-26", help="Financial year to export")
+    parser.add_argument(
+        "--mbps", type=float, default=10, help="Client bandwidth, megabits/s"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,171 @@
+"""
+Benchmark for the /customers/search index.
+
+Builds a CustomerSearchIndex over --customers synthetic customers and times
+typical autocomplete queries against it, next to a linear substring scan of
+the same rows (what an ilike over five columns costs without an index, minus
+the network). Also reports build time, memory held by the index and the cost
+of an incremental refresh.
+
+    cd backend
+    python -m benchmarks.customer_search --customers 100000
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+import tracemalloc
+
+from utils.customer_search import CustomerSearchIndex, normalize
+
+FIRST = (
+    "Aarav Vivaan Aditya Vihaan Arjun Sai Reyansh Ayaan Krishna Ishaan Ananya "
+    "Diya Aadhya Saanvi Pari Myra Anika Navya Kiara Riya Rahul Priya Amit Neha "
+    "Suresh Ramesh Mahesh Sunita Kavita Deepak Manoj Pooja Sanjay Vikram"
+).split()
+LAST = (
+    "Shah Patel Mehta Desai Joshi Sharma Verma Gupta Agarwal Jain Reddy Nair "
+    "Iyer Rao Kulkarni Deshpande Pillai Menon Singh Kapoor Malhotra Chopra "
+    "Bose Das Ghosh Mukherjee Banerjee Naidu Chauhan Thakur"
+).split()
+BUSINESS = (
+    "Glass Mirrors Interiors Traders Enterprises Glazing Aluminium Fabricators "
+    "Builders Decor Solutions Industries Architects Constructions Furnishings"
+).split()
+SUFFIX = ("Pvt Ltd", "LLP", "& Sons", "& Co", "Agencies", "")
+
+
+def synthetic_customers(count: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    rows = []
+    for i in range(1, count + 1):
+        first, last = rng.choice(FIRST), rng.choice(LAST)
+        company = None
+        if rng.random() < 0.7:
+            company = " ".join(
+                part
+                for part in (
+                    rng.choice((last, first, rng.choice(LAST))),
+                    rng.choice(BUSINESS),
+                    rng.choice(SUFFIX),
+                )
+                if part
+            )
+        rows.append(
+            {
+                "id": i,
+                "name": f"{first} {last}",
+                "company_name": company,
+                "gstin": f"{rng.randint(1, 37):02d}ABCDE{i % 10000:04d}F1Z{i % 10}",
+                "phone": f"0{rng.randint(20, 99)}-{rng.randint(1000000, 9999999)}",
+                "mobile": f"+91 {rng.randint(6000000000, 9999999999)}",
+                "updated_at": f"2025-01-01T00:00:00.{i:06d}+00:00",
+            }
+        )
+    return rows
+
+
+def sample_queries(rows: list, rng: random.Random, per_kind: int) -> dict:
+    picks = [rng.choice(rows) for _ in range(per_kind)]
+    return {
+        "1 char": [rng.choice("abcdefghijklmnoprstv") for _ in picks],
+        "3 char prefix": [row["name"][:3] for row in picks],
+        "full name": [row["name"] for row in picks],
+        "two words": [
+            f"{row['name'].split()[0][:4]} {(row['company_name'] or row['name']).split()[-1][:3]}"
+            for row in picks
+        ],
+        "gstin prefix": [row["gstin"][:6] for row in picks],
+        "mobile digits": [row["mobile"][4:10] for row in picks],
+        "no match": ["zzqx" for _ in picks],
+    }
+
+
+def linear_search(rows: list, query: str, limit: int) -> list:
+    needle = normalize(query)
+    matches = []
+    for row in rows:
+        for column in ("name", "company_name", "gstin", "phone", "mobile"):
+            if needle in normalize(row.get(column)):
+                matches.append(row)
+                break
+        if len(matches) >= limit:
+            break
+    return matches
+
+
+def timed(func, queries: list) -> list:
+    times = []
+    for query in queries:
+        started = time.perf_counter()
+        func(query)
+        times.append((time.perf_counter() - started) * 1000)
+    return sorted(times)
+
+
+def percentile(values: list, fraction: float) -> float:
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def main(args):
+    rng = random.Random(11)
+    rows = synthetic_customers(args.customers)
+
+    # Memory is measured on a separate build, tracing slows it down a lot.
+    # The rows are decoded inside the trace, as from a response, so the
+    # values the index keeps are counted
+    encoded = json.dumps(rows)
+    tracemalloc.start()
+    probe = CustomerSearchIndex()
+    probe.build([json.loads(encoded)])
+    held_mb = tracemalloc.get_traced_memory()[0] / 1e6
+    tracemalloc.stop()
+    estimated_mb = probe.size / 1e6
+    del probe
+
+    index = CustomerSearchIndex()
+    started = time.perf_counter()
+    index.build([rows])
+    build_seconds = time.perf_counter() - started
+    print(
+        f"{args.customers} customers: built in {build_seconds:.2f}s, "
+        f"{len(index.postings)} grams, index holds {held_mb:.0f} MB "
+        f"(size estimate {estimated_mb:.0f} MB)"
+    )
+
+    changed = [dict(row, name=f"{row['name']} Renamed") for row in rows[:100]]
+    started = time.perf_counter()
+    index.upsert(changed)
+    print(
+        f"incremental upsert of {len(changed)} rows: "
+        f"{(time.perf_counter() - started) * 1000:.1f} ms"
+    )
+
+    print(
+        f"\n{'query':<16}{'index p50':>11}{'index p99':>11}"
+        f"{'scan p50':>11}{'hits':>7}  (ms, limit {args.limit})"
+    )
+    for kind, queries in sample_queries(rows, rng, args.queries).items():
+        index_ms = timed(lambda q: index.search(q, args.limit), queries)
+        scan_ms = timed(
+            lambda q: linear_search(rows, q, args.limit), queries[: args.scan_queries]
+        )
+        hits = statistics.mean(len(index.search(q, args.limit)) for q in queries)
+        print(
+            f"{kind:<16}{percentile(index_ms, 0.5):>11.3f}"
+            f"{percentile(index_ms, 0.99):>11.3f}"
+            f"{percentile(scan_ms, 0.5):>11.1f}{hits:>7.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--customers", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500, help="Per query kind")
+    parser.add_argument(
+        "--scan-queries", type=int, default=20, help="Per kind, for the linear scan"
+    )
+    parser.add_argument("--limit", type=int, default=10)
+    main(parser.parse_args())
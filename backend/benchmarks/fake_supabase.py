@@ -0,0 +1,637 @@
+"""
+In-memory stand-in for the parts of Supabase the backend talks to:
+
+- PostgREST: GET /rest/v1/<table> with select (including nested and !inner
+  embeds, and filters on embedded columns),
+  eq/neq/gt/gte/lt/lte/in/is/ilike filters (timestamps compared as
+  instants), or/and trees, order,
+  limit/offset and Prefer: count=...; POST /rest/v1/<table> inserts and
+  upserts (on_conflict); POST /rest/v1/rpc/<fn>
+- GoTrue: GET /auth/v1/user and POST /auth/v1/token (password and
+  refresh_token grants)
+
+Data comes from seed() and every response can be delayed by a fixed latency
+to mimic the network hop to Supabase. serve() runs it on a local port in a
+background thread so the sync supabase-py client can reach it.
+"""
+
+import asyncio
+import random
+import re
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+
+# (parent, embedded) -> (kind, parent column, embedded column)
+RELATIONS = {
+    ("orders", "proforma_invoices"): ("one", "id", "order_id"),
+    ("orders", "customers"): ("one", "customer_id", "id"),
+    ("orders", "order_metrics"): ("one", "id", "order_id"),
+    ("order_view", "customers"): ("one", "customer_id", "id"),
+    ("proforma_invoices", "orders"): ("one", "order_id", "id"),
+    ("proforma_invoices", "customers"): ("one", "customer_id", "id"),
+    ("proforma_invoices", "users"): ("one", "created_by", "id"),
+    ("proforma_invoices", "proforma_items"): ("many", "id", "proforma_invoice_id"),
+    ("proforma_invoices", "proforma_additional_costs"): (
+        "many",
+        "id",
+        "proforma_invoice_id",
+    ),
+    ("proforma_additional_costs", "additional_costs_master"): (
+        "one",
+        "cost_type_id",
+        "id",
+    ),
+    ("proforma_items", "products"): ("one", "product_id", "id"),
+    ("proforma_items", "thickness_master"): ("one", "thickness_id", "id"),
+}
+
+TEST_USER = {
+    "id": "00000000-0000-0000-0000-000000000001",
+    "aud": "authenticated",
+    "role": "authenticated",
+    "email": "bench@example.com",
+    "app_metadata": {"provider": "email", "role": "admin"},
+    "user_metadata": {},
+    "created_at": "2024-01-01T00:00:00+00:00",
+    "identities": [
+        {
+            "id": "00000000-0000-0000-0000-000000000001",
+            "identity_id": "00000000-0000-0000-0000-000000000002",
+            "user_id": "00000000-0000-0000-0000-000000000001",
+            "identity_data": {"email": "bench@example.com", "full_name": "Bench"},
+            "provider": "email",
+            "created_at": "2024-01-01T00:00:00+00:00",
+        }
+    ],
+}
+
+
+def seed(orders: int = 100, items_per_order: int = 20, customers: int = 50) -> dict:
+    """
+    Build a consistent data set. Orders are spread over the last 15 months so
+    /stats sees history.
+    """
+    rng = random.Random(42)
+    now = datetime.now(timezone.utc)
+    db = {
+        "company_master": [
+            {
+                "id": 1,
+                "company_name": "Bench Glass Pvt. Ltd.",
+                "address": "1 Bench Road",
+                "mobile_nos": ["9999999999"],
+                "email_id": "office@example.com",
+                "gst_no": "27AAAAA0000A1Z5",
+                "pan_no": "AAAAA0000A",
+                "logo": None,
+                "bank_account_name": "Bench Glass",
+                "bank_name": "Bank",
+                "branch": "Main",
+                "bank_account_no": "000111222",
+                "ifsc_code": "BANK0000001",
+                "terms_and_conditions": ["Goods once sold will not be taken back."],
+            }
+        ],
+        "users": [{"id": TEST_USER["id"], "full_name": "Bench User"}],
+        "products": [
+            {"id": i, "name": f"Product {i}", "sku": f"SKU{i}"} for i in range(1, 21)
+        ],
+        "thickness_master": [
+            {"id": i, "name": f"{i} mm", "value": i, "multiplier": 2.5 * i}
+            for i in (4, 5, 6, 8, 10, 12)
+        ],
+        "additional_costs_master": [
+            {"id": 1, "name": "Transport"},
+            {"id": 2, "name": "Packing"},
+        ],
+        "customers": [],
+        "orders": [],
+        "proforma_invoices": [],
+        "proforma_items": [],
+        "proforma_additional_costs": [],
+        "invoice_counters": [],
+        "order_metrics": [],
+    }
+
+    for c in range(1, customers + 1):
+        created = now - timedelta(days=rng.randint(0, 900))
+        db["customers"].append(
+            {
+                "id": c,
+                "name": f"Customer {c}",
+                "company_name": f"Company {c}" if c % 3 else None,
+                "gstin": f"27CUST{c:05d}Z5",
+                "phone": f"02{c:08d}",
+                "mobile": f"9{c:09d}",
+                "email": f"customer{c}@example.com",
+                "address": f"{c} Market Street",
+                "shipping_address": None,
+                "created_at": created.isoformat(),
+                "updated_at": created.isoformat(),
+            }
+        )
+
+    item_id = 1
+    for o in range(1, orders + 1):
+        created = now - timedelta(minutes=rng.randint(0, 60 * 24 * 450))
+        customer_id = rng.randint(1, customers)
+        status = rng.choice(["pending", "confirmed", "delivered", "cancelled"])
+        total = 0.0
+        for n in range(items_per_order):
+            unit = rng.choice(["ft", "inch", "mm"])
+            width = rng.randint(10, 120) if unit != "mm" else rng.randint(300, 2400)
+            height = rng.randint(10, 120) if unit != "mm" else rng.randint(300, 2400)
+            quantity = rng.randint(1, 20)
+            rate = rng.choice([45, 60, 85, 120])
+            amount = round(quantity * rate * 1.5, 2)
+            total += amount
+            db["proforma_items"].append(
+                {
+                    "id": item_id,
+                    "proforma_invoice_id": o,
+                    "customer_order_no": f"{o}-{n + 1}",
+                    "product_id": rng.randint(1, 20),
+                    "thickness_id": rng.choice((4, 5, 6, 8, 10, 12)),
+                    "size_width": width,
+                    "size_height": height,
+                    "size_width_fraction": (
+                        rng.choice(["", "1/2", "1/4"]) if unit == "inch" else ""
+                    ),
+                    "size_height_fraction": "",
+                    "width_rounding_value": (
+                        rng.choice([0, 3, 6]) if unit == "inch" else 0
+                    ),
+                    "height_rounding_value": 0,
+                    "unit": unit,
+                    "quantity": quantity,
+                    "weight": round(rng.uniform(1, 50), 2),
+                    "rate": rate,
+                    "rate_type": "per_sq_ft",
+                    "amount": amount,
+                    "created_at": created.isoformat(),
+                }
+            )
+            item_id += 1
+
+        gst = round(total * 0.18, 2)
+        advance = rng.choice([0, 0, 1000])
+        db["orders"].append(
+            {
+                "id": o,
+                "customer_id": customer_id,
+                "status": status,
+                "active": True,
+                "delivery_date": (created + timedelta(days=7)).isoformat(),
+                "created_at": created.isoformat(),
+                "updated_at": created.isoformat(),
+            }
+        )
+        db["proforma_invoices"].append(
+            {
+                "id": o,
+                "order_id": o,
+                "customer_id": customer_id,
+                "created_by": TEST_USER["id"],
+                "pi_no": f"PI-{o:05d}",
+                "pi_name": f"PI-{o:05d}",
+                "is_gst": True,
+                "total_amount": round(total, 2),
+                "gst_amount": gst,
+                "grand_total": round(total + gst + 500, 2),
+                "has_advanced_payment": advance > 0,
+                "advanced_payment_amount": advance,
+                "advanced_payment_notes": "Advance" if advance else "",
+                "payment_terms": "50% advance",
+                "destination": None,
+                "transport_info": None,
+                "unloading_info": None,
+                "remarks": "",
+                "created_at": created.isoformat(),
+                "updated_at": created.isoformat(),
+            }
+        )
+        db["proforma_additional_costs"].append(
+            {
+                "id": o,
+                "proforma_invoice_id": o,
+                "cost_type_id": 1,
+                "cost_name": "Transport",
+                "amount": 500,
+            }
+        )
+
+    customers_by_id = {c["id"]: c for c in db["customers"]}
+    db["order_view"] = [
+        {
+            **order,
+            "customer_name": customers_by_id[order["customer_id"]]["company_name"]
+            or customers_by_id[order["customer_id"]]["name"],
+            "pi_no": proforma["pi_no"],
+            "grand_total": proforma["grand_total"],
+        }
+        for order, proforma in zip(db["orders"], db["proforma_invoices"])
+    ]
+    return db
+
+
+def _split_top_level(text: str) -> list:
+    parts, depth, current = [], 0, ""
+    for char in text:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        if char == "," and depth == 0:
+            parts.append(current)
+            current = ""
+        else:
+            current += char
+    if current:
+        parts.append(current)
+    return parts
+
+
+def parse_select(select: str) -> list:
+    """
+    Parse a PostgREST select string into [(alias, column, children, inner)]
+    where children is None for plain columns and a nested list for embeds,
+    and inner marks !inner embeds.
+    """
+    select = re.sub(r"\s+", "", select)
+    # Tolerate unbalanced trailing parentheses
+    while select.count(")") > select.count("("):
+        select = select[: select.rindex(")")] + select[select.rindex(")") + 1 :]
+
+    fields = []
+    for part in _split_top_level(select):
+        if not part:
+            continue
+        children = None
+        if "(" in part:
+            head, inner = part.split("(", 1)
+            children = parse_select(inner[: inner.rindex(")")])
+        else:
+            head = part
+        if ":" in head:
+            alias, column = head.split(":", 1)
+        else:
+            alias, column = head.split("!")[0], head
+        column, _, hint = column.partition("!")
+        fields.append((alias, column, children, hint == "inner"))
+    return fields
+
+
+def _coerce(value: str):
+    if value == "true":
+        return True
+    if value == "false":
+        return False
+    if value == "null":
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+
+def _timestamp(value: str):
+    """Aware datetime of an ISO timestamp, naive ones taken as UTC; or None."""
+    if len(value) < 19 or value[4] != "-" or value[10] not in " T":
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _comparable(left, right):
+    # Rows hold UTC ISO strings; filters may be naive (UTC) or carry an offset
+    if isinstance(left, str) and isinstance(right, str):
+        left_time, right_time = _timestamp(left), _timestamp(right)
+        if left_time is not None and right_time is not None:
+            return left_time, right_time
+        return left, right
+    if isinstance(left, str) and isinstance(right, (int, float)):
+        return left, str(right)
+    return left, right
+
+
+def _matches(row: dict, column: str, expression: str) -> bool:
+    negate = expression.startswith("not.")
+    if negate:
+        expression = expression[4:]
+    operator, _, raw = expression.partition(".")
+    value = row.get(column)
+
+    if operator == "in":
+        options = [_coerce(v.strip('"')) for v in raw.strip("()").split(",") if v]
+        result = value in options or str(value) in map(str, options)
+    elif operator == "is":
+        result = value is _coerce(raw) if raw in ("null", "true", "false") else False
+    elif operator in ("ilike", "like"):
+        pattern = re.escape(raw).replace(r"\*", ".*").replace("%", ".*")
+        flags = re.IGNORECASE if operator == "ilike" else 0
+        result = value is not None and re.fullmatch(pattern, str(value), flags)
+    else:
+        expected = _coerce(raw)
+        if value is None:
+            result = operator == "eq" and expected is None
+        else:
+            left, right = _comparable(value, expected)
+            if operator == "eq":
+                result = left == right or str(value) == raw
+            elif operator == "neq":
+                result = not (left == right or str(value) == raw)
+            elif operator == "gt":
+                result = left > right
+            elif operator == "gte":
+                result = left >= right
+            elif operator == "lt":
+                result = left < right
+            elif operator == "lte":
+                result = left <= right
+            else:
+                raise ValueError(f"Unsupported operator {operator}")
+    return bool(result) != negate
+
+
+def _matches_tree(row: dict, operator: str, conditions: str) -> bool:
+    """or=(a.eq.1,and(b.gt.2,c.lt.3)) style logic trees."""
+    results = []
+    for condition in _split_top_level(conditions.strip()[1:-1]):
+        if condition.startswith(("and(", "or(")):
+            name, _, inner = condition.partition("(")
+            results.append(_matches_tree(row, name, "(" + inner))
+            continue
+        column, _, expression = condition.partition(".")
+        operator_name, _, value = expression.partition(".")
+        expression = f"{operator_name}.{value.strip(chr(34))}"
+        results.append(_matches(row, column, expression))
+    return any(results) if operator == "or" else all(results)
+
+
+class FakeSupabase:
+    def __init__(self, db: dict, latency_ms: float = 0.0):
+        self.db = db
+        self.latency_ms = latency_ms
+        self.calls = {}
+        self._indexes = {}
+
+    def load(self, db: dict):
+        self.db = db
+        self._indexes = {}
+
+    def _index(self, table: str, column: str) -> dict:
+        key = (table, column)
+        if key not in self._indexes:
+            index = {}
+            for row in self.db.get(table, []):
+                index.setdefault(row.get(column), []).append(row)
+            self._indexes[key] = index
+        return self._indexes[key]
+
+    def _project(
+        self, table: str, row: dict, fields: list, filters: dict = None, path=()
+    ):
+        """
+        Project a row; filters maps embed paths to (column, expression) lists.
+        Returns None when an !inner embed ends up empty.
+        """
+        filters = filters or {}
+        result = {}
+        for alias, column, children, inner in fields:
+            if children is None:
+                if column == "*":
+                    result.update(row)
+                else:
+                    result[alias] = row.get(column)
+                continue
+            kind, local, remote = RELATIONS[(table, column)]
+            related = self._index(column, remote).get(row.get(local), [])
+            embed_path = path + (alias,)
+            for name, expression in filters.get(embed_path, []):
+                related = [r for r in related if _matches(r, name, expression)]
+            projected = [
+                self._project(column, r, children, filters, embed_path) for r in related
+            ]
+            projected = [p for p in projected if p is not None]
+            if inner and not projected:
+                return None
+            result[alias] = projected if kind == "many" else (projected or [None])[0]
+        return result
+
+    def select(self, table: str, params, prefer: str):
+        rows = self.db.get(table, [])
+        embedded = {}
+        for column, expression in params.multi_items():
+            if column in ("select", "order", "limit", "offset", "on_conflict"):
+                continue
+            if column in ("or", "and"):
+                rows = [row for row in rows if _matches_tree(row, column, expression)]
+                continue
+            if "." in column:
+                *path, name = column.split(".")
+                embedded.setdefault(tuple(path), []).append((name, expression))
+                continue
+            rows = [row for row in rows if _matches(row, column, expression)]
+
+        fields = parse_select(params.get("select", "*"))
+        if embedded or any(field[3] for field in fields):
+            rows = [
+                row
+                for row in rows
+                if self._project(table, row, fields, embedded) is not None
+            ]
+
+        total = len(rows)
+        for clause in reversed(params.get("order", "").split(",")):
+            if not clause:
+                continue
+            column, *modifiers = clause.split(".")
+            rows = sorted(
+                rows,
+                key=lambda r: (r.get(column) is None, r.get(column)),
+                reverse="desc" in modifiers,
+            )
+
+        offset = int(params.get("offset", 0))
+        limit = params.get("limit")
+        rows = rows[offset : offset + int(limit) if limit else None]
+
+        data = [self._project(table, row, fields, embedded) for row in rows]
+        headers = {}
+        if "count=" in prefer:
+            end = offset + len(data) - 1
+            headers["Content-Range"] = f"{offset}-{max(end, offset)}/{total}"
+        return data, headers
+
+    def upsert(self, table: str, rows: list, on_conflict: str) -> list:
+        existing = self.db.setdefault(table, [])
+        columns = [column for column in on_conflict.split(",") if column]
+
+        def key(row):
+            return tuple(row.get(column) for column in columns)
+
+        by_key = {key(row): row for row in existing} if columns else {}
+        for row in rows:
+            current = by_key.get(key(row)) if columns else None
+            if current is not None:
+                current.update(row)
+            else:
+                existing.append(dict(row))
+                if columns:
+                    by_key[key(row)] = existing[-1]
+        self._indexes = {k: v for k, v in self._indexes.items() if k[0] != table}
+        return rows
+
+    def _invoice_counter(self, fy: str) -> dict:
+        counters = self.db.setdefault("invoice_counters", [])
+        for counter in counters:
+            if counter["fy"] == fy:
+                return counter
+        counters.append({"fy": fy, "last_number": 0})
+        return counters[-1]
+
+    def _next_invoice_number(self, fy: str) -> tuple:
+        """get_next_invoice_number: (counter value, formatted number)."""
+        counter = self._invoice_counter(fy)
+        counter["last_number"] += 1
+        return counter["last_number"], f"{fy}/{counter['last_number']:05d}"
+
+    def rpc(self, name: str, body: dict):
+        # Handlers run on the server's event loop, so each call is atomic.
+        # Like the migration, reserve and peek go through get_next_invoice_number
+        if name == "get_next_invoice_number":
+            return self._next_invoice_number(body["fy_param"])[1]
+        if name == "reserve_invoice_numbers":
+            return [
+                dict(
+                    zip(
+                        ("number", "invoice_number"),
+                        self._next_invoice_number(body["fy_param"]),
+                    )
+                )
+                for _ in range(body["block_size"])
+            ]
+        if name == "release_invoice_numbers":
+            counter = self._invoice_counter(body["fy_param"])
+            if counter["last_number"] != body["last_number"]:
+                return False
+            counter["last_number"] = body["first_number"] - 1
+            return True
+        if name == "peek_invoice_number":
+            _, invoice_number = self._next_invoice_number(body["fy_param"])
+            self._invoice_counter(body["fy_param"])["last_number"] -= 1
+            return invoice_number
+        raise KeyError(name)
+
+    def app(self) -> Starlette:
+        async def delay(kind: str):
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+            if self.latency_ms:
+                await asyncio.sleep(self.latency_ms / 1000)
+
+        async def table(request: Request):
+            name = request.path_params["table"]
+            await delay(f"table.{name}")
+            try:
+                data, headers = self.select(
+                    name, request.query_params, request.headers.get("prefer", "")
+                )
+            except (KeyError, ValueError) as e:
+                return JSONResponse({"message": str(e), "code": "PGRST"}, 400)
+            return JSONResponse(data, headers=headers)
+
+        async def write(request: Request):
+            name = request.path_params["table"]
+            await delay(f"write.{name}")
+            body = await request.json()
+            rows = body if isinstance(body, list) else [body]
+            on_conflict = request.query_params.get("on_conflict", "")
+            return JSONResponse(self.upsert(name, rows, on_conflict), 201)
+
+        async def rpc(request: Request):
+            name = request.path_params["name"]
+            await delay(f"rpc.{name}")
+            body = await request.json() if await request.body() else {}
+            try:
+                return JSONResponse(self.rpc(name, body))
+            except KeyError:
+                return JSONResponse({"message": f"No function {name}"}, 404)
+
+        async def user(request: Request):
+            await delay("auth.user")
+            if not request.headers.get("authorization", "").startswith("Bearer "):
+                return JSONResponse({"msg": "missing token"}, 401)
+            return JSONResponse(TEST_USER)
+
+        async def token(request: Request):
+            await delay("auth.token")
+            body = await request.json()
+            # Tokens carry the email, so a session handed to the wrong
+            # caller shows up as the wrong user
+            if body.get("password"):
+                email = body.get("email") or TEST_USER["email"]
+            elif body.get("refresh_token", "").startswith("bench-refresh-"):
+                email = body["refresh_token"].split("-", 2)[2].rsplit("-", 1)[0]
+            else:
+                return JSONResponse(
+                    {
+                        "error": "invalid_grant",
+                        "error_description": "Invalid login credentials",
+                    },
+                    400,
+                )
+            identity = dict(
+                TEST_USER["identities"][0],
+                identity_data={"email": email, "full_name": "Bench"},
+            )
+            return JSONResponse(
+                {
+                    "access_token": f"bench-access-{email}",
+                    "refresh_token": f"bench-refresh-{email}-{time.time_ns()}",
+                    "token_type": "bearer",
+                    "expires_in": 3600,
+                    "expires_at": int(time.time()) + 3600,
+                    "user": dict(TEST_USER, email=email, identities=[identity]),
+                }
+            )
+
+        return Starlette(
+            routes=[
+                Route("/rest/v1/rpc/{name}", rpc, methods=["POST"]),
+                Route("/rest/v1/{table}", table, methods=["GET"]),
+                Route("/rest/v1/{table}", write, methods=["POST"]),
+                Route("/auth/v1/user", user, methods=["GET"]),
+                Route("/auth/v1/token", token, methods=["POST"]),
+            ]
+        )
+
+
+def serve(fake: FakeSupabase) -> str:
+    """Run the fake on a free local port and return its base URL."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    config = uvicorn.Config(
+        fake.app(), host="127.0.0.1", port=port, log_level="warning"
+    )
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}"
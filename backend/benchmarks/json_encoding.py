@@ -0,0 +1,92 @@
+"""
+Micro-benchmark for the response envelope's JSON encoding.
+
+Builds representative payloads against benchmarks.fake_supabase (/stats at
+each --sizes, a 100-row /orders page and a year of daily /stats/series) and
+times turning each into a response three ways:
+
+    before   stock JSONResponse, with the envelope formatting datetime.now()
+    json     FastJSONResponse with the stdlib encoder
+    orjson   FastJSONResponse with orjson, the app default
+
+    cd backend
+    python -m benchmarks.json_encoding --sizes small medium large
+"""
+
+import argparse
+import timeit
+from datetime import date, datetime, timedelta
+
+from fastapi.responses import JSONResponse
+
+from benchmarks.run import SIZES, start_backend
+from benchmarks.fake_supabase import seed
+
+
+def main(args):
+    fake, app_module = start_backend(0)
+
+    from utils.constants import TIMESTAMP_FORMAT
+    from utils.helpers import response_content
+    from utils.json_response import FastJSONResponse, JSON_ENCODERS, orjson
+    from utils.order_listing import list_orders
+    from utils.stats_series import (
+        bucket_edges,
+        build_series,
+        fetch_series_rows,
+        ist_midnight,
+    )
+    from utils.supabaseClient import supabase
+
+    def before(data):
+        content = response_content("ok", data, status_code=200)
+        content["serverdatetime"] = datetime.now().strftime(TIMESTAMP_FORMAT)
+        return JSONResponse(content=content, status_code=200)
+
+    def with_encoder(name):
+        class Response(FastJSONResponse):
+            encoder = staticmethod(JSON_ENCODERS[name])
+
+        return lambda data: Response(
+            content=response_content("ok", data, status_code=200), status_code=200
+        )
+
+    variants = {"before": before, "json": with_encoder("json")}
+    if orjson is not None:
+        variants["orjson"] = with_encoder("orjson")
+
+    payloads = []
+    for size_name in args.sizes:
+        size = SIZES[size_name]
+        fake.load(seed(size["orders"], size["items"], size["customers"]))
+        payloads.append((f"stats {size_name}", app_module.compute_stats(supabase)))
+    largest = SIZES[args.sizes[-1]]
+    fake.load(seed(largest["orders"], largest["items"], largest["customers"]))
+    payloads.append(("orders page 100", list_orders(supabase, 100)))
+    to_date = date.today()
+    edges = bucket_edges(to_date - timedelta(days=364), to_date, "day")
+    rows = fetch_series_rows(supabase, ist_midnight(edges[0]), ist_midnight(edges[-1]))
+    payloads.append(("stats/series 365d", {"series": build_series(rows, edges, "day")}))
+
+    print(f"{'payload':<20}{'bytes':>9}" + "".join(f"{n:>11}" for n in variants))
+    for label, data in payloads:
+        size = len(before(data).body)
+        cells = []
+        for build in variants.values():
+            runs = timeit.repeat(lambda: build(data), number=args.number, repeat=5)
+            cells.append(min(runs) / args.number * 1e6)
+        baseline = cells[0]
+        print(
+            f"{label:<20}{size:>9}"
+            + "".join(f"{us:>9.1f}us" for us in cells)
+            + f"   x{baseline / cells[-1]:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes", nargs="+", default=["small", "medium"], choices=SIZES
+    )
+    parser.add_argument("--number", type=int, default=2000, help="Encodings per run")
+    main(parser.parse_args())
@@ -0,0 +1,341 @@
+"""
+Closed-loop load generator with saturation curves.
+
+Runs a weighted traffic mix at increasing concurrency, either against main:app
+through httpx's ASGI transport (one uvicorn worker) or against the Mangum
+handler with synthetic API Gateway events (one process per warm Lambda
+container), and reports throughput, latency percentiles and error rates per
+step plus the knee point: the step with the highest throughput / p50 ratio,
+after which extra concurrency mostly adds queueing.
+
+    cd backend
+    python -m benchmarks.load --mix stats=70 invoice=20 size_sheet=10 \\
+        --concurrency 1 2 4 8 16 32 --duration 10 --out /tmp/load.json \\
+        --plot /tmp/load.png
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from uuid import uuid4
+
+import httpx
+
+from benchmarks.fake_supabase import seed
+from benchmarks.run import SIZES, percentile, routes, start_backend
+
+
+def parse_mix(entries: list) -> list:
+    mix = []
+    for entry in entries:
+        name, _, weight = entry.partition("=")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def api_gateway_event(method: str, path: str, body, headers: dict) -> dict:
+    headers = {"content-type": "application/json", **headers}
+    return {
+        "resource": path,
+        "path": path,
+        "httpMethod": method,
+        "headers": headers,
+        "multiValueHeaders": {k: [v] for k, v in headers.items()},
+        "queryStringParameters": None,
+        "multiValueQueryStringParameters": None,
+        "pathParameters": None,
+        "requestContext": {
+            "resourcePath": path,
+            "httpMethod": method,
+            "path": path,
+            "stage": "prod",
+            "requestId": uuid4().hex,
+            "identity": {"sourceIp": "127.0.0.1"},
+        },
+        "body": json.dumps(body) if body is not None else None,
+        "isBase64Encoded": False,
+    }
+
+
+class LambdaContext:
+    function_name = "bench"
+    memory_limit_in_mb = 1024
+
+    def __init__(self):
+        self.aws_request_id = uuid4().hex
+
+    def get_remaining_time_in_millis(self):
+        return 30000
+
+
+class StepStats:
+    def __init__(self):
+        self.latencies = []
+        self.by_route = {}
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def add(self, route: str, latency_ms: float, status: int):
+        with self.lock:
+            self.latencies.append(latency_ms)
+            route_stats = self.by_route.setdefault(route, [0, 0])
+            route_stats[0] += 1
+            if status >= 400:
+                self.errors += 1
+                route_stats[1] += 1
+
+    def summary(self, concurrency: int, elapsed: float) -> dict:
+        latencies = sorted(self.latencies) or [0.0]
+        total = len(self.latencies)
+        return {
+            "concurrency": concurrency,
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 0.50), 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "error_rate": round(self.errors / total, 4) if total else 0.0,
+            "routes": {
+                name: {
+                    "requests": count,
+                    "error_rate": round(errors / count, 4) if count else 0.0,
+                }
+                for name, (count, errors) in sorted(self.by_route.items())
+            },
+        }
+
+
+async def asgi_step(app, plan, concurrency: int, duration: float) -> dict:
+    stats = StepStats()
+    deadline = time.perf_counter() + duration
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://load", timeout=120
+    ) as client:
+
+        async def worker(seed: int):
+            rng = random.Random(seed)
+            while time.perf_counter() < deadline:
+                name, method, path, body, headers = plan(rng)
+                started = time.perf_counter()
+                response = await client.request(
+                    method, path, json=body, headers=headers
+                )
+                stats.add(
+                    name, (time.perf_counter() - started) * 1000, response.status_code
+                )
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    return stats.summary(concurrency, time.perf_counter() - started)
+
+
+# Per-process state of a simulated container, set by init_container
+_container = {}
+
+
+def init_container(environ: dict, barrier):
+    # Runs once in each worker process: a fresh interpreter with its own
+    # admission controller, caches and module globals, like a Lambda container
+    os.environ.update(environ)
+    import main as app_module
+
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    _container["handler"] = app_module.handler
+    _container["barrier"] = barrier
+
+
+def run_container(seed: int, by_name: dict, mix: list, duration: float):
+    """Send requests one at a time for duration seconds, like one container."""
+    handler = _container["handler"]
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    rng = random.Random(seed)
+    # Start together once every container has imported the app
+    _container["barrier"].wait()
+    started = time.time()
+    deadline = started + duration
+    results = []
+    while time.time() < deadline:
+        name, method, path, body, headers = by_name[rng.choices(names, weights)[0]]
+        request_started = time.perf_counter()
+        result = handler(
+            api_gateway_event(method, path, body, headers), LambdaContext()
+        )
+        results.append(
+            (
+                name,
+                (time.perf_counter() - request_started) * 1000,
+                result["statusCode"],
+            )
+        )
+    return started, time.time(), results
+
+
+def mangum_step(by_name: dict, mix: list, concurrency: int, duration: float) -> dict:
+    """
+    One process per warm container, each driving its own Mangum handler, so
+    nothing in the app is shared between containers. Imports happen before
+    the step starts; the first requests of each container are still cold.
+    """
+    stats = StepStats()
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(concurrency)
+    with ProcessPoolExecutor(
+        max_workers=concurrency,
+        mp_context=context,
+        initializer=init_container,
+        initargs=(dict(os.environ), barrier),
+    ) as pool:
+        containers = list(
+            pool.map(
+                run_container,
+                range(concurrency),
+                [by_name] * concurrency,
+                [mix] * concurrency,
+                [duration] * concurrency,
+            )
+        )
+    for _, _, results in containers:
+        for name, latency_ms, status in results:
+            stats.add(name, latency_ms, status)
+    elapsed = max(end for _, end, _ in containers) - min(
+        start for start, _, _ in containers
+    )
+    return stats.summary(concurrency, elapsed)
+
+
+def knee_point(steps: list) -> dict:
+    """Step maximising throughput / p50 latency (Kleinrock's power)."""
+    usable = [s for s in steps if s["p50_ms"] > 0 and s["error_rate"] < 0.5]
+    if not usable:
+        return {}
+    return max(usable, key=lambda s: s["throughput_rps"] / s["p50_ms"])
+
+
+def ascii_curve(steps: list) -> str:
+    peak = max(s["throughput_rps"] for s in steps) or 1
+    lines = ["concurrency  rps       p95 ms    errors  throughput"]
+    for s in steps:
+        bar = "#" * int(40 * s["throughput_rps"] / peak)
+        lines.append(
+            f"{s['concurrency']:>11}  {s['throughput_rps']:<8}  {s['p95_ms']:<8}  "
+            f"{s['error_rate']:<6.1%}  {bar}"
+        )
+    return "\n".join(lines)
+
+
+def save_plot(steps: list, knee: dict, path: str):
+    try:
+        import matplotlib
+
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib is not installed, skipping --plot")
+        return
+
+    fig, ax = plt.subplots(figsize=(7, 4.5))
+    ax.plot(
+        [s["throughput_rps"] for s in steps],
+        [s["p95_ms"] for s in steps],
+        marker="o",
+        label="p95",
+    )
+    ax.plot(
+        [s["throughput_rps"] for s in steps],
+        [s["p50_ms"] for s in steps],
+        marker="o",
+        label="p50",
+    )
+    for s in steps:
+        ax.annotate(str(s["concurrency"]), (s["throughput_rps"], s["p95_ms"]))
+    if knee:
+        ax.axvline(knee["throughput_rps"], linestyle="--", color="grey")
+    ax.set_xlabel("throughput (req/s)")
+    ax.set_ylabel("latency (ms)")
+    ax.legend()
+    fig.tight_layout()
+    fig.savefig(path)
+    print(f"Saved {path}")
+
+
+def main(args):
+    fake, app_module = start_backend(args.latency_ms)
+    size = SIZES[args.size]
+    fake.load(seed(size["orders"], size["items"], size["customers"]))
+
+    by_name = {route[0]: route for route in routes(size)}
+    mix = parse_mix(args.mix)
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    unknown = set(names) - by_name.keys()
+    if unknown:
+        raise SystemExit(f"Unknown routes in --mix: {', '.join(sorted(unknown))}")
+
+    def plan(rng):
+        return by_name[rng.choices(names, weights)[0]]
+
+    steps = []
+    for concurrency in args.concurrency:
+        if args.target == "mangum":
+            step = mangum_step(by_name, mix, concurrency, args.duration)
+        else:
+            step = asyncio.run(
+                asgi_step(app_module.app, plan, concurrency, args.duration)
+            )
+        steps.append(step)
+        print(
+            f"c={concurrency:<4} {step['throughput_rps']:>8} rps  "
+            f"p50 {step['p50_ms']:>9} ms  p95 {step['p95_ms']:>9} ms  "
+            f"p99 {step['p99_ms']:>9} ms  errors {step['error_rate']:.1%}"
+        )
+
+    knee = knee_point(steps)
+    print(ascii_curve(steps))
+    if knee:
+        print(
+            f"Knee at concurrency {knee['concurrency']}: "
+            f"{knee['throughput_rps']} rps, p50 {knee['p50_ms']} ms"
+        )
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(
+                {
+                    "target": args.target,
+                    "mix": dict(mix),
+                    "size": args.size,
+                    "latency_ms": args.latency_ms,
+                    "steps": steps,
+                    "knee": knee,
+                },
+                f,
+                indent=2,
+            )
+        print(f"Saved {args.out}")
+    if args.plot:
+        save_plot(steps, knee, args.plot)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--target", choices=["asgi", "mangum"], default="asgi")
+    parser.add_argument(
+        "--mix", nargs="+", default=["stats=70", "invoice=20", "size_sheet=10"]
+    )
+    parser.add_argument("--size", choices=SIZES, default="small")
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32]
+    )
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--out", default="")
+    parser.add_argument("--plot", default="")
+    main(parser.parse_args())
@@ -0,0 +1,206 @@
+"""
+Fit render memory against document size.
+
+Reads render_memory events (utils.render_memory) from JSON log files, one
+event per line; CloudWatch exports with a timestamp or request prefix before
+the JSON work too. With --render it produces its own: every size in --items
+is rendered through main:app against benchmarks.fake_supabase with
+RENDER_MEMORY_SAMPLE_RATE=1, as an invoice, a size sheet PDF and XLSX, and a
+statement.
+
+For each template it fits peak heap, retained heap and RSS growth as
+a + b * items by least squares, and prints the fit, its r², and the item
+count at which RSS growth would reach RENDER_MEMORY_PER_RENDER_MB (what
+admission control assumes per render) and RENDER_MEMORY_BUDGET_MB (the
+whole render budget). Only renders that ran alone are fitted unless
+--include-concurrent is given, since RSS is shared between overlapping ones.
+
+    cd backend
+    python -m benchmarks.render_memory --render --items 10 50 200 500 1000
+    python -m benchmarks.render_memory render-logs.jsonl
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+from collections import defaultdict
+
+AUTH = {"Authorization": "Bearer bench"}
+MEASURES = ("peak_mb", "retained_mb", "rss_growth_mb")
+
+
+def parse_events(lines) -> list:
+    events = []
+    for line in lines:
+        start = line.find("{")
+        if start < 0:
+            continue
+        try:
+            event = json.loads(line[start:])
+        except ValueError:
+            continue
+        if isinstance(event, dict) and event.get("event") == "render_memory":
+            events.append(event)
+    return events
+
+
+class EventCapture(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(record.getMessage())
+
+
+def render_events(sizes: list, repeat: int) -> list:
+    os.environ["RENDER_MEMORY_SAMPLE_RATE"] = "1"
+    os.environ["LOG_LEVEL"] = "INFO"
+    os.environ["METRICS_EMF"] = "false"
+
+    from fastapi.testclient import TestClient
+
+    from benchmarks.fake_supabase import seed
+    from benchmarks.run import size_sheet_payload, start_backend
+    from benchmarks.statement import statement_seed
+
+    fake, app_module = start_backend(0)
+
+    from utils.export import financial_year_range
+    from utils.timing import logger
+
+    capture = EventCapture()
+    logger.handlers = [capture]
+    client = TestClient(app_module.app)
+    fy = "2025-26"
+    start, _ = financial_year_range(fy)
+
+    def get(path, **kwargs):
+        client.request(
+            kwargs.pop("method", "GET"), path, headers=AUTH, **kwargs
+        ).raise_for_status()
+
+    # Untraced-looking first renders still fill the template and font caches,
+    # so one warm-up of each is dropped
+    fake.load(seed(1, 5, 1))
+    get("/invoice/1")
+    get("/size-sheet/1", method="POST", json=size_sheet_payload(5))
+    get("/size-sheet-excel/1", method="POST", json=size_sheet_payload(5))
+    fake.load(statement_seed(10, start))
+    get(f"/customers/1/statement?fy={fy}")
+    capture.lines.clear()
+
+    for items in sizes:
+        sheet = size_sheet_payload(items)
+        for _ in range(repeat):
+            fake.load(seed(1, items, 1))
+            get("/invoice/1")
+            get("/size-sheet/1", method="POST", json=sheet)
+            get("/size-sheet-excel/1", method="POST", json=sheet)
+            # Two customers split the orders, so double them for ~items lines
+            fake.load(statement_seed(items * 2, start))
+            get(f"/customers/1/statement?fy={fy}")
+        print(f"rendered {items} items", file=sys.stderr)
+    return parse_events(capture.lines)
+
+
+def fit(xs: list, ys: list):
+    """(intercept, slope, r²), or None when xs do not vary."""
+    if len(set(xs)) < 2:
+        return None
+    slope, intercept = statistics.linear_regression(xs, ys)
+    r2 = statistics.correlation(xs, ys) ** 2 if len(set(ys)) > 1 else 1.0
+    return intercept, slope, r2
+
+
+def items_at(target_mb: float, line) -> str:
+    intercept, slope, _ = line
+    if slope <= 0:
+        return "-"
+    return f"{max(0, (target_mb - intercept) / slope):,.0f}"
+
+
+def report(events: list, include_concurrent: bool):
+    from utils.constants import RENDER_MEMORY_BUDGET_MB, RENDER_MEMORY_PER_RENDER_MB
+
+    by_template = defaultdict(list)
+    skipped = 0
+    for event in events:
+        if not include_concurrent and event.get("concurrent_renders", 1) > 1:
+            skipped += 1
+            continue
+        by_template[event["template"]].append(event)
+
+    print(
+        f"{len(events)} render_memory events, {skipped} skipped as concurrent; "
+        f"per render {RENDER_MEMORY_PER_RENDER_MB:.0f} MB, "
+        f"budget {RENDER_MEMORY_BUDGET_MB:.0f} MB"
+    )
+    print(
+        f"{'template':<20}{'measure':<15}{'n':>4}{'items':>12}{'max MB':>9}"
+        f"{'MB fixed':>10}{'MB/100 items':>14}{'r²':>6}"
+        f"{'items@per-render':>18}{'items@budget':>14}"
+    )
+    for template, rows in sorted(by_template.items()):
+        items = [row["items"] for row in rows]
+        for measure in MEASURES:
+            values = [row[measure] for row in rows]
+            line = fit(items, values)
+            prefix = (
+                f"{template:<20}{measure:<15}{len(rows):>4}"
+                f"{f'{min(items)}-{max(items)}':>12}{max(values):>9.1f}"
+            )
+            if line is None:
+                print(f"{prefix}{'(one size only)':>20}")
+                continue
+            print(
+                f"{prefix}{line[0]:>10.1f}{line[1] * 100:>14.2f}{line[2]:>6.2f}"
+                + (
+                    f"{items_at(RENDER_MEMORY_PER_RENDER_MB, line):>18}"
+                    f"{items_at(RENDER_MEMORY_BUDGET_MB, line):>14}"
+                    if measure == "rss_growth_mb"
+                    else ""
+                )
+            )
+        sized = [row for row in rows if row.get("output_bytes")]
+        if sized:
+            line = fit(
+                [row["output_bytes"] / 1e6 for row in sized],
+                [row["rss_growth_mb"] for row in sized],
+            )
+            if line is not None:
+                print(
+                    f"{'':<20}{'rss per out MB':<15}{len(sized):>4}"
+                    f"{'':>21}{line[0]:>10.1f}{line[1]:>14.2f}{line[2]:>6.2f}"
+                )
+
+
+def main(args):
+    if args.render:
+        events = render_events(args.items, args.repeat)
+    else:
+        events = []
+        for path in args.logs or ["-"]:
+            if path == "-":
+                events.extend(parse_events(sys.stdin))
+            else:
+                with open(path) as f:
+                    events.extend(parse_events(f))
+    if not events:
+        sys.exit("no render_memory events found")
+    report(events, args.include_concurrent)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("logs", nargs="*", help="JSON log files, - for stdin")
+    parser.add_argument(
+        "--render", action="store_true", help="Render documents instead of reading logs"
+    )
+    parser.add_argument("--items", type=int, nargs="+", default=[10, 50, 200, 500])
+    parser.add_argument("--repeat", type=int, default=2)
+    parser.add_argument("--include-concurrent", action="store_true")
+    main(parser.parse_args())
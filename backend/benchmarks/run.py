@@ -0,0 +1,215 @@
+"""
+End-to-end benchmark: drives main:app in-process through httpx's ASGI
+transport against benchmarks.fake_supabase, for every route at several data
+sizes, and writes p50/p95/p99 latency, throughput and peak RSS to JSON.
+
+    cd backend
+    python -m benchmarks.run --sizes small medium --requests 50 \\
+        --latency-ms 20 --out /tmp/bench-$(git rev-parse --short HEAD).json
+    python -m benchmarks.compare /tmp/bench-old.json /tmp/bench-new.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import secrets
+import statistics
+import subprocess
+import time
+from datetime import datetime
+
+import httpx
+
+from benchmarks.fake_supabase import FakeSupabase, seed, serve
+
+
+# orders, proforma items per order, customers, size-sheet lines
+SIZES = {
+    "small": {"orders": 50, "items": 10, "customers": 20, "sheet_items": 10},
+    "medium": {"orders": 500, "items": 100, "customers": 200, "sheet_items": 100},
+    "large": {"orders": 2000, "items": 500, "customers": 1000, "sheet_items": 500},
+}
+
+AUTH = {"Authorization": "Bearer bench-access-token"}
+
+
+def size_sheet_payload(lines: int) -> dict:
+    units = ("ft", "inch", "mm")
+    return {
+        "title": "Size Sheet",
+        "items": [
+            {
+                "customer_order_no": f"A-{n}",
+                "product_name": "Clear Float",
+                "thickness": "5 mm",
+                "size_width": 24 + n % 40,
+                "size_height": 36 + n % 30,
+                "size_width_fraction": "1/2" if n % 3 == 1 else "",
+                "unit": units[n % 3],
+                "quantity": 1 + n % 5,
+                "weight": 2.5,
+            }
+            for n in range(lines)
+        ],
+    }
+
+
+def routes(size: dict) -> list:
+    """(name, method, path, json body, headers) for every route."""
+    order_id = max(1, size["orders"] // 2)
+    sheet = size_sheet_payload(size["sheet_items"])
+    return [
+        ("root", "GET", "/", None, {}),
+        ("login", "POST", "/login", {"email": "a@b.c", "password": "x"}, {}),
+        ("stats", "GET", "/stats", None, AUTH),
+        ("orders", "GET", "/orders?limit=50", None, AUTH),
+        ("latest_invoice_number", "GET", "/latest-invoice-number", None, AUTH),
+        ("invoice", "GET", f"/invoice/{order_id}", None, AUTH),
+        ("size_sheet", "POST", "/size-sheet/1", sheet, AUTH),
+        ("size_sheet_excel", "POST", "/size-sheet-excel/1", sheet, AUTH),
+        (
+            "size_sheet_batch",
+            "POST",
+            "/size-sheet-batch",
+            {"sheets": {str(customer_id): sheet for customer_id in range(1, 6)}},
+            AUTH,
+        ),
+        ("statement", "GET", "/customers/1/statement", None, AUTH),
+    ]
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def bench_route(client, route, requests: int, concurrency: int) -> dict:
+    # utils reads its settings at import time, after main() set them
+    from utils.admission import peak_rss_mb
+
+    name, method, path, body, headers = route
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.request(method, path, json=body, headers=headers)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    # One warm-up request so imports and template compilation aren't counted
+    await client.request(method, path, json=body, headers=headers)
+    rss_before = peak_rss_mb()
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    return {
+        "route": name,
+        "path": path,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "mean_ms": round(statistics.fmean(latencies), 2),
+        "throughput_rps": round(requests / elapsed, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "peak_rss_growth_mb": round(peak_rss_mb() - rss_before, 1),
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def start_backend(latency_ms: float):
+    """
+    Start the fake Supabase and import main against it.
+
+    Returns:
+        tuple: (FakeSupabase, main module)
+    """
+    fake = FakeSupabase({}, latency_ms=latency_ms)
+    base_url = serve(fake)
+
+    # utils.constants reads these at import time
+    os.environ["SUPABASE_URL"] = base_url
+    os.environ.setdefault(
+        "SUPABASE_ANON_KEY", "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.bench"
+    )
+    os.environ.setdefault(
+        "SUPABASE_SERVICE_ROLE_KEY",
+        "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.bench",
+    )
+    os.environ.setdefault("CHANGE_FEED_BACKEND", "local")
+    os.environ.setdefault("DOCUMENT_STORAGE_BACKEND", "local")
+    os.environ.setdefault("DOCUMENT_LOCAL_SECRET", secrets.token_hex(32))
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    import main as app_module
+
+    return fake, app_module
+
+
+async def main(args):
+    fake, app_module = start_backend(args.latency_ms)
+
+    results = {
+        "revision": git_revision(),
+        "started_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "latency_ms": args.latency_ms,
+        "runs": [],
+    }
+    selected = set(args.routes or [])
+
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=300
+    ) as client:
+        for size_name in args.sizes:
+            size = SIZES[size_name]
+            fake.load(seed(size["orders"], size["items"], size["customers"]))
+            for route in routes(size):
+                if selected and route[0] not in selected:
+                    continue
+                result = await bench_route(
+                    client, route, args.requests, args.concurrency
+                )
+                result["size"] = size_name
+                results["runs"].append(result)
+                print(
+                    f"{size_name:<7} {result['route']:<22} "
+                    f"p50 {result['p50_ms']:>9} ms  p95 {result['p95_ms']:>9} ms  "
+                    f"p99 {result['p99_ms']:>9} ms  {result['throughput_rps']:>8} rps  "
+                    f"err {result['errors']}"
+                )
+
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved {args.out}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", nargs="+", default=["small"], choices=SIZES)
+    parser.add_argument("--routes", nargs="*", help="Route names, default all")
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--out", default="")
+    asyncio.run(main(parser.parse_args()))
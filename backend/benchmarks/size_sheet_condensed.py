@@ -0,0 +1,93 @@
+"""
+Benchmark for condensed size sheets.
+
+Builds cut lists of --lines lines drawn from --distinct distinct sizes and
+renders each as a size sheet PDF and XLSX, once line by line and once with
+condensed=True. Prints the context build, PDF render (template, layout and
+serialization) and workbook build times, and the rows and bytes produced.
+
+    cd backend
+    python -m benchmarks.size_sheet_condensed --lines 100 500 2000 --distinct 12
+"""
+
+import argparse
+import random
+import time
+from io import BytesIO
+
+from fastapi.templating import Jinja2Templates
+
+from utils.helpers import createPdf
+from utils.schema import SizeSheetRequest
+from utils.size_sheet import build_size_sheet_context, build_size_sheet_workbook
+
+COMPANY = {"company_name": "Bench Glass", "mobile_nos": ["0000000000"]}
+CUSTOMER = {"name": "Bench Customer", "address": "Somewhere"}
+
+
+def cut_list(lines: int, distinct: int, seed: int = 3) -> list:
+    rng = random.Random(seed)
+    sizes = [
+        {
+            "product_name": rng.choice(("Clear Float", "Toughened", "Mirror")),
+            "thickness": rng.choice(("5 mm", "8 mm", "12 mm")),
+            "size_width": rng.randint(12, 96),
+            "size_height": rng.randint(12, 96),
+            "size_width_fraction": rng.choice(("", "1/2", "3/4")),
+            "size_height_fraction": rng.choice(("", "1/4", "1/2")),
+            "width_rounding_value": 3,
+            "height_rounding_value": 3,
+            "unit": "inch",
+        }
+        for _ in range(distinct)
+    ]
+    return [
+        dict(
+            rng.choice(sizes),
+            customer_order_no=f"PO-{index + 1}",
+            quantity=rng.randint(1, 4),
+            weight=round(rng.uniform(1, 20), 2),
+        )
+        for index in range(lines)
+    ]
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main(args):
+    templates = Jinja2Templates(directory="template")
+    print(
+        f"{'lines':>6}{'mode':>11}{'rows':>6}{'context ms':>12}"
+        f"{'pdf ms':>9}{'pdf bytes':>11}{'xlsx ms':>9}{'xlsx bytes':>12}"
+    )
+    for lines in args.lines:
+        items = cut_list(lines, args.distinct)
+        for condensed in (False, True):
+            payload = SizeSheetRequest(items=items, condensed=condensed)
+            context, context_ms = timed(
+                build_size_sheet_context, COMPANY, CUSTOMER, payload
+            )
+            pdf, pdf_ms = timed(createPdf, context, templates, "size_sheet.html")
+
+            def xlsx():
+                output = BytesIO()
+                build_size_sheet_workbook(payload).save(output)
+                return output.getvalue()
+
+            workbook, xlsx_ms = timed(xlsx)
+            print(
+                f"{lines:>6}{'condensed' if condensed else 'lines':>11}"
+                f"{len(context['form']['items']):>6}{context_ms:>12.1f}"
+                f"{pdf_ms:>9.1f}{len(pdf):>11}{xlsx_ms:>9.1f}{len(workbook):>12}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, nargs="+", default=[100, 500, 2000])
+    parser.add_argument("--distinct", type=int, default=12)
+    main(parser.parse_args())
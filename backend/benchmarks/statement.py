@@ -0,0 +1,116 @@
+"""
+Benchmark for /customers/{id}/statement.
+
+Seeds benchmarks.fake_supabase with --orders orders for two customers, so
+customer 1 has about half of them, and moves every order into --fy. For
+each size it times the statement endpoint end to end and, separately, the
+keyset page fetches, the one-pass line build and the PDF render. Also
+checks the closing balance against a sum over the seeded rows.
+
+    cd backend
+    python -m benchmarks.statement --orders 2500 5000 --latency-ms 20
+"""
+
+import argparse
+import random
+import time
+from datetime import timedelta
+
+from fastapi.templating import Jinja2Templates
+from fastapi.testclient import TestClient
+
+from benchmarks.fake_supabase import seed
+from benchmarks.run import start_backend
+
+AUTH = {"Authorization": "Bearer bench"}
+
+
+def statement_seed(orders: int, fy_start) -> dict:
+    """seed() with two customers and every order created inside the year."""
+    db = seed(orders, items_per_order=1, customers=2)
+    rng = random.Random(7)
+    by_id = {row["id"]: row for row in db["orders"]}
+    for proforma in db["proforma_invoices"]:
+        created = (
+            fy_start + timedelta(minutes=rng.randint(0, 60 * 24 * 360))
+        ).isoformat()
+        by_id[proforma["order_id"]]["created_at"] = created
+        proforma["created_at"] = created
+    return db
+
+
+def expected_balance(db: dict, customer_id: int) -> float:
+    proformas = {row["order_id"]: row for row in db["proforma_invoices"]}
+    total = 0.0
+    for order in db["orders"]:
+        if order["customer_id"] != customer_id or order["status"] == "cancelled":
+            continue
+        proforma = proformas[order["id"]]
+        total += proforma["grand_total"] - (
+            proforma["advanced_payment_amount"]
+            if proforma["has_advanced_payment"]
+            else 0
+        )
+    return round(total, 2)
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main(args):
+    fake, app_module = start_backend(args.latency_ms)
+
+    from utils.export import financial_year_range
+    from utils.helpers import createPdf
+    from utils.statement import build_statement_context, iter_statement_orders
+    from utils.supabaseClient import supabase
+
+    templates = Jinja2Templates(directory="template")
+    start, end = financial_year_range(args.fy)
+    client = TestClient(app_module.app)
+    print(
+        f"{'orders':>7}{'lines':>7}{'pages':>6}{'fetch ms':>10}{'lines ms':>10}"
+        f"{'pdf ms':>9}{'pdf bytes':>11}{'endpoint ms':>13}  balance"
+    )
+    for orders in args.orders:
+        db = statement_seed(orders, start)
+        fake.load(db)
+
+        fake.calls.clear()
+        rows, fetch_ms = timed(
+            lambda: list(iter_statement_orders(supabase, "1", start, end))
+        )
+        pages = fake.calls.get("table.orders", 0)
+        context, lines_ms = timed(
+            build_statement_context,
+            db["company_master"][0],
+            db["customers"][0],
+            args.fy,
+            rows,
+        )
+        pdf, pdf_ms = timed(createPdf, context, templates, "statement.html")
+
+        response, endpoint_ms = timed(
+            lambda: client.get(f"/customers/1/statement?fy={args.fy}", headers=AUTH)
+        )
+        response.raise_for_status()
+
+        expected = expected_balance(db, 1)
+        balance = context["form"]["total_balance"]
+        print(
+            f"{orders:>7}{len(context['form']['lines']):>7}{pages:>6}"
+            f"{fetch_ms:>10.1f}{lines_ms:>10.1f}{pdf_ms:>9.1f}{len(pdf):>11}"
+            f"{endpoint_ms:>13.1f}  {balance}"
+            f"{'' if float(balance) == expected else f' != {expected:.2f}'}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orders", type=int, nargs="+", default=[2500, 5000])
+    parser.add_argument("--fy", default="2025-26")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    main(parser.parse_args())
@@ -1,36 +1,147 @@
-from fastapi import FastAPI, Response, Request, HTTPException, Depends
+from fastapi import FastAPI, Request, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
 from utils.helpers import (
     failure_response,
-    verify_token,
     success_response,
-    convertDateToProperFormat,
     createPdf,
+    merge_pdfs,
     get_financial_year,
-    parse_fractional_inch,
+    build_invoice_context,
+)
+from utils.projections import INVOICE_COMPANY_SELECT, INVOICE_ORDER_SELECT
+from utils.order_metrics import refresh_order_metrics
+from utils.stats_series import (
+    bucket_edges,
+    build_series,
+    fetch_series_rows,
+    ist_midnight,
+)
+from utils.order_listing import (
+    ORDER_LIST_MAX_LIMIT,
+    decode_cursor,
+    list_orders,
+    parse_fields,
+)
+from utils.export import (
+    EXPORT_MEDIA_TYPES,
+    ExportBudget,
+    financial_year_range,
+    iter_file,
+    stream_export,
+    write_xlsx_export,
+)
+from utils.customer_search import (
+    CUSTOMER_SEARCH_MAX_LIMIT,
+    customer_search_index,
+    request_customer_search_refresh,
+)
+from utils.invoice_numbers import invoice_numbers
+from utils.size_sheet import (
+    SIZE_SHEET_CUSTOMER_SELECT,
+    build_size_sheet_context,
+    fetch_size_sheet_customers,
+    write_size_sheet_workbook,
+    zip_documents,
+)
+from utils.statement import build_statement_context, iter_statement_orders
+from utils.json_response import FastJSONResponse
+from utils.compression import CompressionMiddleware
+from utils.auth import AuthMiddleware
+from utils.auth_tokens import AuthAPIError, refresh_session, sign_in
+from utils.response_cache import stats_cache, visibility_scope
+from utils.change_feed import change_feed
+from utils.stats_rollup import (
+    current_month_key,
+    ensure_rollup,
+    request_rollup_scan,
+    last_month_keys,
+    month_range,
+    previous_month_key,
+)
+from utils.document_storage import document_response, get_document_store
+from utils.admission import (
+    AdmissionRejected,
+    RenderAdmissionController,
+    gather_renders,
+    get_render_admission,
+)
+from utils.metrics import registry
+from utils.profiler import ProfilerMiddleware
+from utils.timing import (
+    RequestTimingMiddleware,
+    debug_sampled,
+    record_span,
+    span,
 )
 
 from mangum import Mangum
 from fastapi.templating import Jinja2Templates
-from utils.supabaseClient import supabase
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from utils.constants import (
+    DOCUMENT_LOCAL_URL_PREFIX,
+    DOCUMENT_STORAGE_BACKEND,
+    INVOICE_RELEASE_ON_SHUTDOWN,
+    SIZE_SHEET_BATCH_CONCURRENCY,
+    SIZE_SHEET_BATCH_MAX,
     SUPABASE_TABLES,
-    CURRENT_TIME,
-    RATE_TYPE,
 )
-from datetime import timedelta, datetime
-from utils.schema import UserLoginSchema, SizeSheetRequest
-import re
+from utils.schema import (
+    UserLoginSchema,
+    RefreshTokenSchema,
+    SizeSheetRequest,
+    DeliveryMode,
+    Granularity,
+    ExportFormat,
+    SizeSheetBatchFormat,
+    SizeSheetBatchRequest,
+)
+from datetime import date, timedelta
 from supabase import Client
-from natsort import natsorted
-from math import ceil
-from openpyxl import Workbook
-from io import BytesIO
+from typing import List, Optional
+import asyncio
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
 
 
 # Initialize logging
 
-app = FastAPI()
+
+def invalidate_stats(table: str, payload: dict):
+    stats_cache.invalidate(f"after {payload.get('type', 'change')} on {table}")
+    request_rollup_scan()
+
+
+change_feed.subscribe(
+    [
+        SUPABASE_TABLES.orders,
+        SUPABASE_TABLES.proforma_invoices,
+        SUPABASE_TABLES.order_metrics,
+    ],
+    invalidate_stats,
+)
+
+
+def refresh_customer_search(table: str, payload: dict):
+    request_customer_search_refresh()
+
+
+change_feed.subscribe([SUPABASE_TABLES.customers], refresh_customer_search)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await change_feed.start()
+    yield
+    await change_feed.stop()
+    # Give back the unused tails of this process's invoice number blocks, on a
+    # real shutdown only (see INVOICE_RELEASE_ON_SHUTDOWN)
+    if INVOICE_RELEASE_ON_SHUTDOWN:
+        await run_in_threadpool(invoice_numbers.release_all)
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 origins = ["*"]
 handler = Mangum(app)
 templates = Jinja2Templates(directory="template")
@@ -44,46 +155,47 @@ app.add_middleware(
 )
 
 
-@app.middleware("http")
-async def jwt_middleware(request: Request, call_next):
-    excluded_paths = [
-        "/open-route",
-        "/docs",
-        "/openapi.json",
-        "/",
-        "/env-check",
-        "/v1/register",
-        "/login",
-    ]  # Add paths to exclude from JWT check
-
-    wildcard_excluded_paths = [
-        "/static/*",
-        # "/dispatch-invoice/*",
-    ]  # Add wild path to exclude from jwt check
-
-    if request.method.lower() == "options":
-        return await call_next(request)
+# Added before AuthMiddleware so it runs inside it, after auth
+app.add_middleware(ProfilerMiddleware)
+
+
+# Add paths to exclude from JWT check
+AUTH_EXCLUDED_PATHS = [
+    "/open-route",
+    "/docs",
+    "/openapi.json",
+    "/",
+    "/env-check",
+    "/v1/register",
+    "/login",
+    "/refresh",
+]
+# Add wild path to exclude from jwt check
+AUTH_EXCLUDED_PATTERNS = [
+    "/static/*",
+    # Signed local document links carry their own token
+    f"{DOCUMENT_LOCAL_URL_PREFIX}/*",
+    # "/dispatch-invoice/*",
+]
+app.add_middleware(
+    AuthMiddleware,
+    excluded_paths=AUTH_EXCLUDED_PATHS,
+    excluded_patterns=AUTH_EXCLUDED_PATTERNS,
+)
 
-    auth_header = request.headers.get("Authorization")
 
-    if request.url.path in excluded_paths:
-        return await call_next(request)
+# Inside RequestTimingMiddleware, so the logged sizes are the bytes actually sent
+app.add_middleware(CompressionMiddleware)
 
-    if any(re.match(pattern, request.url.path) for pattern in wildcard_excluded_paths):
-        return await call_next(request)
 
-    if auth_header is None or not auth_header.startswith("Bearer "):
-        return failure_response("Access denied", {}, 401)
+# Added after AuthMiddleware so it wraps it and auth is timed too
+app.add_middleware(RequestTimingMiddleware)
 
-    token = auth_header.split(" ")[1]
-    try:
-        user = verify_token(token)
-        request.state.user = user["decoded_token"]
-        request.state.authenticated_client = user["authenticated_client"]
-    except HTTPException as e:
-        return failure_response(e.detail, status_code=e.status_code)
 
-    response = await call_next(request)
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    response = failure_response(str(exc), {}, 503)
+    response.headers["Retry-After"] = str(exc.retry_after)
     return response
 
 
@@ -96,22 +208,40 @@ async def root():
     return {"message": "Hello World"}
 
 
+@app.get("/metrics")
+async def metrics():
+    # Per container: on Lambda use the EMF fields in the request logs instead
+    return PlainTextResponse(
+        registry.render_prometheus(), media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.get(DOCUMENT_LOCAL_URL_PREFIX + "/{path:path}")
+async def local_document(path: str, expires: int, token: str):
+    # Serves the signed links LocalDocumentStore hands out
+    if DOCUMENT_STORAGE_BACKEND != "local":
+        return failure_response("Not found", {}, 404)
+    full_path = get_document_store().resolve(path, expires, token)
+    if full_path is None:
+        return failure_response("Invalid or expired link", {}, 403)
+    return FileResponse(full_path, filename=path.rsplit("/", 1)[-1])
+
+
 @app.get("/latest-invoice-number")
 async def latest_invoice_number(
+    peek: bool = False,
     authenticated_client: Client = Depends(get_authenticated_client),
 ):
+    # ?peek=true shows the next number without consuming it
     try:
         fy = get_financial_year()
-        result = authenticated_client.rpc(
-            "get_next_invoice_number", {"fy_param": fy}
-        ).execute()
-
-        print("result: ", result)
+        allocate = invoice_numbers.peek if peek else invoice_numbers.next_number
+        invoice_number = await run_in_threadpool(allocate, authenticated_client, fy)
 
-        if result.data is None:
-            return failure_response(result.error.message, {}, 500)
+        debug_sampled("invoice_number", invoice_number)
 
-        invoice_number = result.data
+        if invoice_number is None:
+            return failure_response("Invoice number not available", {}, 500)
 
         return success_response(
             "Financial year fetched successfully",
@@ -127,162 +257,155 @@ async def latest_invoice_number(
 async def size_sheet(
     customer_id: str,
     payload: SizeSheetRequest,
+    delivery: Optional[DeliveryMode] = None,
     authenticated_client: Client = Depends(get_authenticated_client),
+    admission: RenderAdmissionController = Depends(get_render_admission),
 ):
     try:
-        company_details = (
-            authenticated_client.table(SUPABASE_TABLES.company_details)
-            .select("*")
-            .eq("id", 1)
-            .execute()
-        )
+        with span("db.company_master"):
+            company_details = (
+                authenticated_client.table(SUPABASE_TABLES.company_details)
+                .select("*")
+                .eq("id", 1)
+                .execute()
+            )
 
         if len(company_details.data) == 0:
             return failure_response("Company details not found", {}, 404)
 
         company_details = company_details.data[0]
 
-        customer_resp = (
-            authenticated_client.table(SUPABASE_TABLES.customers)
-            .select(
-                "name,company_name,gstin,phone,email,address,mobile,shipping_address"
+        with span("db.customers"):
+            customer_resp = (
+                authenticated_client.table(SUPABASE_TABLES.customers)
+                .select(SIZE_SHEET_CUSTOMER_SELECT)
+                .eq("id", customer_id)
+                .limit(1)
+                .execute()
             )
-            .eq("id", customer_id)
-            .limit(1)
-            .execute()
-        )
 
         if len(customer_resp.data) == 0:
             return failure_response("Customer not found", {}, 404)
 
         customer = customer_resp.data[0]
 
-        processed_items = []
-        total_qty = 0
-        total_sqft = 0.0
-        total_weight = 0.0
-
-        for item in payload.items:
-            # Reset per-item chargeable sizes
-            chargeable_width = 0.0
-            chargeable_height = 0.0
-            unit = (item.unit or "ft").lower()
-            total_weight += float(item.weight or 0.0)
-            qty = int(item.quantity or 0)
-
-            if unit == "mm":
-                width_feet = float(item.size_width)
-                height_feet = float(item.size_height)
-                line_sqft = width_feet * height_feet * qty * 10.764 / 1000000
-                total_sqft += line_sqft
-            elif unit == "inch":
-                width_inches = parse_fractional_inch(
-                    item.size_width, item.size_width_fraction or ""
-                )
-                height_inches = parse_fractional_inch(
-                    item.size_height, item.size_height_fraction or ""
-                )
+        context_started = time.perf_counter()
+        pdf_context = build_size_sheet_context(company_details, customer, payload)
+        record_span("context", context_started)
+        debug_sampled("size sheet pdf_context", pdf_context)
 
-                width_rounding_value = int(item.width_rounding_value or 0)
-                height_rounding_value = int(item.height_rounding_value or 0)
+        pdf_bytes = await admission.run(
+            createPdf, pdf_context, templates, "size_sheet.html"
+        )
 
-                if width_rounding_value and width_rounding_value > 0:
-                    width_inches = (
-                        ceil(width_inches / width_rounding_value) * width_rounding_value
-                    )
+        return await document_response(
+            pdf_bytes,
+            f"size_sheet_{customer_id}.pdf",
+            "application/pdf",
+            authenticated_client,
+            delivery,
+        )
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        print(e)
+        return failure_response(str(e), {}, 500)
 
-                if height_rounding_value and height_rounding_value > 0:
-                    height_inches = (
-                        ceil(height_inches / height_rounding_value)
-                        * height_rounding_value
-                    )
 
-                chargeable_width = width_inches
-                chargeable_height = height_inches
+@app.post("/size-sheet-batch")
+async def size_sheet_batch(
+    payload: SizeSheetBatchRequest,
+    batch_format: SizeSheetBatchFormat = Query("pdf", alias="format"),
+    delivery: Optional[DeliveryMode] = None,
+    authenticated_client: Client = Depends(get_authenticated_client),
+    admission: RenderAdmissionController = Depends(get_render_admission),
+):
+    try:
+        if not payload.sheets:
+            return failure_response("No size sheets requested", {}, 400)
+        if len(payload.sheets) > SIZE_SHEET_BATCH_MAX:
+            return failure_response(
+                f"At most {SIZE_SHEET_BATCH_MAX} size sheets per batch", {}, 400
+            )
 
-                width_feet = width_inches
-                height_feet = height_inches
-                line_sqft = width_feet * height_feet * qty / 144
-                total_sqft += line_sqft
-            else:
-                width_feet = float(item.size_width)
-                height_feet = float(item.size_height)
-                line_sqft = width_feet * height_feet * qty
-                total_sqft += line_sqft
+        with span("db.company_master"):
+            company_details = (
+                authenticated_client.table(SUPABASE_TABLES.company_details)
+                .select("*")
+                .eq("id", 1)
+                .execute()
+            )
 
-            total_qty += qty
+        if len(company_details.data) == 0:
+            return failure_response("Company details not found", {}, 404)
 
-            processed_items.append(
-                {
-                    "customer_order_no": item.customer_order_no or "",
-                    "name": item.product_name or "",
-                    "thickness": item.thickness or "",
-                    "chargeable_width": chargeable_width,
-                    "chargeable_height": chargeable_height,
-                    "width": (
-                        int(item.size_width) if unit == "inch" else item.size_width
-                    ),
-                    "height": (
-                        int(item.size_height) if unit == "inch" else item.size_height
-                    ),
-                    "unit": unit,
-                    "qty": qty,
-                    "weight": f"{(item.weight or 0):.2f}",
-                    "size_width_fraction": item.size_width_fraction or "",
-                    "size_height_fraction": item.size_height_fraction or "",
-                    "total_sqft": f"{line_sqft:.2f}",
-                }
-            )
-        processed_items = natsorted(
-            processed_items, key=lambda x: x.get("customer_order_no", "")
+        company_details = company_details.data[0]
+
+        customers = fetch_size_sheet_customers(
+            authenticated_client, list(payload.sheets)
         )
+        missing = [
+            customer_id
+            for customer_id in payload.sheets
+            if customer_id not in customers
+        ]
+        if missing:
+            return failure_response(
+                f"Customer not found: {', '.join(missing)}", {}, 404
+            )
 
-        form_data = {
-            "company_logo": company_details.get("logo"),
-            "company_name": company_details.get("company_name"),
-            "company_address": company_details.get("address"),
-            "company_mobile": ", ".join(company_details.get("mobile_nos", [])),
-            "company_email": company_details.get("email_id"),
-            "company_gst": company_details.get("gst_no"),
-            "company_pan": company_details.get("pan_no"),
-            "title": payload.title or "Size Sheet",
-            "bill_to": {
-                "name": customer.get("company_name", "") or customer.get("name", ""),
-                "address": customer.get("address", ""),
-                "phone": customer.get("phone", ""),
-                "mobile": customer.get("mobile", ""),
-                "gst": customer.get("gstin", ""),
-            },
-            "ship_to": {
-                "name": customer.get("company_name", "") or customer.get("name", ""),
-                "address": customer.get("shipping_address", "")
-                or customer.get("address", ""),
-                "phone": customer.get("phone", ""),
-                "mobile": customer.get("mobile", ""),
-            },
-            "items": processed_items,
-            "has_inch_unit": any(
-                (it.unit or "").lower() == "inch" for it in payload.items
-            ),
-            "total_qty": total_qty,
-            "total_weight": f"{total_weight:.2f}",
-            "total_sqft": f"{total_sqft:.2f}",
-            "remarks": payload.remarks or "",
+        context_started = time.perf_counter()
+        contexts = {
+            customer_id: build_size_sheet_context(
+                company_details,
+                customers[customer_id],
+                sheet,
+                bookmark=batch_format == "pdf",
+            )
+            for customer_id, sheet in payload.sheets.items()
         }
+        record_span("context", context_started)
 
-        pdf_context = {"form": form_data}
-        print("pdf_context: ", pdf_context)
+        # Each render takes its own admission slot, queueing like any other
+        slots = asyncio.Semaphore(SIZE_SHEET_BATCH_CONCURRENCY)
 
-        pdf_bytes = createPdf(pdf_context, templates, "size_sheet.html")
+        async def render(context):
+            async with slots:
+                return await admission.run(
+                    createPdf, context, templates, "size_sheet.html"
+                )
 
-        return Response(
-            content=pdf_bytes,
-            media_type="application/pdf",
-            headers={
-                "Content-Type": "application/pdf",
-                "Content-Disposition": f'attachment; filename="size_sheet_{customer_id}.pdf"',
-            },
+        # Each sheet is written to PDF as it is rendered, so only its bytes are
+        # held until they are zipped or merged
+        pdfs = await gather_renders(render(context) for context in contexts.values())
+
+        if batch_format == "zip":
+            content = await run_in_threadpool(
+                zip_documents,
+                {
+                    f"size_sheet_{customer_id}.pdf": pdf
+                    for customer_id, pdf in zip(contexts, pdfs)
+                },
+            )
+            return await document_response(
+                content,
+                "size_sheets.zip",
+                "application/zip",
+                authenticated_client,
+                delivery,
+            )
+
+        # One PDF with the page and bookmark of every sheet in turn
+        pdf_bytes = await admission.run(merge_pdfs, list(pdfs))
+        return await document_response(
+            pdf_bytes,
+            "size_sheets.pdf",
+            "application/pdf",
+            authenticated_client,
+            delivery,
         )
+    except AdmissionRejected:
+        raise
     except Exception as e:
         print(e)
         return failure_response(str(e), {}, 500)
@@ -292,148 +415,57 @@ async def size_sheet(
 async def size_sheet_excel(
     customer_id: str,
     payload: SizeSheetRequest,
-    # authenticated_client: Client = Depends(get_authenticated_client),
+    delivery: Optional[DeliveryMode] = None,
+    authenticated_client: Client = Depends(get_authenticated_client),
+    admission: RenderAdmissionController = Depends(get_render_admission),
 ):
     try:
-        # Prepare workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Size Sheet"
-
-        # Headers
-        headers = ["Sr No", "Customer Order No", "Size1", "Size2", "Qnt"]
-        ws.append(headers)
-
-        # Sort items by customer_order_no like PDF endpoint
-        items_sorted = natsorted(
-            payload.items, key=lambda it: (it.customer_order_no or "")
-        )
-
-        # Helper to build size strings
-        def build_size_str(value: float, fraction: str, unit: str) -> str:
-            unit_l = (unit or "ft").lower()
-            if unit_l == "inch":
-                whole = int(value) if value is not None else 0
-                frac = (fraction or "").strip()
-                return f"{whole} {frac}".strip()
-            return f"{value}" if value is not None else ""
-
-        # Fill rows
-        for idx, item in enumerate(items_sorted, start=1):
-            size1 = build_size_str(
-                item.size_width, item.size_width_fraction or "", item.unit
-            )
-            size2 = build_size_str(
-                item.size_height, item.size_height_fraction or "", item.unit
-            )
-            row = [
-                idx,
-                item.customer_order_no or "",
-                size1,
-                size2,
-                int(item.quantity or 0),
-            ]
-            ws.append(row)
-
-        # Autosize columns (simple heuristic)
-        for column_cells in ws.columns:
-            max_length = 0
-            col = column_cells[0].column_letter
-            for cell in column_cells:
-                try:
-                    cell_length = len(str(cell.value)) if cell.value is not None else 0
-                    if cell_length > max_length:
-                        max_length = cell_length
-                except Exception:
-                    pass
-            ws.column_dimensions[col].width = max(10, min(50, max_length + 2))
-
-        # Save to bytes
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
+        content = await admission.run(write_size_sheet_workbook, payload)
 
         filename = f"size_sheet_{customer_id}.xlsx"
-        return Response(
-            content=output.getvalue(),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={
-                "Content-Type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                "Content-Disposition": f'attachment; filename="{filename}"',
-            },
+        return await document_response(
+            content,
+            filename,
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            authenticated_client,
+            delivery,
         )
+    except AdmissionRejected:
+        raise
     except Exception as e:
         print(e)
         return failure_response(str(e), {}, 500)
 
 
-@app.get("/stats")
-async def get_stats(authenticated_client: Client = Depends(get_authenticated_client)):
-    try:
-        # Get current month's orders
-        current_month = CURRENT_TIME.strftime("%Y-%m")
-        current_month_orders = (
-            authenticated_client.table(SUPABASE_TABLES.orders)
-            .select(
-                f"""*,
-                    {SUPABASE_TABLES.proforma_invoices}:{SUPABASE_TABLES.proforma_invoices}(*)
-                    """,
-                count="exact",
-            )
-            .gte("created_at", datetime.strptime(f"{current_month}-01", "%Y-%m-%d"))
-            .lt(
-                "created_at",
-                (
-                    datetime.strptime(f"{current_month}-01", "%Y-%m-%d")
-                    + timedelta(days=32)
-                ).replace(day=1),
-            )
-            .eq("active", True)
-            .execute()
-        )
-
-        # Get previous month's orders
-        previous_month = (CURRENT_TIME.replace(day=1) - timedelta(days=1)).strftime(
-            "%Y-%m"
-        )
-        previous_month_orders = (
-            authenticated_client.table(SUPABASE_TABLES.orders)
-            .select(
-                f"""*,
-                    {SUPABASE_TABLES.proforma_invoices}:{SUPABASE_TABLES.proforma_invoices}(*)
-                    """,
-                count="exact",
-            )
-            .gte("created_at", datetime.strptime(f"{previous_month}-01", "%Y-%m-%d"))
-            .lt(
-                "created_at",
-                (
-                    datetime.strptime(f"{previous_month}-01", "%Y-%m-%d")
-                    + timedelta(days=32)
-                ).replace(day=1),
-            )
-            .eq("active", True)
-            .execute()
-        )
-
-        # Get recent activity - new quotations in pending status for current month
+def compute_stats(authenticated_client: Client, scope: str) -> dict:
+    # Monthly counters come from the caller's scope of the order_monthly_stats
+    # rollup; status totals are counted live
+    rollup = ensure_rollup(authenticated_client, scope)
+    current_month = current_month_key()
+    previous_month = previous_month_key(current_month)
+    empty_month = {
+        "order_count": 0,
+        "revenue": 0,
+        "total_sqft": 0,
+        "total_weight": 0,
+    }
+    current_stats = rollup.get(current_month, empty_month)
+    previous_stats = rollup.get(previous_month, empty_month)
+
+    # Get recent activity - new quotations in pending status for current month
+    month_start, month_end = month_range(current_month)
+    with span("db.orders"):
         current_month_quotations = (
             authenticated_client.table(SUPABASE_TABLES.orders)
             .select(
-                f"""*,
-                    {SUPABASE_TABLES.proforma_invoices}:{SUPABASE_TABLES.proforma_invoices}(*),
+                f"""id,created_at,status,
+                    {SUPABASE_TABLES.proforma_invoices}:{SUPABASE_TABLES.proforma_invoices}(pi_name,grand_total),
                     {SUPABASE_TABLES.customers}:{SUPABASE_TABLES.customers}(name, company_name)
                     """,
                 count="exact",
             )
-            .gte("created_at", datetime.strptime(f"{current_month}-01", "%Y-%m-%d"))
-            .lt(
-                "created_at",
-                (
-                    datetime.strptime(f"{current_month}-01", "%Y-%m-%d")
-                    + timedelta(days=32)
-                ).replace(day=1),
-            )
+            .gte("created_at", month_start.isoformat())
+            .lt("created_at", month_end.isoformat())
             .eq("status", "pending")
             .eq("active", True)
             .order("created_at", desc=True)
@@ -441,449 +473,466 @@ async def get_stats(authenticated_client: Client = Depends(get_authenticated_cli
             .execute()
         )
 
-        # Get total customers count
+    # Get total customers count
+    with span("db.customers"):
         total_customers = (
             authenticated_client.table(SUPABASE_TABLES.customers)
-            .select("*", count="exact")
+            .select("id", count="exact", head=True)
             .execute()
         )
 
-        # Get delivered orders count
+    with span("db.orders"):
         delivered_orders = (
             authenticated_client.table(SUPABASE_TABLES.orders)
-            .select("*", count="exact")
-            .eq("status", "delivered")  # Assuming there's a status field
+            .select("id", count="exact", head=True)
+            .eq("status", "delivered")
             .eq("active", True)
             .execute()
         )
 
-        # Get monthly orders data for the last 12 months for graph
-        monthly_orders_data = []
-        for i in range(12):
-            month_date = CURRENT_TIME.replace(day=1) - timedelta(days=i * 30)
-            month_str = month_date.strftime("%Y-%m")
-
-            month_orders = (
-                authenticated_client.table(SUPABASE_TABLES.orders)
-                .select(
-                    f"""*,
-                        {SUPABASE_TABLES.proforma_invoices}:{SUPABASE_TABLES.proforma_invoices}(*)
-                        """,
-                    count="exact",
-                )
-                .gte("created_at", datetime.strptime(f"{month_str}-01", "%Y-%m-%d"))
-                .lt(
-                    "created_at",
-                    (
-                        datetime.strptime(f"{month_str}-01", "%Y-%m-%d")
-                        + timedelta(days=32)
-                    ).replace(day=1),
-                )
-                .eq("active", True)
-                .execute()
-            )
+    # Monthly orders data for the last 12 months for graph
+    monthly_orders_data = []
+    for key in last_month_keys(current_month, 12):
+        month_stats = rollup.get(key, empty_month)
+        monthly_orders_data.append(
+            {
+                "month": month_range(key)[0].strftime("%B %Y"),
+                "month_key": key,
+                "order_count": month_stats["order_count"],
+                "revenue": float(f"{month_stats['revenue']:.2f}"),
+                "total_sqft": round(month_stats["total_sqft"], 2),
+            }
+        )
 
-            month_revenue = (
-                sum(
-                    order["proforma_invoices"]["grand_total"]
-                    for order in month_orders.data
-                )
-                if month_orders.data
-                else 0
-            )
+    # Calculate stats
+    current_month_total = float(current_stats["revenue"])
+    previous_month_total = float(previous_stats["revenue"])
+    current_month_count = current_stats["order_count"]
+    previous_month_count = previous_stats["order_count"]
+
+    # Calculate percentage changes
+    revenue_change_percent = (
+        ((current_month_total - previous_month_total) / previous_month_total * 100)
+        if previous_month_total > 0
+        else 0
+    )
+    order_count_change_percent = (
+        ((current_month_count - previous_month_count) / previous_month_count * 100)
+        if previous_month_count > 0
+        else 0
+    )
+
+    # Process recent activity data
+    recent_activity = []
+    for order in current_month_quotations.data:
+        customer_name = order.get("customers", {}).get("company_name") or order.get(
+            "customers", {}
+        ).get("name", "Unknown")
+        recent_activity.append(
+            {
+                "order_id": order.get("id"),
+                "customer_name": customer_name,
+                "created_at": order.get("created_at"),
+                "proforma_number": order.get("proforma_invoices", {}).get(
+                    "pi_name", "N/A"
+                ),
+                "total_amount": float(
+                    f"{order.get('proforma_invoices', {}).get('grand_total', 0):.2f}"
+                ),
+                "status": order.get("status", "N/A"),
+            }
+        )
 
-            monthly_orders_data.append(
-                {
-                    "month": month_date.strftime("%B %Y"),
-                    "month_key": month_str,
-                    "order_count": month_orders.count or 0,
-                    "revenue": float(f"{month_revenue:.2f}"),
-                }
-            )
+    stats = {
+        "current_month": {
+            "total_orders": current_month_count,
+            "total_revenue": current_month_total,
+            "total_sqft": round(current_stats["total_sqft"], 2),
+            "total_weight": round(current_stats["total_weight"], 2),
+        },
+        "previous_month": {
+            "total_orders": previous_month_count,
+            "total_revenue": previous_month_total,
+            "total_sqft": round(previous_stats["total_sqft"], 2),
+            "total_weight": round(previous_stats["total_weight"], 2),
+        },
+        "changes": {
+            "revenue_change_percent": round(revenue_change_percent, 2),
+            "order_count_change_percent": round(order_count_change_percent, 2),
+        },
+        "recent_activity": {
+            "pending_quotations_count": current_month_quotations.count or 0,
+            "recent_quotations": recent_activity,
+        },
+        "system_overview": {
+            "total_customers": total_customers.count or 0,
+            "delivered_orders": delivered_orders.count or 0,
+        },
+        "monthly_data": monthly_orders_data,
+    }
+
+    return stats
 
-        # Reverse to get chronological order
-        monthly_orders_data.sort(key=lambda x: x["month_key"])
 
-        # Calculate stats
-        current_month_total = sum(
-            float(f"{order['proforma_invoices']['grand_total']:.2f}")
-            for order in current_month_orders.data
-            if order.get("status") != "cancelled"
-        )
-        previous_month_total = sum(
-            float(f"{order['proforma_invoices']['grand_total']:.2f}")
-            for order in previous_month_orders.data
-            if order.get("status") != "cancelled"
+@app.get("/stats")
+async def get_stats(
+    request: Request, authenticated_client: Client = Depends(get_authenticated_client)
+):
+    try:
+        # Cached per RLS visibility scope and month, invalidated on changes
+        scope = visibility_scope(request.state.user)
+        stats, cache_status = await stats_cache.get(
+            (scope, current_month_key()),
+            lambda: run_in_threadpool(compute_stats, authenticated_client, scope),
         )
 
-        current_month_count = current_month_orders.count
-        previous_month_count = previous_month_orders.count
+        response = success_response("Stats fetched successfully", stats, 200)
+        response.headers["X-Cache"] = cache_status
+        return response
+    except Exception as e:
+        print(e)
+        return failure_response(str(e), {}, 500)
 
-        # Calculate percentage changes
-        revenue_change_percent = (
-            ((current_month_total - previous_month_total) / previous_month_total * 100)
-            if previous_month_total > 0
-            else 0
+
+@app.get("/stats/series")
+async def get_stats_series(
+    from_date: date = Query(alias="from"),
+    to_date: date = Query(alias="to"),
+    granularity: Granularity = "month",
+    customer_id: Optional[int] = None,
+    product_id: Optional[int] = None,
+    authenticated_client: Client = Depends(get_authenticated_client),
+):
+    try:
+        if from_date > to_date:
+            return failure_response("from must not be after to", {}, 400)
+        try:
+            edges = bucket_edges(from_date, to_date, granularity)
+        except ValueError as e:
+            return failure_response(str(e), {}, 400)
+
+        # Whole IST calendar buckets, so the first and last are not partial
+        rows = fetch_series_rows(
+            authenticated_client,
+            ist_midnight(edges[0]),
+            ist_midnight(edges[-1]),
+            customer_id,
+            product_id,
         )
-        order_count_change_percent = (
-            ((current_month_count - previous_month_count) / previous_month_count * 100)
-            if previous_month_count > 0
-            else 0
+        series = build_series(rows, edges, granularity, product_id is not None)
+
+        return success_response(
+            "Stats series fetched successfully",
+            {
+                "from": edges[0].isoformat(),
+                "to": (edges[-1] - timedelta(days=1)).isoformat(),
+                "granularity": granularity,
+                "timezone": "Asia/Kolkata",
+                "customer_id": customer_id,
+                "product_id": product_id,
+                "series": series,
+            },
+            200,
         )
+    except Exception as e:
+        print(e)
+        return failure_response(str(e), {}, 500)
 
-        # Process recent activity data
-        recent_activity = []
-        for order in current_month_quotations.data:
-            customer_name = order.get("customers", {}).get("company_name") or order.get(
-                "customers", {}
-            ).get("name", "Unknown")
-            recent_activity.append(
-                {
-                    "order_id": order.get("id"),
-                    "customer_name": customer_name,
-                    "created_at": order.get("created_at"),
-                    "proforma_number": order.get("proforma_invoices", {}).get(
-                        "pi_name", "N/A"
-                    ),
-                    "total_amount": float(
-                        f"{order.get('proforma_invoices', {}).get('grand_total', 0):.2f}"
-                    ),
-                    "status": order.get("status", "N/A"),
-                }
-            )
 
-        stats = {
-            "current_month": {
-                "total_orders": current_month_count,
-                "total_revenue": current_month_total,
-            },
-            "previous_month": {
-                "total_orders": previous_month_count,
-                "total_revenue": previous_month_total,
-            },
-            "changes": {
-                "revenue_change_percent": round(revenue_change_percent, 2),
-                "order_count_change_percent": round(order_count_change_percent, 2),
-            },
-            "recent_activity": {
-                "pending_quotations_count": current_month_quotations.count or 0,
-                "recent_quotations": recent_activity,
-            },
-            "system_overview": {
-                "total_customers": total_customers.count or 0,
-                "delivered_orders": delivered_orders.count or 0,
-            },
-            "monthly_data": monthly_orders_data,
-        }
+@app.get("/orders")
+async def get_orders(
+    limit: int = Query(25, ge=1, le=ORDER_LIST_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    status: Optional[List[str]] = Query(None),
+    customer_id: Optional[int] = None,
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    fields: Optional[str] = None,
+    authenticated_client: Client = Depends(get_authenticated_client),
+):
+    try:
+        try:
+            columns = parse_fields(fields)
+            if cursor:
+                decode_cursor(cursor)
+        except ValueError as e:
+            return failure_response(str(e), {}, 400)
+
+        page = list_orders(
+            authenticated_client,
+            limit,
+            cursor,
+            status,
+            customer_id,
+            # IST calendar days, like /stats/series
+            ist_midnight(from_date) if from_date else None,
+            ist_midnight(to_date + timedelta(days=1)) if to_date else None,
+            columns,
+        )
 
-        return success_response("Stats fetched successfully", stats, 200)
+        return success_response("Orders fetched successfully", page, 200)
     except Exception as e:
         print(e)
         return failure_response(str(e), {}, 500)
 
 
-@app.post("/login")
-async def login(data: UserLoginSchema):
+@app.get("/customers/search")
+async def search_customers(
+    request: Request,
+    q: str = Query(min_length=1),
+    limit: int = Query(10, ge=1, le=CUSTOMER_SEARCH_MAX_LIMIT),
+    authenticated_client: Client = Depends(get_authenticated_client),
+):
     try:
-        data = supabase.auth.sign_in_with_password(
-            credentials={"email": data.email, "password": data.password}
+        index = customer_search_index(visibility_scope(request.state.user))
+        # The first lookup per container builds the index, later ones only
+        # refresh it, so this stays off the event loop
+        customers = await run_in_threadpool(
+            index.lookup, authenticated_client, q, limit
         )
 
-        access_token = data.session.access_token
-        refresh_token = data.session.refresh_token
-        token_type = data.session.token_type
-        identity_data = data.user.identities[0].identity_data
-        user_data = {
-            **identity_data,
-            "access_token": access_token,
-            "refresh_token": refresh_token,
-            "token_type": token_type,
+        return success_response(
+            "Customers fetched successfully", {"customers": customers}, 200
+        )
+    except Exception as e:
+        print(e)
+        return failure_response(str(e), {}, 500)
+
+
+@app.get("/export/orders")
+async def export_orders(
+    request: Request,
+    fy: Optional[str] = None,
+    export_format: ExportFormat = Query("csv", alias="format"),
+    cursor: Optional[str] = None,
+    authenticated_client: Client = Depends(get_authenticated_client),
+):
+    # Orders with their proforma items for one financial year, streamed while
+    # it is fetched. A part cut short by the time or size budget carries the
+    # cursor to request the next part with, see utils.export.stream_export.
+    try:
+        try:
+            fy = fy or get_financial_year()
+            start, end = financial_year_range(fy)
+            if cursor:
+                decode_cursor(cursor)
+        except ValueError as e:
+            return failure_response(str(e), {}, 400)
+
+        budget = ExportBudget.for_request(request.scope.get("aws.context"))
+        headers = {
+            "Content-Disposition": f'attachment; filename="orders_{fy}.{export_format}"'
         }
 
-        return success_response("Login successful", user_data, 200)
+        if export_format == "xlsx":
+            # A zip is only readable once complete, so it is spooled to disk
+            file = tempfile.TemporaryFile()
+            try:
+                next_cursor = await run_in_threadpool(
+                    write_xlsx_export,
+                    authenticated_client,
+                    start,
+                    end,
+                    cursor,
+                    budget,
+                    file,
+                )
+            except Exception:
+                file.close()
+                raise
+            if next_cursor:
+                headers["X-Next-Cursor"] = next_cursor
+            return StreamingResponse(
+                iter_file(file), media_type=EXPORT_MEDIA_TYPES["xlsx"], headers=headers
+            )
+
+        return StreamingResponse(
+            stream_export(
+                authenticated_client, start, end, export_format, cursor, budget
+            ),
+            media_type=EXPORT_MEDIA_TYPES[export_format],
+            headers=headers,
+        )
     except Exception as e:
         print(e)
         return failure_response(str(e), {}, 500)
 
 
-@app.get("/invoice/{order_id}")
-async def generate_pdf(
-    order_id: str,
+@app.get("/customers/{customer_id}/statement")
+async def customer_statement(
+    customer_id: str,
+    fy: Optional[str] = None,
+    delivery: Optional[DeliveryMode] = None,
     authenticated_client: Client = Depends(get_authenticated_client),
+    admission: RenderAdmissionController = Depends(get_render_admission),
 ):
-    # print("Generating invoice for order_id: ", SUPABASE_URL, SUPABASE_ANON_KEY)
+    # Every proforma invoice of the customer in one financial year, with
+    # running balances, as one PDF instead of one /invoice per order
     try:
-        company_details = (
-            authenticated_client.table(SUPABASE_TABLES.company_details)
-            .select("*")
-            .eq("id", 1)
-            .execute()
-        )
+        try:
+            fy = fy or get_financial_year()
+            start, end = financial_year_range(fy)
+        except ValueError as e:
+            return failure_response(str(e), {}, 400)
+
+        with span("db.company_master"):
+            company_details = (
+                authenticated_client.table(SUPABASE_TABLES.company_details)
+                .select("*")
+                .eq("id", 1)
+                .execute()
+            )
 
         if len(company_details.data) == 0:
             return failure_response("Company details not found", {}, 404)
 
         company_details = company_details.data[0]
 
-        order = (
-            authenticated_client.table(SUPABASE_TABLES.orders)
-            .select(
-                f"""*,
-                    {SUPABASE_TABLES.proforma_invoices}:{SUPABASE_TABLES.proforma_invoices}(*,
-                    {SUPABASE_TABLES.users}:{SUPABASE_TABLES.users}(full_name),
-                    {SUPABASE_TABLES.proforma_additional_costs}:{SUPABASE_TABLES.proforma_additional_costs}(*,cost_type:{SUPABASE_TABLES.additional_costs_master}(name)),
-                    {SUPABASE_TABLES.proforma_invoice_items}:{SUPABASE_TABLES.proforma_invoice_items}(*,
-                    {SUPABASE_TABLES.products}:{SUPABASE_TABLES.products}(name,sku),
-                    {SUPABASE_TABLES.thickness_master}:{SUPABASE_TABLES.thickness_master}(name,value,multiplier))),
-                    {SUPABASE_TABLES.customers}:{SUPABASE_TABLES.customers}(name,company_name,gstin,phone,email,address,mobile,shipping_address)
-                    )
-                    """
+        with span("db.customers"):
+            customer_resp = (
+                authenticated_client.table(SUPABASE_TABLES.customers)
+                .select(SIZE_SHEET_CUSTOMER_SELECT)
+                .eq("id", customer_id)
+                .limit(1)
+                .execute()
             )
-            .eq("id", order_id)
-            .execute()
-        )
 
-        if len(order.data) == 0:
-            return failure_response("Order not found", {}, 404)
-
-        order_data = order.data[0]
+        if len(customer_resp.data) == 0:
+            return failure_response("Customer not found", {}, 404)
 
-        proforma_invoice = order_data["proforma_invoices"]
-        customer = order_data["customers"]
-        items = proforma_invoice.get("proforma_items", [])
-
-        # Calculate totals
-        # total_qty = sum(item.get("quantity", 0) for item in items)
-        # total_weight = sum(item.get("weight", 0) for item in items)
-        total_qty = 0
-        total_weight = 0
-
-        # Process items
-        processed_items = []
-        total_items_sqft = 0
-        for item in items:
-            # Reset per-item chargeable sizes
-            chargeable_width = 0.0
-            chargeable_height = 0.0
-            quantity = int(item.get("quantity", 0))
-            total_weight += item.get("weight", 0)
-            total_qty += quantity
-
-            # first convert the width and height to feet
-            # if the unit is mm, then convert to feet
-            if item.get("unit") == "mm":
-                width_feet = float(item.get("size_width", 0))
-                height_feet = float(item.get("size_height", 0))
-
-                total_sqft = width_feet * height_feet * quantity * 10.764 / 1000000
-
-                total_items_sqft += total_sqft
-            elif item.get("unit") == "inch":
-                size_width_fraction = item.get("size_width_fraction", "")
-                size_height_fraction = item.get("size_height_fraction", "")
-                width_whole = item.get("size_width", 0)
-                height_whole = item.get("size_height", 0)
-
-                width_inches = parse_fractional_inch(width_whole, size_width_fraction)
-                height_inches = parse_fractional_inch(
-                    height_whole, size_height_fraction
-                )
+        customer = customer_resp.data[0]
 
-                width_rounding_value = int(item.get("width_rounding_value", 0))
-                height_rounding_value = int(item.get("height_rounding_value", 0))
+        # Pages are fetched and folded into lines as they arrive, so only
+        # the compact lines are held, never the rows of every order
+        pdf_context = await run_in_threadpool(
+            build_statement_context,
+            company_details,
+            customer,
+            fy,
+            iter_statement_orders(authenticated_client, customer_id, start, end),
+        )
 
-                if width_rounding_value and width_rounding_value > 0:
-                    width_inches = (
-                        ceil(width_inches / width_rounding_value) * width_rounding_value
-                    )
-                if height_rounding_value and height_rounding_value > 0:
-                    height_inches = (
-                        ceil(height_inches / height_rounding_value)
-                        * height_rounding_value
-                    )
+        pdf_bytes = await admission.run(
+            createPdf, pdf_context, templates, "statement.html"
+        )
 
-                chargeable_width = width_inches
-                chargeable_height = height_inches
-                width_feet = width_inches
-                height_feet = height_inches
+        return await document_response(
+            pdf_bytes,
+            f"statement_{customer_id}_{fy}.pdf",
+            "application/pdf",
+            authenticated_client,
+            delivery,
+        )
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        print(e)
+        return failure_response(str(e), {}, 500)
 
-                total_sqft = width_feet * height_feet * quantity / 144
 
-                total_items_sqft += total_sqft
+@app.post("/login")
+async def login(data: UserLoginSchema):
+    try:
+        user_data = await run_in_threadpool(sign_in, data.email, data.password)
+        return success_response("Login successful", user_data, 200)
+    except AuthAPIError as e:
+        return failure_response(e.message, {}, e.status_code)
+    except Exception as e:
+        print(e)
+        return failure_response(str(e), {}, 500)
 
-            else:
-                width_feet = item.get("size_width", 0)
-                height_feet = item.get("size_height", 0)
 
-                total_sqft = width_feet * height_feet * quantity
+@app.post("/refresh")
+async def refresh(data: RefreshTokenSchema):
+    try:
+        user_data = await run_in_threadpool(refresh_session, data.refresh_token)
+        return success_response("Token refreshed", user_data, 200)
+    except AuthAPIError as e:
+        return failure_response(e.message, {}, e.status_code)
+    except Exception as e:
+        print(e)
+        return failure_response(str(e), {}, 500)
 
-                total_items_sqft += total_sqft
 
-            processed_items.append(
-                {
-                    "customer_order_no": item.get("customer_order_no", ""),
-                    "name": item.get("products", {}).get("name", ""),
-                    "weight": f'{item.get("weight", 0):.2f}',
-                    "chargeable_width": chargeable_width,
-                    "chargeable_height": chargeable_height,
-                    "width": item.get("size_width", ""),
-                    "height": item.get("size_height", ""),
-                    "total_sqft": f"{total_sqft:.2f}",
-                    "qty": item.get("quantity", 0),
-                    "rate": item.get("rate", 0),
-                    "unit": item.get("unit", ""),
-                    "amount": item.get("amount", 0),
-                    "rate_type": RATE_TYPE[item.get("rate_type", "")],
-                    "size_width_fraction": item.get("size_width_fraction", ""),
-                    "size_height_fraction": item.get("size_height_fraction", ""),
-                    "thickness": item.get("thickness_master", {}).get("name", ""),
-                }
+@app.get("/invoice/{order_id}")
+async def generate_pdf(
+    order_id: str,
+    delivery: Optional[DeliveryMode] = None,
+    authenticated_client: Client = Depends(get_authenticated_client),
+    admission: RenderAdmissionController = Depends(get_render_admission),
+):
+    # print("Generating invoice for order_id: ", SUPABASE_URL, SUPABASE_ANON_KEY)
+    try:
+        with span("db.company_master"):
+            company_details = (
+                authenticated_client.table(SUPABASE_TABLES.company_details)
+                .select(INVOICE_COMPANY_SELECT)
+                .eq("id", 1)
+                .execute()
             )
 
-        # sort the processed_items by customer_order_no
-        # processed_items.sort(key=lambda x: x.get("customer_order_no", ""))
-        processed_items = natsorted(
-            processed_items, key=lambda x: x.get("customer_order_no", "")
-        )
+        if len(company_details.data) == 0:
+            return failure_response("Company details not found", {}, 404)
 
-        additional_costs = proforma_invoice.get("proforma_additional_costs", [])
-        additional_costs_data = list()
+        company_details = company_details.data[0]
 
-        if len(additional_costs) > 0:
-            additional_costs_data = [
-                {
-                    "name": cost.get("cost_name"),
-                    "amount": cost.get("amount", 0),
-                }
-                for cost in additional_costs
-            ]
-
-        # Calculate GST
-        is_gst = proforma_invoice.get("is_gst", False)
-        total_cost_with_additional_cost = proforma_invoice.get("total_amount", 0)
-
-        if len(additional_costs_data) > 0:
-            total_cost_with_additional_cost = total_cost_with_additional_cost + sum(
-                cost.get("amount", 0) for cost in additional_costs_data
+        with span("db.orders"):
+            order = (
+                authenticated_client.table(SUPABASE_TABLES.orders)
+                .select(INVOICE_ORDER_SELECT)
+                .eq("id", order_id)
+                .execute()
             )
 
-        total_gst = proforma_invoice.get("gst_amount", 0)
-        cgst = total_gst / 2 if is_gst else 0
-        sgst = total_gst / 2 if is_gst else 0
+        if len(order.data) == 0:
+            return failure_response("Order not found", {}, 404)
 
-        # Calculate advanced payment
-        has_advanced_payment = proforma_invoice.get("has_advanced_payment", False)
-        advanced_payment_amount = (
-            proforma_invoice.get("advanced_payment_amount", 0)
-            if has_advanced_payment
-            else 0
-        )
-        advanced_payment_notes = (
-            proforma_invoice.get("advanced_payment_notes", "")
-            if has_advanced_payment
-            else ""
-        )
+        order_data = order.data[0]
+        context_started = time.perf_counter()
 
-        grand_total = proforma_invoice.get("grand_total", 0)
-        balance_amount = (
-            grand_total - advanced_payment_amount
-            if has_advanced_payment
-            else grand_total
+        pdf_context = build_invoice_context(company_details, order_data)
+        record_span("context", context_started)
+        debug_sampled("invoice pdf_context", pdf_context)
+
+        pdf_bytes = await admission.run(
+            createPdf, pdf_context, templates, "invoice.html"
         )
 
-        sales_person = "Default"
-        if proforma_invoice.get("users", {}) is not None:
-            sales_person = proforma_invoice.get("users", {}).get("full_name", "")
-
-        form_data = {
-            "company_logo": company_details.get("logo"),
-            "company_name": company_details.get("company_name"),
-            "company_address": company_details.get("address"),
-            "company_mobile": ", ".join(company_details.get("mobile_nos", [])),
-            "company_email": company_details.get("email_id"),
-            "company_gst": company_details.get("gst_no"),
-            "company_pan": company_details.get("pan_no"),
-            "proforma_no": proforma_invoice.get("pi_no"),
-            "sales_person": sales_person,
-            "pi_date": convertDateToProperFormat(proforma_invoice.get("created_at")),
-            "payment_terms": proforma_invoice.get("payment_terms", ""),
-            "destination": (
-                proforma_invoice.get("destination", "N/A")
-                if proforma_invoice.get("destination") is not None
-                else "N/A"
-            ),
-            "delivery_date": (
-                convertDateToProperFormat(order_data.get("delivery_date"))
-                if order_data.get("delivery_date") is not None
-                else "N/A"
-            ),
-            "transport": (
-                proforma_invoice.get("transport_info", "N/A")
-                if proforma_invoice.get("transport_info") is not None
-                else "N/A"
-            ),
-            "unloading": (
-                proforma_invoice.get("unloading_info", "N/A")
-                if proforma_invoice.get("unloading_info") is not None
-                else "N/A"
-            ),
-            "bill_to": {
-                "name": customer.get("company_name") or customer.get("name"),
-                "address": customer.get("address"),
-                "phone": customer.get("phone"),
-                "mobile": customer.get("mobile"),
-                "gst": customer.get("gstin"),
-            },
-            "ship_to": {
-                "name": customer.get("company_name") or customer.get("name"),
-                "address": customer.get("shipping_address") or customer.get("address"),
-                "phone": customer.get("phone"),
-                "mobile": customer.get("mobile"),
-            },
-            "proforma_items": processed_items,
-            "has_inch_unit": any(
-                (it.get("unit", "").lower() == "inch") for it in items
-            ),
-            "total_qty": total_qty,
-            "basic_total": proforma_invoice.get("total_amount", 0),
-            "total_cost_with_additional_cost": f"{total_cost_with_additional_cost:.2f}",
-            "remarks": proforma_invoice.get("remarks", ""),
-            "total_weight": f"{total_weight:.2f}",
-            "total_sqft": f"{total_items_sqft:.2f}",
-            "additional_costs": additional_costs_data,
-            "cgst": f"{cgst:.2f}",
-            "sgst": f"{sgst:.2f}",
-            "is_gst": is_gst,
-            "total_gst": f"{total_gst:.2f}" if is_gst else 0,
-            "grand_total": f"{proforma_invoice.get('grand_total', 0):.2f}",
-            "has_advanced_payment": has_advanced_payment,
-            "advanced_payment_amount": advanced_payment_amount,
-            "advanced_payment_notes": advanced_payment_notes,
-            "balance_amount": f"{balance_amount:.2f}",
-            "bank_name": company_details.get("bank_account_name"),
-            "bank": company_details.get("bank_name"),
-            "branch": company_details.get("branch", ""),
-            "account_no": company_details.get("bank_account_no"),
-            "ifsc": company_details.get("ifsc_code"),
-            "terms": company_details.get("terms_and_conditions", []),
-        }
+        return await document_response(
+            pdf_bytes,
+            f"invoice_{order_id}.pdf",
+            "application/pdf",
+            authenticated_client,
+            delivery,
+        )
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        print(e)
+        return failure_response(str(e), {}, 500)
 
-        pdf_context = {"form": form_data}
 
-        # print("pdf_context: ", pdf_context)
+@app.post("/orders/{order_id}/metrics")
+async def update_order_metrics(
+    order_id: int, authenticated_client: Client = Depends(get_authenticated_client)
+):
+    # Called by the client after it saves an order or its proforma items
+    try:
+        with span("db.orders"):
+            order = (
+                authenticated_client.table(SUPABASE_TABLES.orders)
+                .select("id")
+                .eq("id", order_id)
+                .execute()
+            )
 
-        pdf_bytes = createPdf(pdf_context, templates, "invoice.html")
+        if len(order.data) == 0:
+            return failure_response("Order not found", {}, 404)
 
-        print("PDF generated successfully")
+        metrics = refresh_order_metrics(authenticated_client, [order_id])[0]
+        change_feed.publish(SUPABASE_TABLES.order_metrics, "UPDATE", metrics)
 
-        return Response(
-            content=pdf_bytes,
-            media_type="application/pdf",
-            headers={
-                "Content-Type": "application/pdf",
-                "Content-Disposition": f'attachment; filename="invoice_{order_id}.pdf"',
-            },
-        )
+        return success_response("Order metrics updated successfully", metrics, 200)
     except Exception as e:
         print(e)
         return failure_response(str(e), {}, 500)
@@ -0,0 +1,42 @@
+"""
+The backend reads its settings when utils is first imported, so nothing here
+imports it at module level: the backend fixture starts
+benchmarks.fake_supabase and points the settings at it first. No Supabase
+project or SUPABASE_* environment is needed.
+
+    cd backend
+    python -m pytest -q
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+
+@pytest.fixture(scope="session")
+def backend():
+    """
+    The fake Supabase and main imported against it, shared by the session.
+
+    Returns:
+        tuple: (FakeSupabase, main module)
+    """
+    # Templates are loaded from ./template
+    os.chdir(BACKEND_DIR)
+    from benchmarks.run import start_backend
+
+    return start_backend(0)
+
+
+@pytest.fixture
+def fake(backend):
+    """The session's fake Supabase, emptied and with its call counts cleared."""
+    fake, _ = backend
+    fake.load({})
+    fake.calls.clear()
+    return fake
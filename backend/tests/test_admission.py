@@ -0,0 +1,142 @@
+"""
+utils.admission.RenderAdmissionController: renders beyond the slots queue,
+a full queue or a long wait is rejected with a Retry-After, a release on one
+event loop wakes a waiter parked on another, and gather_renders cancels the
+rest of a batch once one render is rejected.
+"""
+
+import asyncio
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks.fake_supabase import seed
+from benchmarks.run import size_sheet_payload
+
+
+def one_slot(**options):
+    """A controller with a single render slot."""
+    from utils.admission import RenderAdmissionController
+
+    return RenderAdmissionController(memory_budget_mb=100, per_render_mb=100, **options)
+
+
+def test_full_queue_is_rejected(backend):
+    from utils.admission import AdmissionRejected
+
+    controller = one_slot(max_queue=1, queue_timeout=5)
+
+    async def scenario():
+        await controller.acquire()
+        queued = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        assert controller.waiting == 1
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire()
+        assert rejected.value.retry_after >= 1
+
+        controller.release()
+        await asyncio.wait_for(queued, 1)
+        assert (controller.active, controller.waiting) == (1, 0)
+        controller.release()
+
+    asyncio.run(scenario())
+    assert controller.rejected == 1
+    assert controller.active == 0
+
+
+def test_queue_timeout_is_rejected(backend):
+    from utils.admission import AdmissionRejected
+
+    controller = one_slot(max_queue=5, queue_timeout=0.05)
+
+    async def scenario():
+        await controller.acquire()
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire()
+        # The timed out waiter left the queue and took no slot
+        assert (controller.active, controller.waiting) == (1, 0)
+        controller.release()
+
+    asyncio.run(scenario())
+    assert controller.rejected == 1
+    assert controller.active == 0
+
+
+def test_release_wakes_a_waiter_on_another_loop(backend):
+    controller = one_slot(max_queue=5, queue_timeout=5)
+    acquired = threading.Event()
+
+    async def hold():
+        await controller.acquire()
+
+    async def wait_for_slot():
+        await controller.acquire()
+        acquired.set()
+        controller.release()
+
+    asyncio.run(hold())
+    other_loop = threading.Thread(target=asyncio.run, args=(wait_for_slot(),))
+    other_loop.start()
+    for _ in range(500):
+        if controller.waiting:
+            break
+        threading.Event().wait(0.01)
+    assert controller.waiting == 1 and not acquired.is_set()
+
+    # Released from this thread, outside the waiter's loop, which has to be
+    # woken rather than left to notice at its queue timeout
+    controller.release()
+    assert acquired.wait(1)
+    other_loop.join(5)
+    assert (controller.active, controller.waiting) == (0, 0)
+
+
+def test_rejected_render_answers_503_with_retry_after(backend, fake):
+    from utils.admission import get_render_admission
+
+    _, app_module = backend
+    fake.load(seed(orders=0, customers=1))
+    controller = one_slot(max_queue=0, queue_timeout=5)
+    controller.active = controller.capacity
+    app_module.app.dependency_overrides[get_render_admission] = lambda: controller
+    try:
+        response = TestClient(app_module.app).post(
+            "/size-sheet/1",
+            json=size_sheet_payload(3),
+            headers={"Authorization": "Bearer test"},
+        )
+    finally:
+        app_module.app.dependency_overrides.pop(get_render_admission)
+
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    assert controller.rejected == 1
+
+
+def test_rejected_render_cancels_the_rest_of_the_batch(backend):
+    from utils.admission import AdmissionRejected, gather_renders
+
+    controller = one_slot(max_queue=1, queue_timeout=5)
+    rendered = []
+
+    def render(name):
+        # Long enough for the other renders to queue and be rejected
+        threading.Event().wait(0.2)
+        rendered.append(name)
+        return name
+
+    async def scenario():
+        with pytest.raises(AdmissionRejected):
+            await gather_renders(
+                controller.run(render, name) for name in ("first", "queued", "rejected")
+            )
+        return controller.active, controller.waiting
+
+    # The running render finished and gave its slot back, the queued one left
+    # the queue without rendering
+    assert asyncio.run(scenario()) == (0, 0)
+    assert rendered == ["first"]
+    assert controller.rejected == 1
@@ -0,0 +1,131 @@
+"""
+utils.auth: exclusion patterns, and AuthMiddleware on a small Starlette app
+with a stand-in verifier instead of Supabase.
+"""
+
+import threading
+
+import pytest
+from fastapi import HTTPException
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+USER = {"sub": "user-1", "email": "user@example.com"}
+
+
+@pytest.mark.parametrize(
+    "path, excluded",
+    [
+        ("/static", True),
+        ("/static/", True),
+        ("/static/css/app.css", True),
+        ("/staticfoo", False),
+        ("/api/static/x", False),
+        ("/documents/local/2025-05-01/a/sheet.pdf", True),
+        ("/documents", False),
+    ],
+)
+def test_compile_exclusions(backend, path, excluded):
+    from utils.auth import compile_exclusions
+
+    pattern = compile_exclusions(["/static/*", "/documents/local/*"])
+    assert (pattern.match(path) is not None) is excluded
+
+
+def test_no_patterns_compile_to_none(backend):
+    from utils.auth import compile_exclusions
+
+    assert compile_exclusions([]) is None
+
+
+@pytest.fixture
+def auth_app(backend):
+    from utils.auth import AuthMiddleware
+
+    calls = []
+
+    def verifier(token):
+        calls.append((token, threading.current_thread()))
+        if token != "good":
+            raise HTTPException(status_code=401, detail="Invalid token")
+        return {"decoded_token": USER, "authenticated_client": "client"}
+
+    async def whoami(request):
+        return JSONResponse(
+            {
+                "user": getattr(request.state, "user", None),
+                "client": getattr(request.state, "authenticated_client", None),
+            }
+        )
+
+    inner = Starlette(
+        routes=[
+            Route("/me", whoami, methods=["GET", "OPTIONS"]),
+            Route("/login", whoami),
+            Route("/static/{rest:path}", whoami),
+        ]
+    )
+    client = TestClient(
+        AuthMiddleware(
+            inner,
+            verifier=verifier,
+            excluded_paths=["/login"],
+            excluded_patterns=["/static/*"],
+        )
+    )
+    client.calls = calls
+    return client
+
+
+def test_valid_token_sets_request_state(auth_app):
+    response = auth_app.get("/me", headers={"Authorization": "Bearer good"})
+    assert response.status_code == 200
+    assert response.json() == {"user": USER, "client": "client"}
+    # A plain verifier may block on the network, so it runs off the loop
+    [(token, thread)] = auth_app.calls
+    assert token == "good" and thread is not threading.main_thread()
+
+
+@pytest.mark.parametrize("headers", [{}, {"Authorization": "Basic abc"}])
+def test_missing_token_is_rejected(auth_app, headers):
+    response = auth_app.get("/me", headers=headers)
+    assert response.status_code == 401
+    assert response.json()["messages"] == "Access denied"
+    assert auth_app.calls == []
+
+
+def test_invalid_token_is_rejected(auth_app):
+    response = auth_app.get("/me", headers={"Authorization": "Bearer bad"})
+    assert response.status_code == 401
+    assert response.json()["messages"] == "Invalid token"
+
+
+@pytest.mark.parametrize("path", ["/login", "/static/app.css"])
+def test_excluded_paths_skip_the_check(auth_app, path):
+    response = auth_app.get(path)
+    assert response.status_code == 200
+    assert response.json()["user"] is None
+    assert auth_app.calls == []
+
+
+def test_options_passes_through(auth_app):
+    assert auth_app.options("/me").status_code == 200
+    assert auth_app.calls == []
+
+
+def test_async_verifier_is_awaited(backend):
+    from utils.auth import AuthMiddleware
+
+    async def verifier(token):
+        return {"decoded_token": {"sub": token}, "authenticated_client": None}
+
+    async def whoami(request):
+        return JSONResponse(request.state.user)
+
+    client = TestClient(
+        AuthMiddleware(Starlette(routes=[Route("/me", whoami)]), verifier=verifier)
+    )
+    response = client.get("/me", headers={"Authorization": "Bearer abc"})
+    assert response.json() == {"sub": "abc"}
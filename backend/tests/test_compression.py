@@ -0,0 +1,124 @@
+"""
+utils.compression.CompressionMiddleware on a small Starlette app: the coding
+the client rates highest, bodies under minimum_size left alone, streamed
+bodies compressed chunk by chunk, and behind API Gateway only requests whose
+Accept makes it decode base64 bodies get compressed ones.
+"""
+
+import brotli
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+ROWS = [{"id": n, "name": f"Customer {n}"} for n in range(200)]
+
+
+def app(**options):
+    from utils.compression import CompressionMiddleware
+
+    async def rows(request):
+        return JSONResponse(ROWS)
+
+    async def small(request):
+        return JSONResponse({"ok": True})
+
+    async def pdf(request):
+        return Response(b"%PDF-" + b"0" * 4096, media_type="application/pdf")
+
+    async def stream(request):
+        async def lines():
+            for row in ROWS:
+                yield f"{row['id']},{row['name']}\n"
+
+        return StreamingResponse(lines(), media_type="text/csv")
+
+    inner = Starlette(
+        routes=[
+            Route("/rows", rows),
+            Route("/small", small),
+            Route("/pdf", pdf),
+            Route("/stream", stream),
+        ]
+    )
+    return TestClient(CompressionMiddleware(inner, **options))
+
+
+@pytest.fixture
+def client(backend):
+    return app(minimum_size=1024, encodings=("br", "gzip"), binary_media_types=None)
+
+
+def test_accept_encoding_negotiation(backend):
+    from utils.compression import negotiate_encoding
+
+    offered = ("br", "gzip")
+    assert negotiate_encoding("gzip, deflate, br", offered) == "br"
+    assert negotiate_encoding("gzip;q=1, br;q=0.5", offered) == "gzip"
+    assert negotiate_encoding("br;q=0, gzip", offered) == "gzip"
+    assert negotiate_encoding("*;q=0.1", offered) == "br"
+    assert negotiate_encoding("identity", offered) is None
+    assert negotiate_encoding("", offered) is None
+
+
+@pytest.mark.parametrize("coding", ["br", "gzip"])
+def test_whole_body_compressed_with_accepted_coding(client, coding):
+    response = client.get("/rows", headers={"Accept-Encoding": coding})
+    assert response.headers["content-encoding"] == coding
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.json() == ROWS
+    assert int(response.headers["content-length"]) < len(JSONResponse(ROWS).body)
+
+
+def test_small_and_binary_bodies_are_sent_as_they_are(client):
+    for path in ("/small", "/pdf"):
+        response = client.get(path, headers={"Accept-Encoding": "br, gzip"})
+        assert "content-encoding" not in response.headers
+    assert client.get("/small").json() == {"ok": True}
+
+
+def test_streamed_body_is_compressed_in_chunks(client):
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text.splitlines()[:2] == ["0,Customer 0", "1,Customer 1"]
+
+    with client.stream("GET", "/stream", headers={"Accept-Encoding": "br"}) as raw:
+        body = b"".join(raw.iter_raw())
+    assert brotli.decompress(body).decode().count("\n") == len(ROWS)
+
+
+@pytest.mark.parametrize(
+    "accept, compressed",
+    [
+        ("application/json", True),
+        ("application/json, text/plain, */*", True),
+        ("text/csv;q=0.9", True),
+        ("*/*", False),
+        ("", False),
+        ("text/html, application/json", False),
+    ],
+)
+def test_behind_api_gateway_only_binary_accepts_are_compressed(
+    backend, accept, compressed
+):
+    client = app(
+        minimum_size=1024,
+        encodings=("gzip",),
+        binary_media_types=("application/json", "text/csv"),
+    )
+    response = client.get(
+        "/rows", headers={"Accept-Encoding": "gzip", "Accept": accept}
+    )
+    assert ("content-encoding" in response.headers) is compressed
+    assert "Accept" in response.headers["vary"].split(", ")
+    assert response.json() == ROWS
+
+
+def test_no_binary_media_types_on_lambda_means_no_compression(backend):
+    client = app(minimum_size=0, encodings=("gzip",), binary_media_types=())
+    response = client.get(
+        "/rows", headers={"Accept-Encoding": "gzip", "Accept": "application/json"}
+    )
+    assert "content-encoding" not in response.headers
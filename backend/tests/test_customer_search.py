@@ -0,0 +1,81 @@
+"""
+utils.customer_search against the fake Supabase: the index knows roughly how
+much it holds, and the indexes of all scopes share CUSTOMER_SEARCH_MAX_MB.
+"""
+
+from collections import OrderedDict
+
+import pytest
+
+from benchmarks.fake_supabase import seed
+
+
+@pytest.fixture
+def caller(backend, fake):
+    from supabase import create_client
+
+    from utils.constants import SUPABASE_ANON_KEY, SUPABASE_URL
+
+    fake.load(seed(orders=0, customers=200))
+    return create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+
+
+@pytest.fixture
+def indexes(backend, monkeypatch):
+    from utils import customer_search
+
+    monkeypatch.setattr(customer_search, "_indexes", OrderedDict())
+    return customer_search._indexes
+
+
+def test_grams_stop_at_gram_length(backend):
+    from utils.customer_search import GRAM_LENGTH, grams
+
+    assert GRAM_LENGTH == 4
+    assert grams("glass co") == {"g", "gl", "gla", "glas", "c", "co"}
+
+
+def test_size_follows_upserts(caller):
+    from utils.customer_search import CustomerSearchIndex, iter_customer_pages
+
+    index = CustomerSearchIndex()
+    index.build(iter_customer_pages(caller))
+    built = index.size
+    assert built > 0
+
+    # Re-indexing the same rows leaves the estimate where it was
+    index.upsert(caller.table("customers").select("*").execute().data)
+    assert index.size == built
+
+    renamed = dict(caller.table("customers").select("*").eq("id", 1).execute().data[0])
+    renamed["name"] = renamed["name"] + " and a much longer name than before"
+    index.upsert([renamed])
+    assert index.size > built
+
+
+def test_least_recently_used_scopes_are_dropped_over_budget(
+    caller, indexes, monkeypatch
+):
+    from utils import customer_search
+
+    def search(scope: str) -> customer_search.CustomerSearchIndex:
+        index = customer_search.customer_search_index(scope)
+        assert index.lookup(caller, "customer 1", 5)
+        return index
+
+    first = search("user:a")
+    # Room for two indexes of this size, not three
+    monkeypatch.setattr(
+        customer_search, "CUSTOMER_SEARCH_MAX_MB", 2.5 * first.size / 1e6
+    )
+    search("user:b")
+    assert list(indexes) == ["user:a", "user:b"]
+    search("user:a")
+    search("user:c")
+    assert list(indexes) == ["user:a", "user:c"]
+    assert customer_search.customer_search_index("user:a") is first
+
+    # An index over the budget on its own is still kept for its scope
+    monkeypatch.setattr(customer_search, "CUSTOMER_SEARCH_MAX_MB", 0)
+    search("user:d")
+    assert list(indexes) == ["user:d"]
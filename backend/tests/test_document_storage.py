@@ -0,0 +1,100 @@
+"""
+utils.document_storage: LocalDocumentStore only serves files behind links it
+signed that have not expired and stay under its root, and ?delivery=url
+uploads off the event loop.
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+SECRET = "test-secret"
+
+
+@pytest.fixture
+def store(backend, tmp_path):
+    from utils.document_storage import LocalDocumentStore
+
+    store = LocalDocumentStore(str(tmp_path / "documents"), SECRET, "/documents/local")
+    store.upload("2025-05-01/abc/sheet.pdf", b"%PDF-", "application/pdf")
+    (tmp_path / "secret.txt").write_text("outside the root")
+    return store
+
+
+def signed(store, path: str, expires_in: int = 60) -> tuple:
+    """(expires, token) of a signed URL for path."""
+    query = store.signed_url(path, expires_in).split("?", 1)[1]
+    params = dict(part.split("=", 1) for part in query.split("&"))
+    return int(params["expires"]), params["token"]
+
+
+def test_signed_link_resolves(store):
+    path = "2025-05-01/abc/sheet.pdf"
+    url = store.signed_url(path, 60)
+    assert url.startswith(f"/documents/local/{path}?")
+    full_path = store.resolve(path, *signed(store, path))
+    assert open(full_path, "rb").read() == b"%PDF-"
+
+
+def test_tampered_signatures_are_rejected(store):
+    from utils.document_storage import LocalDocumentStore
+
+    path = "2025-05-01/abc/sheet.pdf"
+    expires, token = signed(store, path)
+    flipped = ("0" if token[0] != "0" else "1") + token[1:]
+    assert store.resolve(path, expires, flipped) is None
+    assert store.resolve(path, expires + 3600, token) is None
+    assert store.resolve("2025-05-01/abc/other.pdf", expires, token) is None
+    other = LocalDocumentStore(store.root, "another-secret", "/documents/local")
+    assert store.resolve(path, *signed(other, path)) is None
+
+
+def test_expired_links_are_rejected(store, monkeypatch):
+    path = "2025-05-01/abc/sheet.pdf"
+    expires, token = signed(store, path, expires_in=60)
+    monkeypatch.setattr(time, "time", lambda: expires + 1)
+    assert store.resolve(path, expires, token) is None
+
+
+@pytest.mark.parametrize("path", ["../secret.txt", "2025-05-01/../../secret.txt"])
+def test_paths_outside_the_root_are_rejected(store, path):
+    # Correctly signed, so only the root check stands in the way
+    assert store.resolve(path, *signed(store, path)) is None
+
+
+def test_local_route_checks_the_link(backend, store, monkeypatch):
+    _, app_module = backend
+    monkeypatch.setattr(app_module, "get_document_store", lambda: store)
+    client = TestClient(app_module.app)
+    path = "2025-05-01/abc/sheet.pdf"
+
+    response = client.get(store.signed_url(path, 60))
+    assert response.status_code == 200
+    assert response.content == b"%PDF-"
+    expires, _ = signed(store, path)
+    response = client.get(
+        f"/documents/local/{path}", params={"expires": expires, "token": "0" * 64}
+    )
+    assert response.status_code == 403
+
+
+def test_url_delivery_uploads_off_the_event_loop(backend, monkeypatch):
+    from utils import document_storage
+
+    threads = []
+
+    def store_document(*args):
+        threads.append(threading.current_thread())
+        return "https://storage.example/signed"
+
+    monkeypatch.setattr(document_storage, "store_document", store_document)
+    response = asyncio.run(
+        document_storage.document_response(
+            b"%PDF-", "sheet.pdf", "application/pdf", delivery="url"
+        )
+    )
+    assert b"https://storage.example/signed" in response.body
+    assert threads and threads[0] is not threading.main_thread()
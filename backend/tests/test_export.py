@@ -0,0 +1,72 @@
+"""
+/export/orders split into parts by a byte budget smaller than any order: each
+part still carries an order, and the parts add up to the whole export.
+"""
+
+import csv
+import io
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from openpyxl import load_workbook
+
+from benchmarks.statement import statement_seed
+
+AUTH = {"Authorization": "Bearer test"}
+FY = "2025-26"
+ORDERS = 7
+
+
+@pytest.fixture
+def export(backend, fake, mocker):
+    """GET one part of the export with a 1 byte budget; (order ids, cursor)."""
+    from utils.export import ExportBudget, financial_year_range
+
+    _, app_module = backend
+    db = statement_seed(ORDERS, financial_year_range(FY)[0])
+    fake.load(db)
+    mocker.patch.object(
+        app_module.ExportBudget,
+        "for_request",
+        side_effect=lambda aws_context=None: ExportBudget(60, max_bytes=1),
+    )
+    client = TestClient(app_module.app)
+
+    def get(fmt: str, cursor: str = None) -> tuple:
+        params = {"fy": FY, "format": fmt}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/export/orders", params=params, headers=AUTH)
+        assert response.status_code == 200
+        if fmt == "xlsx":
+            sheet = load_workbook(io.BytesIO(response.content)).active
+            ids = [row[0] for row in sheet.iter_rows(min_row=2, values_only=True)]
+            return ids, response.headers.get("X-Next-Cursor")
+        if fmt == "ndjson":
+            lines = [json.loads(line) for line in response.text.splitlines()]
+            cursor = lines.pop()["next_cursor"] if "next_cursor" in lines[-1] else None
+            return [line["order_id"] for line in lines], cursor
+        rows = list(csv.reader(io.StringIO(response.text)))
+        cursor = rows.pop()[1] if rows[-1][0] == "#next_cursor" else None
+        if rows and rows[0][0] == "order_id":
+            rows = rows[1:]
+        return [int(row[0]) for row in rows], cursor
+
+    get.expected = sorted(order["id"] for order in db["orders"] if order["active"])
+    return get
+
+
+@pytest.mark.parametrize("fmt", ["csv", "ndjson", "xlsx"])
+def test_every_part_carries_an_order(export, fmt):
+    ids, cursor, parts = [], None, 0
+    while True:
+        part, cursor = export(fmt, cursor)
+        assert len(part) == 1
+        assert cursor != "None"
+        ids += part
+        parts += 1
+        if cursor is None:
+            break
+        assert parts <= ORDERS
+    assert sorted(ids) == export.expected
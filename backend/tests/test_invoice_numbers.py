@@ -0,0 +1,192 @@
+"""
+utils.invoice_numbers against the fake Supabase: numbers stay unique across
+containers that share the counter, and every gap is a block tail a recycled
+container dropped or a release that failed.
+"""
+
+import threading
+from collections import Counter
+
+import pytest
+from fastapi.testclient import TestClient
+
+FY = "2025-26"
+CONTAINERS = 4
+THREADS = 4
+LEGACY_THREADS = 2
+NUMBERS = 50
+BLOCK_SIZE = 20
+RECYCLE_EVERY = 60
+
+
+@pytest.fixture
+def new_client(backend):
+    from supabase import create_client
+
+    from utils.constants import SUPABASE_ANON_KEY, SUPABASE_URL
+
+    return lambda: create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+
+
+def test_blocks_are_unique_across_containers(fake, new_client, monkeypatch, mocker):
+    """
+    CONTAINERS allocators, each standing in for one Lambda container with its
+    own client, take numbers from THREADS threads each while LEGACY_THREADS
+    call get_next_invoice_number directly. Every RECYCLE_EVERY numbers a
+    container is replaced without releasing its block, like a recycled
+    Lambda.
+    """
+    from utils.invoice_numbers import InvoiceNumberAllocator
+
+    monkeypatch.setattr(fake, "latency_ms", 2)
+    lock = threading.Lock()
+    issued, dropped, abandoned = [], [], []
+
+    give_up = InvoiceNumberAllocator._give_up
+
+    def recording_give_up(self, client, block):
+        tail = (block.next, block.last)
+        released = give_up(self, client, block)
+        if not released:
+            with lock:
+                abandoned.append(tail)
+        return released
+
+    mocker.patch.object(InvoiceNumberAllocator, "_give_up", recording_give_up)
+
+    class Container:
+        def __init__(self):
+            self.client = new_client()
+            self.allocator = InvoiceNumberAllocator(BLOCK_SIZE, "release")
+            self.taken = 0
+
+    containers = [Container() for _ in range(CONTAINERS)]
+    retired = []
+
+    def worker(slot: int):
+        for _ in range(NUMBERS):
+            with lock:
+                container = containers[slot]
+            number, invoice_number = container.allocator.take(container.client, FY)
+            assert invoice_number == f"{FY}/{number:05d}"
+            with lock:
+                issued.append(number)
+                container.taken += 1
+                if container.taken % RECYCLE_EVERY == 0:
+                    if containers[slot] is container:
+                        retired.append(container)
+                        containers[slot] = Container()
+
+    def legacy_worker():
+        client = new_client()
+        for _ in range(NUMBERS):
+            value = client.rpc("get_next_invoice_number", {"fy_param": FY}).execute()
+            with lock:
+                issued.append(int(value.data.rsplit("/", 1)[-1]))
+
+    threads = [
+        threading.Thread(target=worker, args=(slot,))
+        for slot in range(CONTAINERS)
+        for _ in range(THREADS)
+    ] + [threading.Thread(target=legacy_worker) for _ in range(LEGACY_THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for container in containers:
+        container.allocator.release_all()
+    # Threads that picked a container just before it was replaced may have
+    # reserved with it since, so what it holds now is what it dropped
+    for container in retired:
+        for block in container.allocator.blocks.values():
+            dropped.append((block.next, block.last))
+
+    counts = Counter(issued)
+    assert len(issued) == (CONTAINERS * THREADS + LEGACY_THREADS) * NUMBERS
+    assert sorted(n for n, count in counts.items() if count > 1) == []
+
+    top = fake._invoice_counter(FY)["last_number"]
+    explained = {
+        number
+        for first, last in dropped + abandoned
+        for number in range(first, last + 1)
+    }
+    assert sorted(set(range(1, top + 1)) - set(counts) - explained) == []
+    # One reserve per block instead of one RPC per number
+    assert fake.calls["rpc.reserve_invoice_numbers"] < len(issued) / 4
+
+
+def test_release_all_gives_back_unused_tail(fake, new_client):
+    from utils.invoice_numbers import InvoiceNumberAllocator
+
+    client = new_client()
+    allocator = InvoiceNumberAllocator(BLOCK_SIZE, "release")
+    assert [allocator.next_number(client, FY) for _ in range(3)] == [
+        f"{FY}/00001",
+        f"{FY}/00002",
+        f"{FY}/00003",
+    ]
+    assert allocator.peek(client, FY) == f"{FY}/00004"
+    assert fake._invoice_counter(FY)["last_number"] == BLOCK_SIZE
+
+    allocator.release_all()
+    assert allocator.blocks == {}
+    assert fake._invoice_counter(FY)["last_number"] == 3
+    assert allocator.peek(client, FY) == f"{FY}/00004"
+
+
+def test_strict_policy_calls_get_next_invoice_number(fake, new_client):
+    from utils.invoice_numbers import InvoiceNumberAllocator
+
+    allocator = InvoiceNumberAllocator()
+    assert allocator.policy == "strict"
+    assert allocator.next_number(new_client(), FY) == f"{FY}/00001"
+    assert fake.calls == {"rpc.get_next_invoice_number": 1}
+
+
+def test_shutdown_releases_blocks(backend, fake, monkeypatch):
+    _, app_module = backend
+    monkeypatch.setattr(app_module.invoice_numbers, "policy", "release")
+    monkeypatch.setattr(app_module.invoice_numbers, "block_size", BLOCK_SIZE)
+    monkeypatch.setattr(app_module, "get_financial_year", lambda: FY)
+
+    with TestClient(app_module.app) as client:
+        response = client.get(
+            "/latest-invoice-number", headers={"Authorization": "Bearer test"}
+        )
+        assert response.json()["result"]["invoice_number"] == f"{FY}/00001"
+        assert fake._invoice_counter(FY)["last_number"] == BLOCK_SIZE
+
+    assert app_module.invoice_numbers.blocks == {}
+    assert fake._invoice_counter(FY)["last_number"] == 1
+
+
+def test_lambda_invocations_keep_blocks(backend, fake, monkeypatch):
+    """Mangum runs the lifespan per invocation; the block outlives each one."""
+    _, app_module = backend
+    monkeypatch.setattr(app_module, "INVOICE_RELEASE_ON_SHUTDOWN", False)
+    monkeypatch.setattr(app_module.invoice_numbers, "policy", "release")
+    monkeypatch.setattr(app_module.invoice_numbers, "block_size", BLOCK_SIZE)
+    monkeypatch.setattr(app_module.invoice_numbers, "blocks", {})
+    monkeypatch.setattr(app_module, "get_financial_year", lambda: FY)
+
+    for expected in range(1, 4):
+        with TestClient(app_module.app) as client:
+            response = client.get(
+                "/latest-invoice-number", headers={"Authorization": "Bearer test"}
+            )
+        assert response.json()["result"]["invoice_number"] == f"{FY}/{expected:05d}"
+
+    rpcs = {name: n for name, n in fake.calls.items() if name.startswith("rpc.")}
+    assert rpcs == {"rpc.reserve_invoice_numbers": 1}
+    assert fake._invoice_counter(FY)["last_number"] == BLOCK_SIZE
+
+
+def test_peek_matches_the_next_number(fake, new_client):
+    from utils.invoice_numbers import InvoiceNumberAllocator
+
+    client = new_client()
+    allocator = InvoiceNumberAllocator()
+    peeked = allocator.peek(client, FY)
+    assert fake._invoice_counter(FY)["last_number"] == 0
+    assert allocator.next_number(client, FY) == peeked
@@ -0,0 +1,55 @@
+"""
+utils.json_response: FastJSONResponse, with either encoder, writes what
+FastAPI's own JSONResponse writes after jsonable_encoder, including
+datetimes, dates, Decimals and UUIDs, byte for byte on plain content.
+"""
+
+import json
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from uuid import UUID
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+CONTENT = {
+    "created_at": datetime(2025, 5, 1, 9, 30, 15, 123456),
+    "updated_at": datetime(2025, 5, 1, 9, 30, tzinfo=timezone.utc),
+    "local": datetime(
+        2025, 5, 1, 15, 0, tzinfo=timezone(timedelta(hours=5, minutes=30))
+    ),
+    "invoice_date": date(2025, 5, 1),
+    "total": Decimal("1234.50"),
+    "rate": Decimal("0.125"),
+    "qty": Decimal("12"),
+    "id": UUID("12345678-1234-5678-1234-567812345678"),
+    "items": [{"weight": Decimal("2.75"), "sent_on": date(2025, 4, 30)}],
+    "name": 'Glass — 5 mm ½"',
+}
+
+
+@pytest.fixture(params=["orjson", "json"])
+def response_class(backend, request):
+    from utils.json_response import FastJSONResponse, get_json_encoder
+
+    return type(
+        "Response",
+        (FastJSONResponse,),
+        {"encoder": staticmethod(get_json_encoder(request.param))},
+    )
+
+
+def test_matches_jsonable_encoder(response_class):
+    expected = JSONResponse(jsonable_encoder(CONTENT)).body
+    assert json.loads(response_class(CONTENT).body) == json.loads(expected)
+
+
+def test_plain_content_is_byte_identical(response_class):
+    content = {"id": 7, "name": 'Glass — ½"', "tags": ["a", None, True], "n": []}
+    assert response_class(content).body == JSONResponse(content).body
+
+
+def test_unsupported_types_still_fail(response_class):
+    with pytest.raises(TypeError):
+        response_class({"value": object()})
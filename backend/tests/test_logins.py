@@ -0,0 +1,74 @@
+"""
+/login and /refresh under concurrency. The fake Supabase puts the email into
+the tokens it issues, so a session handed to the wrong caller shows up as the
+wrong user.
+"""
+
+import asyncio
+
+import httpx
+
+LOGINS = 200
+CONCURRENCY = 50
+
+
+async def post_all(app, requests: list) -> list:
+    """POST every (path, body) CONCURRENCY at a time; responses in order."""
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://test", timeout=60
+    ) as client:
+
+        async def post(path, body):
+            async with semaphore:
+                return await client.post(path, json=body)
+
+        return await asyncio.gather(*(post(path, body) for path, body in requests))
+
+
+def test_concurrent_logins_and_refreshes_stay_per_user(backend, fake, monkeypatch):
+    from utils.constants import SUPABASE_ANON_KEY
+    from utils.supabaseClient import supabase
+
+    _, app_module = backend
+    monkeypatch.setattr(fake, "latency_ms", 5)
+    emails = [f"user{i}@example.com" for i in range(LOGINS)]
+
+    logins = asyncio.run(
+        post_all(
+            app_module.app,
+            [("/login", {"email": email, "password": "test"}) for email in emails],
+        )
+    )
+    assert [response.status_code for response in logins] == [200] * LOGINS
+    sessions = [response.json()["result"] for response in logins]
+    assert [(s["email"], s["access_token"]) for s in sessions] == [
+        (email, f"bench-access-{email}") for email in emails
+    ]
+
+    refreshes = asyncio.run(
+        post_all(
+            app_module.app,
+            [("/refresh", {"refresh_token": s["refresh_token"]}) for s in sessions],
+        )
+    )
+    assert [response.status_code for response in refreshes] == [200] * LOGINS
+    assert [response.json()["result"]["email"] for response in refreshes] == emails
+    assert fake.calls["auth.token"] == 2 * LOGINS
+
+    # The shared client never holds a session or sends a user's token
+    assert supabase.auth.get_session() is None
+    assert supabase.options.headers.get("Authorization") == (
+        f"Bearer {SUPABASE_ANON_KEY}"
+    )
+
+
+def test_refresh_rejects_unknown_token(backend, fake):
+    from fastapi.testclient import TestClient
+
+    _, app_module = backend
+    response = TestClient(app_module.app).post(
+        "/refresh", json={"refresh_token": "not-a-refresh-token"}
+    )
+    assert response.status_code == 400
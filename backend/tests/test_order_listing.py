@@ -0,0 +1,46 @@
+"""Cursor tokens of the keyset-paginated listings."""
+
+import base64
+import json
+
+import pytest
+
+
+def token(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+def test_cursor_round_trip(backend):
+    from utils.order_listing import decode_cursor, encode_cursor
+
+    row = {"created_at": "2025-04-01T10:15:00.123456+00:00", "id": 42}
+    assert decode_cursor(encode_cursor(row)) == (row["created_at"], 42)
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        # Filter syntax smuggled in through created_at
+        ['2025-04-01",id.gt.0,created_at.gt."2000-01-01', 1],
+        ["2025-04-01T00:00:00),or(id.gt.0", 1],
+        ["not a timestamp", 1],
+        [None, 1],
+        ["2025-04-01T00:00:00+00:00", "1"],
+        ["2025-04-01T00:00:00+00:00", True],
+        ["2025-04-01T00:00:00+00:00"],
+    ],
+)
+def test_forged_cursors_are_rejected(backend, value):
+    from utils.order_listing import decode_cursor
+
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(token(value))
+
+
+def test_cursor_timestamp_is_reserialised(backend):
+    from utils.order_listing import decode_cursor
+
+    assert decode_cursor(token(["2025-04-01 10:15:00Z", 7])) == (
+        "2025-04-01T10:15:00+00:00",
+        7,
+    )
@@ -0,0 +1,71 @@
+"""
+Stored order_metrics are only used by documents while they still describe the
+items as they are now.
+"""
+
+import pytest
+
+from benchmarks.fake_supabase import seed
+
+
+@pytest.fixture
+def order(backend):
+    """An invoice order row with stored metrics, as INVOICE_ORDER_SELECT reads it."""
+    from utils.constants import SUPABASE_TABLES
+    from utils.order_metrics import compute_order_metrics
+
+    db = seed(orders=1, items_per_order=4, customers=1)
+    items = db[SUPABASE_TABLES.proforma_invoice_items]
+    return {
+        **db[SUPABASE_TABLES.orders][0],
+        SUPABASE_TABLES.customers: db[SUPABASE_TABLES.customers][0],
+        SUPABASE_TABLES.order_metrics: compute_order_metrics(1, items),
+        SUPABASE_TABLES.proforma_invoices: {
+            **db[SUPABASE_TABLES.proforma_invoices][0],
+            SUPABASE_TABLES.proforma_invoice_items: [dict(item) for item in items],
+        },
+    }
+
+
+def test_current_metrics_are_used(order, mocker):
+    from utils import helpers
+
+    compute = mocker.spy(helpers, "compute_item_metrics")
+    helpers.build_invoice_context({}, order)
+    assert compute.call_count == 0
+
+
+@pytest.mark.parametrize(
+    "column, value", [("quantity", 999), ("size_width", 123.5), ("unit", "mm")]
+)
+def test_metrics_of_edited_items_are_recomputed(order, mocker, column, value):
+    from utils import helpers
+    from utils.constants import SUPABASE_TABLES
+
+    items = order[SUPABASE_TABLES.proforma_invoices][
+        SUPABASE_TABLES.proforma_invoice_items
+    ]
+    items[0][column] = value
+    compute = mocker.spy(helpers, "compute_item_metrics")
+    context = helpers.build_invoice_context({}, order)
+
+    assert compute.call_count == 1
+    expected = helpers.compute_item_metrics(items[0])
+    assert context["form"]["total_qty"] == sum(
+        helpers.compute_item_metrics(item)["quantity"] for item in items
+    )
+    assert f"{expected['sqft']:.2f}" in [
+        line["total_sqft"] for line in context["form"]["proforma_items"]
+    ]
+
+
+def test_metrics_without_a_source_are_recomputed(order, mocker):
+    from utils import helpers
+    from utils.constants import SUPABASE_TABLES
+
+    # Rows written before items carried their source
+    for metrics in order[SUPABASE_TABLES.order_metrics]["items"]:
+        del metrics["source"]
+    compute = mocker.spy(helpers, "compute_item_metrics")
+    helpers.build_invoice_context({}, order)
+    assert compute.call_count == len(order[SUPABASE_TABLES.order_metrics]["items"])
@@ -0,0 +1,66 @@
+"""
+utils.profiler.ProfilerMiddleware with PROFILER_STORAGE=storage: profiles
+are uploaded off the event loop and linked by a signed URL, and a profile
+without a client to upload with is logged instead of linked to a local file.
+"""
+
+import threading
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+
+@pytest.fixture
+def profiled(backend, tmp_path, monkeypatch):
+    from utils import profiler
+    from utils.document_storage import LocalDocumentStore
+    from utils.timing import RequestTimingMiddleware
+
+    store = LocalDocumentStore(str(tmp_path), "test-secret", "/documents/local")
+    uploads = []
+
+    def upload(path, content, media_type):
+        uploads.append((path, threading.current_thread()))
+        LocalDocumentStore.upload(store, path, content, media_type)
+
+    monkeypatch.setattr(store, "upload", upload)
+    monkeypatch.setattr(profiler, "PROFILER_STORAGE", "storage")
+    monkeypatch.setattr(profiler, "should_profile", lambda request: True)
+    monkeypatch.setattr(profiler, "get_document_store", lambda client: store)
+
+    def client(authenticated_client):
+        async def page(request):
+            if authenticated_client is not None:
+                request.state.authenticated_client = authenticated_client
+            return PlainTextResponse("ok")
+
+        app = profiler.ProfilerMiddleware(Starlette(routes=[Route("/", page)]))
+        return TestClient(RequestTimingMiddleware(app))
+
+    client.uploads = uploads
+    return client
+
+
+def test_profile_is_uploaded_and_signed(profiled):
+    response = profiled("client").get("/", headers={"X-Request-ID": "req-1"})
+    assert response.status_code == 200
+    assert response.headers["X-Profile-URL"].startswith(
+        "/documents/local/profiles/req-1.collapsed?"
+    )
+    [(path, thread)] = profiled.uploads
+    assert path == "profiles/req-1.collapsed"
+    assert thread is not threading.main_thread()
+
+
+def test_profile_without_a_client_is_logged(profiled, mocker):
+    from utils import profiler
+
+    info = mocker.spy(profiler.logger, "info")
+    response = profiled(None).get("/", headers={"X-Request-ID": "req-2"})
+    assert response.status_code == 200
+    assert "X-Profile-URL" not in response.headers
+    assert profiled.uploads == []
+    assert any(call.args[0].startswith("Profile req-2") for call in info.call_args_list)
@@ -0,0 +1,155 @@
+"""
+The invoice field maps in utils.projections must cover everything the invoice
+context and template read.
+
+The invoice context is built from full seeded rows that record every key read
+from them, and any key outside the declared projection fails the test. The
+template is rendered with StrictUndefined against that context, so a template
+variable the context does not provide fails it too.
+"""
+
+import pytest
+from jinja2 import StrictUndefined
+
+from benchmarks.fake_supabase import FakeSupabase, parse_select, seed
+
+ORDERS = 6
+
+
+class RecordingDict(dict):
+    """dict that records (path, key) for every key read through it."""
+
+    def __init__(self, row: dict, path: tuple, reads: set):
+        super().__init__(
+            {key: record(value, path + (key,), reads) for key, value in row.items()}
+        )
+        self.path = path
+        self.reads = reads
+
+    def __getitem__(self, key):
+        self.reads.add((self.path, key))
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.reads.add((self.path, key))
+        return super().get(key, default)
+
+
+def record(value, path: tuple, reads: set):
+    if isinstance(value, dict):
+        return RecordingDict(value, path, reads)
+    if isinstance(value, list):
+        return [record(v, path, reads) for v in value]
+    return value
+
+
+def star_select(fields: dict) -> str:
+    """Same embeds as the field map, but every level selects *."""
+    embeds = [
+        f"{name}({star_select(children)})"
+        for name, children in fields.items()
+        if children is not None
+    ]
+    return ",".join(["*"] + embeds)
+
+
+def unprojected(fields: dict, table: str, reads: set) -> list:
+    """Dotted names of the keys in reads that the field map does not select."""
+    from utils.projections import embed_key
+
+    def projected(path: tuple, key: str) -> bool:
+        level = fields
+        for part in path:
+            by_key = {embed_key(name): children for name, children in level.items()}
+            if part not in by_key:
+                return False
+            if by_key[part] is None:
+                # Inside a projected json column
+                return True
+            level = by_key[part]
+        return key in {embed_key(name) for name in level}
+
+    return [
+        ".".join((table,) + path + (key,))
+        for path, key in sorted(reads)
+        if not projected(path, key)
+    ]
+
+
+@pytest.fixture
+def invoice_rows(backend):
+    """
+    Full company and order rows, recorded, for ORDERS seeded orders; half of
+    them have stored order_metrics, so both context paths are read.
+
+    Returns:
+        tuple: (company row, [order rows], company reads, order reads)
+    """
+    from utils.constants import SUPABASE_TABLES
+    from utils.order_metrics import compute_order_metrics
+    from utils.projections import INVOICE_COMPANY_FIELDS, INVOICE_ORDER_FIELDS
+
+    fake = FakeSupabase(seed(orders=ORDERS, items_per_order=12, customers=3))
+    for proforma in fake.db[SUPABASE_TABLES.proforma_invoices][::2]:
+        items = [
+            item
+            for item in fake.db[SUPABASE_TABLES.proforma_invoice_items]
+            if item["proforma_invoice_id"] == proforma["id"]
+        ]
+        fake.db[SUPABASE_TABLES.order_metrics].append(
+            compute_order_metrics(proforma["order_id"], items)
+        )
+
+    def full_row(table: str, fields: dict, row_id: int) -> dict:
+        row = next(r for r in fake.db[table] if r["id"] == row_id)
+        return fake._project(table, row, parse_select(star_select(fields)))
+
+    company_reads, order_reads = set(), set()
+    company = record(
+        full_row(SUPABASE_TABLES.company_details, INVOICE_COMPANY_FIELDS, 1),
+        (),
+        company_reads,
+    )
+    orders = [
+        record(
+            full_row(SUPABASE_TABLES.orders, INVOICE_ORDER_FIELDS, order_id),
+            (),
+            order_reads,
+        )
+        for order_id in range(1, ORDERS + 1)
+    ]
+    return company, orders, company_reads, order_reads
+
+
+def test_invoice_projection_covers_context(backend, invoice_rows, mocker):
+    from utils import helpers
+    from utils.constants import SUPABASE_TABLES
+    from utils.projections import INVOICE_COMPANY_FIELDS, INVOICE_ORDER_FIELDS
+
+    company, orders, company_reads, order_reads = invoice_rows
+    compute = mocker.spy(helpers, "compute_item_metrics")
+    for order in orders:
+        helpers.build_invoice_context(company, order)
+
+    # Only the orders without stored metrics computed theirs
+    items = sum(len(o["proforma_invoices"]["proforma_items"]) for o in orders)
+    assert 0 < compute.call_count < items
+    assert (
+        unprojected(
+            INVOICE_COMPANY_FIELDS, SUPABASE_TABLES.company_details, company_reads
+        )
+        == []
+    )
+    assert unprojected(INVOICE_ORDER_FIELDS, SUPABASE_TABLES.orders, order_reads) == []
+
+
+def test_invoice_template_renders_from_projection(backend, invoice_rows):
+    from utils.helpers import build_invoice_context
+
+    _, app_module = backend
+    company, orders, _, _ = invoice_rows
+    template = app_module.templates.env.overlay(undefined=StrictUndefined).get_template(
+        "invoice.html"
+    )
+    for order in orders:
+        assert template.render(**build_invoice_context(company, order))
@@ -0,0 +1,121 @@
+"""
+utils.response_cache: entries are fresh for ttl, then served stale for
+stale_ttl while a single refresh runs, and visibility_scope keys them per
+user or per role as STATS_CACHE_SCOPE says.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def clock(backend, monkeypatch):
+    from utils import response_cache
+
+    clock = SimpleNamespace(now=1000.0)
+    clock.monotonic = lambda: clock.now
+    monkeypatch.setattr(response_cache, "time", clock)
+    return clock
+
+
+def test_stale_entries_are_served_while_one_refresh_runs(clock):
+    from utils.response_cache import ResponseCache
+
+    cache = ResponseCache("test", ttl=5, stale_ttl=20)
+    computed = []
+    release = asyncio.Event()
+
+    async def compute():
+        computed.append(len(computed) + 1)
+        if len(computed) == 2:
+            # Hold the refresh open while more stale requests come in
+            await release.wait()
+        return computed[-1]
+
+    async def scenario():
+        assert await cache.get("k", compute) == (1, "miss")
+        clock.now += 4
+        assert await cache.get("k", compute) == (1, "hit")
+
+        clock.now += 2
+        assert await cache.get("k", compute) == (1, "stale")
+        assert await cache.get("k", compute) == (1, "stale")
+        await asyncio.sleep(0)
+        assert computed == [1, 2]
+        release.set()
+        for _ in range(3):
+            await asyncio.sleep(0)
+        assert await cache.get("k", compute) == (2, "hit")
+
+        # Past ttl + stale_ttl the caller waits for a fresh value
+        clock.now += 30
+        assert await cache.get("k", compute) == (3, "miss")
+
+    asyncio.run(scenario())
+    assert computed == [1, 2, 3]
+
+
+def test_concurrent_misses_share_one_computation(clock):
+    from utils.response_cache import ResponseCache
+
+    cache = ResponseCache("test", ttl=5, stale_ttl=20)
+    computed = []
+
+    async def compute():
+        computed.append(1)
+        await asyncio.sleep(0)
+        return "value"
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get("k", compute) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == [("value", "miss")] * 5
+    assert computed == [1]
+
+
+def test_invalidate_drops_refreshes_in_flight(clock):
+    from utils.response_cache import ResponseCache
+
+    cache = ResponseCache("test", ttl=5, stale_ttl=20)
+    values = iter(["old", "new"])
+
+    async def compute():
+        value = next(values)
+        if value == "old":
+            cache.invalidate("write during compute")
+        return value
+
+    async def scenario():
+        assert await cache.get("k", compute) == ("old", "miss")
+        # The value computed across the invalidation was not kept
+        assert await cache.get("k", compute) == ("new", "miss")
+
+    asyncio.run(scenario())
+
+
+def user(user_id, role=None):
+    return SimpleNamespace(
+        user=SimpleNamespace(id=user_id, app_metadata={"role": role} if role else {})
+    )
+
+
+def test_user_scope_keys_every_user_apart(backend, monkeypatch):
+    from utils import response_cache
+
+    monkeypatch.setattr(response_cache, "STATS_CACHE_SCOPE", "user")
+    assert response_cache.visibility_scope(user("u1", "staff")) == "user:u1"
+    assert response_cache.visibility_scope(user("u2", "staff")) == "user:u2"
+    assert response_cache.visibility_scope(None) == "anonymous"
+
+
+def test_role_scope_shares_keys_within_a_role(backend, monkeypatch):
+    from utils import response_cache
+
+    monkeypatch.setattr(response_cache, "STATS_CACHE_SCOPE", "role")
+    scope = response_cache.visibility_scope
+    assert scope(user("u1", "staff")) == scope(user("u2", "staff")) == "role:staff"
+    assert scope(user("u3", "admin")) == "role:admin"
+    assert scope(user("u4")) == "role:authenticated"
+    assert scope(SimpleNamespace(user=None)) == "anonymous"
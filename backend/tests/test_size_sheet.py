@@ -0,0 +1,99 @@
+"""
+utils.size_sheet condensing: order numbers collapse into ranges in natural
+order, and lines merge only when everything but the order number matches.
+"""
+
+import pytest
+
+
+@pytest.mark.parametrize(
+    "values, expected",
+    [
+        (["A1", "A2", "A3", "A7", "B2"], "A1–3, A7, B2"),
+        (["PO-10", "PO-9", "PO-8"], "PO-8–10"),
+        (["PO-1", "PO-3", "PO-5"], "PO-1, PO-3, PO-5"),
+        (["PO-1", "PO-2", "PO-4", "PO-5", "PO-6"], "PO-1–2, PO-4–6"),
+        (["PO-2", "PO-1", "PO-2", "", None, "PO-1"], "PO-1–2"),
+        (["PO-009", "PO-010"], "PO-009–010"),
+        (["PO-09", "PO-10"], "PO-09–10"),
+        (["A1", "B2", "B3"], "A1, B2–3"),
+        (["urgent", "PO-1", "PO-2"], "PO-1–2, urgent"),
+        (["7"], "7"),
+        ([], ""),
+    ],
+)
+def test_compact_order_numbers(backend, values, expected):
+    from utils.size_sheet import compact_order_numbers
+
+    assert compact_order_numbers(values) == expected
+
+
+def item(**fields):
+    from utils.schema import SizeSheetItem
+
+    defaults = {
+        "product_name": "Clear Float",
+        "thickness": "5 mm",
+        "size_width": 24,
+        "size_height": 36,
+        "unit": "inch",
+    }
+    return SizeSheetItem(**{**defaults, **fields})
+
+
+def test_condense_merges_matching_lines(backend):
+    from utils.size_sheet import condense_size_sheet_items
+
+    items = [
+        item(customer_order_no="PO-1", quantity=2, weight=1.5),
+        item(customer_order_no="PO-2", quantity=1, weight=2.0),
+        item(customer_order_no="PO-3", quantity=3, weight=0.5),
+        item(customer_order_no="PO-2", quantity=1, weight=1.0),
+    ]
+    [(line, merged)] = condense_size_sheet_items(items)
+    assert merged == 4
+    assert line.customer_order_no == "PO-1–3"
+    assert line.quantity == 7
+    assert line.weight == pytest.approx(5.0)
+    assert (line.size_width, line.size_height) == (24, 36)
+
+
+def test_condense_keeps_mixed_sizes_apart(backend):
+    from utils.size_sheet import condense_size_sheet_items
+
+    items = [
+        item(customer_order_no="PO-1"),
+        item(customer_order_no="PO-2", size_width=30),
+        item(customer_order_no="PO-3", size_width_fraction="1/2"),
+        item(customer_order_no="PO-4", thickness="8 mm"),
+        item(customer_order_no="PO-5", unit="ft"),
+        item(customer_order_no="PO-6", width_rounding_value=3),
+        item(customer_order_no="PO-7", unit="INCH"),
+        item(customer_order_no="PO-8", size_width=30),
+    ]
+    lines = condense_size_sheet_items(items)
+    # First appearance order; the unit compares case-insensitively
+    assert [(line.customer_order_no, merged) for line, merged in lines] == [
+        ("PO-1, PO-7", 2),
+        ("PO-2, PO-8", 2),
+        ("PO-3", 1),
+        ("PO-4", 1),
+        ("PO-5", 1),
+        ("PO-6", 1),
+    ]
+    assert sum(line.quantity for line, _ in lines) == len(items)
+
+
+def test_lines_are_only_condensed_on_request(backend):
+    from utils.schema import SizeSheetRequest
+    from utils.size_sheet import size_sheet_lines
+
+    items = [item(customer_order_no="PO-1"), item(customer_order_no="PO-2")]
+    assert [
+        merged for _, merged in size_sheet_lines(SizeSheetRequest(items=items))
+    ] == [
+        1,
+        1,
+    ]
+    condensed = SizeSheetRequest(items=items, condensed=True)
+    assert [merged for _, merged in size_sheet_lines(condensed)] == [2]
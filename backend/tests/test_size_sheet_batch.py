@@ -0,0 +1,83 @@
+"""
+/size-sheet-batch?format=pdf writes each sheet to PDF on its own and merges
+the PDFs, so every sheet is a timed render and the result keeps one page and
+bookmark per customer. WeasyPrint is replaced by one page PDFs bookmarked with
+the name the template marks as the bookmark.
+"""
+
+import io
+import re
+
+import pytest
+from fastapi.testclient import TestClient
+from pypdf import PdfReader, PdfWriter
+
+from benchmarks.fake_supabase import seed
+from benchmarks.run import size_sheet_payload
+
+AUTH = {"Authorization": "Bearer test"}
+SHEETS = 6
+
+
+def one_page_pdf(title: str) -> bytes:
+    writer = PdfWriter()
+    writer.add_blank_page(width=595, height=842)
+    writer.add_outline_item(title, 0)
+    pdf = io.BytesIO()
+    writer.write(pdf)
+    return pdf.getvalue()
+
+
+@pytest.fixture
+def batch(backend, fake, mocker):
+    from utils import helpers
+
+    _, app_module = backend
+    db = seed(orders=0, customers=SHEETS)
+    fake.load(db)
+
+    def write_pdf(document, preset=None) -> bytes:
+        bookmark = re.search(r'class="bookmark"\s*>([^<]*)<', document.html)
+        return one_page_pdf(bookmark.group(1).strip())
+
+    mocker.patch.object(helpers, "write_pdf", side_effect=write_pdf)
+    client = TestClient(app_module.app)
+    sheet = size_sheet_payload(3)
+    ids = [str(customer["id"]) for customer in reversed(db["customers"])]
+
+    def post():
+        return client.post(
+            "/size-sheet-batch",
+            params={"format": "pdf"},
+            json={"sheets": {customer_id: sheet for customer_id in ids}},
+            headers=AUTH,
+        )
+
+    by_id = {str(c["id"]): c for c in db["customers"]}
+    post.names = [by_id[i]["company_name"] or by_id[i]["name"] for i in ids]
+    return post
+
+
+def test_sheets_are_merged_in_order_with_bookmarks(batch):
+    response = batch()
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/pdf"
+
+    reader = PdfReader(io.BytesIO(response.content))
+    assert len(reader.pages) == SHEETS
+    assert [item.title for item in reader.outline] == batch.names
+    assert [reader.get_destination_page_number(item) for item in reader.outline] == (
+        list(range(SHEETS))
+    )
+
+
+def test_every_sheet_is_a_measured_render(batch, mocker):
+    from utils import helpers
+
+    observe = mocker.spy(helpers.RENDER_LATENCY, "observe")
+    measure = mocker.spy(helpers, "measure_render_memory")
+    assert batch().status_code == 200
+    assert [call.args[1] for call in observe.call_args_list] == (
+        ["size_sheet.html"] * SHEETS
+    )
+    assert measure.call_count == SHEETS
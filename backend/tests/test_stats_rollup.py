@@ -0,0 +1,192 @@
+"""
+utils.stats_rollup and /stats against the fake Supabase: months are IST
+calendar months, rows are kept per visibility scope through the service role
+client, and the delta scan picks up every change, in closed months too.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks.fake_supabase import seed
+
+AUTH = {"Authorization": "Bearer test"}
+
+
+@pytest.fixture
+def db(fake):
+    db = seed(orders=60, items_per_order=1, customers=5)
+    fake.load(db)
+    return db
+
+
+@pytest.fixture
+def caller(backend):
+    """A client standing in for a caller's authenticated client."""
+    from supabase import create_client
+
+    from utils.constants import SUPABASE_ANON_KEY, SUPABASE_URL
+
+    return create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+
+
+@pytest.fixture(autouse=True)
+def scan_now(backend):
+    from utils.stats_rollup import request_rollup_scan
+
+    request_rollup_scan()
+
+
+def touch(order: dict, **changes):
+    """Change an order the way a write would, moving its updated_at on."""
+    order.update(changes, updated_at=datetime.now(timezone.utc).isoformat())
+
+
+def rollup_rows(fake, scope: str) -> dict:
+    return {
+        row["month_key"]: row
+        for row in fake.db.get("order_monthly_stats", [])
+        if row["scope"] == scope
+    }
+
+
+def expected_month(db: dict, key: str) -> dict:
+    from utils.stats_rollup import created_month_key
+
+    orders = [
+        order
+        for order in db["orders"]
+        if order["active"] and created_month_key(order["created_at"]) == key
+    ]
+    return {
+        "order_count": len(orders),
+        "delivered_count": sum(o["status"] == "delivered" for o in orders),
+        "pending_count": sum(o["status"] == "pending" for o in orders),
+    }
+
+
+def test_month_keys_are_ist():
+    from utils.stats_rollup import created_month_key, month_range, previous_month_key
+
+    # 20:00 UTC on 30 April is 01:30 IST on 1 May
+    assert created_month_key("2025-04-30T20:00:00+00:00") == "2025-05"
+    assert created_month_key("2025-04-30T18:29:59+00:00") == "2025-04"
+    start, end = month_range("2025-05")
+    assert start.isoformat() == "2025-05-01T00:00:00+05:30"
+    assert end.isoformat() == "2025-06-01T00:00:00+05:30"
+    assert previous_month_key("2025-01") == "2024-12"
+
+
+def test_scopes_are_kept_apart_and_written_by_the_store(fake, db, caller, mocker):
+    from utils import stats_rollup
+
+    table = mocker.spy(caller, "table")
+    first = stats_rollup.ensure_rollup(caller, "user:a")
+    stats_rollup.ensure_rollup(caller, "user:b")
+
+    # The caller's client only reads orders; the rollup goes through the store
+    assert {call.args[0] for call in table.call_args_list} == {"orders"}
+    assert fake.calls["write.order_monthly_stats"] == 2
+    assert rollup_rows(fake, "user:a").keys() == rollup_rows(fake, "user:b").keys()
+    for key, row in first.items():
+        assert row["scope"] == "user:a"
+        assert {field: row[field] for field in expected_month(db, key)} == (
+            expected_month(db, key)
+        )
+
+
+def test_changes_in_closed_months_are_picked_up(fake, db, caller):
+    from utils.stats_rollup import (
+        created_month_key,
+        current_month_key,
+        ensure_rollup,
+        request_rollup_scan,
+    )
+
+    ensure_rollup(caller, "user:a")
+    current = current_month_key()
+    order = next(
+        o
+        for o in db["orders"]
+        if o["status"] == "pending" and created_month_key(o["created_at"]) < current
+    )
+    key = created_month_key(order["created_at"])
+    assert rollup_rows(fake, "user:a")[key]["closed"]
+
+    touch(order, status="delivered")
+    request_rollup_scan()
+    rows = ensure_rollup(caller, "user:a")
+    assert rows[key]["delivered_count"] == expected_month(db, key)["delivered_count"]
+    assert rollup_rows(fake, "user:a")[key]["pending_count"] == (
+        expected_month(db, key)["pending_count"]
+    )
+
+
+def test_scan_pages_on_updated_at_and_id(fake, db, caller):
+    from utils.stats_rollup import (
+        created_month_key,
+        ensure_rollup,
+        rollup_store,
+        scan_order_changes,
+    )
+
+    rows = ensure_rollup(caller, "user:a")
+    # Five orders in five months share one updated_at; pages of two split them
+    orders = {}
+    for order in db["orders"]:
+        orders.setdefault(created_month_key(order["created_at"]), order)
+    changed = list(orders.values())[:5]
+    stamp = (datetime.now(timezone.utc) + timedelta(seconds=1)).isoformat()
+    for order in changed:
+        order.update(status="cancelled", updated_at=stamp)
+
+    refreshed = scan_order_changes(caller, rollup_store(), "user:a", rows, 2)
+    assert {created_month_key(o["created_at"]) for o in changed} <= set(refreshed)
+    assert max(row.get("scanned_until_id") or 0 for row in refreshed.values()) == (
+        max(o["id"] for o in changed)
+    )
+
+
+def test_stats_counts_statuses_live(backend, db, fake):
+    from utils.response_cache import stats_cache
+
+    _, app_module = backend
+    stats_cache.invalidate("test")
+    client = TestClient(app_module.app)
+    before = client.get("/stats", headers=AUTH).json()["result"]
+    delivered = sum(o["status"] == "delivered" and o["active"] for o in db["orders"])
+    assert before["system_overview"]["delivered_orders"] == delivered
+
+    # A write elsewhere, with only the TTL and the delta scan to notice it
+    pending = next(o for o in db["orders"] if o["status"] == "pending")
+    touch(pending, status="delivered")
+    stats_cache.invalidate("test")
+    after = client.get("/stats", headers=AUTH).json()["result"]
+    assert after["system_overview"]["delivered_orders"] == delivered + 1
+
+
+def test_months_over_a_page_are_counted_in_full(fake, caller):
+    from utils.stats_rollup import aggregate_month, created_month_key, month_range
+
+    # More orders in one month than a page holds, several sharing a created_at
+    start = month_range("2025-05")[0]
+    orders = [
+        {
+            "id": n,
+            "customer_id": 1,
+            "status": "delivered" if n % 2 else "pending",
+            "active": True,
+            "created_at": (start + timedelta(hours=n // 3)).isoformat(),
+            "updated_at": start.isoformat(),
+        }
+        for n in range(1, 24)
+    ]
+    fake.load({"orders": orders, "customers": [{"id": 1}]})
+
+    row = aggregate_month(caller, "user:a", "2025-05", page_size=5)
+    assert created_month_key(orders[-1]["created_at"]) == "2025-05"
+    assert row["order_count"] == len(orders)
+    assert row["delivered_count"] == sum(o["status"] == "delivered" for o in orders)
+    assert row["pending_count"] == sum(o["status"] == "pending" for o in orders)
+    assert fake.calls["table.orders"] == 5
@@ -0,0 +1,36 @@
+"""
+utils.stats_series.fetch_series_rows pages through orders that share their
+created_at across page boundaries without skipping or repeating any.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+
+def test_pages_keep_orders_with_equal_timestamps(backend, fake, monkeypatch):
+    from supabase import create_client
+
+    from utils import stats_series
+    from utils.constants import SUPABASE_ANON_KEY, SUPABASE_URL
+
+    start = datetime(2025, 5, 1, tzinfo=timezone.utc)
+    # Ids out of created_at order, four orders per timestamp
+    orders = [
+        {
+            "id": 100 - n,
+            "customer_id": 1,
+            "status": "pending",
+            "active": True,
+            "created_at": (start + timedelta(minutes=n // 4)).isoformat(),
+        }
+        for n in range(22)
+    ]
+    fake.load({"orders": orders, "customers": [{"id": 1}]})
+    monkeypatch.setattr(stats_series, "STATS_SERIES_PAGE_SIZE", 3)
+
+    rows = stats_series.fetch_series_rows(
+        create_client(SUPABASE_URL, SUPABASE_ANON_KEY),
+        start,
+        start + timedelta(days=1),
+    )
+    assert sorted(row["id"] for row in rows) == sorted(o["id"] for o in orders)
+    assert fake.calls["table.orders"] == len(orders) // 3 + 1
@@ -2,3 +2,26 @@ from .constants import *
 from .helpers import *
 from .supabaseClient import *
 from .schema import *
+from .pdf_optimizer import *
+from .document_storage import *
+from .admission import *
+from .timing import *
+from .metrics import *
+from .profiler import *
+from .projections import *
+from .order_metrics import *
+from .stats_rollup import *
+from .stats_series import *
+from .response_cache import *
+from .change_feed import *
+from .order_listing import *
+from .export import *
+from .customer_search import *
+from .invoice_numbers import *
+from .json_response import *
+from .compression import *
+from .auth import *
+from .auth_tokens import *
+from .size_sheet import *
+from .statement import *
+from .render_memory import *
@@ -0,0 +1,235 @@
+import asyncio
+import os
+import resource
+import threading
+import time
+from collections import deque
+from math import ceil
+
+from starlette.concurrency import run_in_threadpool
+
+from .constants import (
+    RENDER_MEMORY_BUDGET_MB,
+    RENDER_MEMORY_PER_RENDER_MB,
+    RENDER_QUEUE_MAX,
+    RENDER_QUEUE_TIMEOUT,
+)
+from .timing import profiled_call
+
+
+def current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__("Renderer busy, retry later")
+        self.retry_after = retry_after
+
+
+def _wake(future):
+    # The waiter may have timed out between being handed a slot and waking
+    if not future.done():
+        future.set_result(None)
+
+
+class RenderAdmissionController:
+    """
+    Bounds concurrent renders by memory instead of request count.
+
+    The number of slots is memory_budget_mb divided by the running estimate of
+    memory per render, which starts at per_render_mb and is updated from the
+    RSS growth measured around each render. A slot is only held while run()
+    renders, not while the request fetches its data. Renders beyond the slots
+    wait in a queue of at most max_queue for up to queue_timeout seconds;
+    anything else is rejected straight away with AdmissionRejected so the
+    caller can answer 503 with Retry-After.
+
+    The state is guarded by a threading.Lock and each waiter parks on a future
+    of its own event loop, so one controller serves every loop in the process
+    (Mangum may run invocations on different loops) and a release on one loop
+    wakes a waiter on another.
+    """
+
+    def __init__(
+        self,
+        memory_budget_mb: float = RENDER_MEMORY_BUDGET_MB,
+        per_render_mb: float = RENDER_MEMORY_PER_RENDER_MB,
+        max_queue: int = RENDER_QUEUE_MAX,
+        queue_timeout: float = RENDER_QUEUE_TIMEOUT,
+    ):
+        self.memory_budget_mb = memory_budget_mb
+        self.min_per_render_mb = per_render_mb
+        self.per_render_mb = per_render_mb
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.avg_render_seconds = 1.0
+        self.active = 0
+        self.running = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._waiters = deque()  # (loop, future), first come first served
+
+    @property
+    def capacity(self) -> int:
+        return max(1, int(self.memory_budget_mb // self.per_render_mb))
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        backlog = (self.waiting + self.active) / self.capacity
+        return max(1, ceil(self.avg_render_seconds * backlog))
+
+    def record(self, memory_mb: float, seconds: float):
+        # Grow the estimate immediately, shrink it slowly
+        with self._lock:
+            if memory_mb > self.per_render_mb:
+                self.per_render_mb = memory_mb
+            else:
+                self.per_render_mb = max(
+                    self.min_per_render_mb, 0.9 * self.per_render_mb + 0.1 * memory_mb
+                )
+            self.avg_render_seconds = 0.8 * self.avg_render_seconds + 0.2 * seconds
+            # A smaller estimate may have freed slots
+            self._hand_over_slots()
+
+    def _hand_over_slots(self):
+        # Called with the lock held
+        while self._waiters and self.active < self.capacity:
+            loop, future = self._waiters.popleft()
+            self.active += 1
+            loop.call_soon_threadsafe(_wake, future)
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.active < self.capacity and not self._waiters:
+                self.active += 1
+                return
+            if len(self._waiters) >= self.max_queue:
+                self.rejected += 1
+                raise AdmissionRejected(self.retry_after())
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+
+        try:
+            await asyncio.wait_for(waiter[1], self.queue_timeout)
+        except BaseException as e:
+            with self._lock:
+                handed_over = waiter not in self._waiters
+                if not handed_over:
+                    self._waiters.remove(waiter)
+            if handed_over:
+                # A slot arrived just as we gave up; pass it on
+                self.release()
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected += 1
+                raise AdmissionRejected(self.retry_after()) from None
+            raise
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+            self._hand_over_slots()
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Take a slot, run a blocking render in the threadpool, record its
+        memory and time and give the slot back. A cancelled run keeps its slot
+        until the render thread is done.
+
+        Raises:
+            AdmissionRejected: No slot came free in time, or the queue is full
+        """
+        await self.acquire()
+        measured = asyncio.ensure_future(self._measure(func, *args, **kwargs))
+        try:
+            return await asyncio.shield(measured)
+        except asyncio.CancelledError:
+            # The render thread can't be stopped, so the slot stays taken
+            # until it finishes
+            await asyncio.gather(measured, return_exceptions=True)
+            raise
+        finally:
+            self.release()
+
+    async def _measure(self, func, *args, **kwargs):
+        rss_before = current_rss_mb()
+        peak_before = peak_rss_mb()
+        started = time.perf_counter()
+        with self._lock:
+            self.running += 1
+            concurrent = self.running
+        try:
+            return await run_in_threadpool(profiled_call, func, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                concurrent = max(concurrent, self.running)
+                self.running -= 1
+            # A new process peak is the best per-render bound we get for free;
+            # growth is shared between the renders that overlapped this one
+            peak_after = peak_rss_mb()
+            if peak_after > peak_before:
+                growth = peak_after - rss_before
+            else:
+                growth = current_rss_mb() - rss_before
+            self.record(max(growth, 0.0) / concurrent, elapsed)
+
+    def snapshot(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "per_render_mb": round(self.per_render_mb, 1),
+            "avg_render_seconds": round(self.avg_render_seconds, 3),
+        }
+
+
+render_admission = RenderAdmissionController()
+
+
+def get_render_admission() -> RenderAdmissionController:
+    """
+    FastAPI dependency for rendering endpoints. It holds no slot: run() takes
+    one for the render only, so fetching data never counts against the
+    memory budget. JSON endpoints don't use it.
+    """
+    return render_admission
+
+
+async def gather_renders(renders) -> list:
+    """
+    Await renders concurrently and return their results in order. When one
+    fails, e.g. with AdmissionRejected, the others are cancelled before the
+    error is raised: queued renders leave the queue and running ones give
+    their slot back once their thread finishes, instead of rendering pages
+    nobody will receive.
+
+    Args:
+        renders (iterable): Coroutines that each call run()
+
+    Returns:
+        list: The result of each render
+    """
+    tasks = [asyncio.ensure_future(render) for render in renders]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
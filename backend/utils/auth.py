@@ -0,0 +1,103 @@
+import inspect
+import re
+from fnmatch import translate
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+
+from .helpers import failure_response, verify_token
+from .timing import span
+
+
+def compile_exclusions(patterns):
+    """
+    One regex for glob patterns like "/static/*", or None without any. A
+    trailing "/*" also matches the bare prefix, so "/static/*" excludes
+    "/static" as the old re.match check did. Unlike that check it no longer
+    excludes unrelated paths that merely start with the prefix, such as
+    "/staticfoo".
+    """
+    globs = []
+    for pattern in patterns:
+        globs.append(pattern)
+        if pattern.endswith("/*"):
+            globs.append(pattern[:-2])
+    if not globs:
+        return None
+    return re.compile("|".join(f"(?:{translate(pattern)})" for pattern in globs))
+
+
+class AuthMiddleware:
+    """
+    Checks the Bearer token of every request outside the excluded paths and
+    keeps what the verifier returns in the ASGI scope, where request.state
+    reads it back: scope["state"]["user"] and
+    scope["state"]["authenticated_client"].
+
+    Unlike an @app.middleware("http") function it does not run the app in a
+    separate task behind a memory stream, so response messages, streamed or
+    not, go to the server as the app sends them.
+
+    Args:
+        app: The ASGI app to wrap
+        verifier: Called with the token, returns a dict with decoded_token
+            and authenticated_client like verify_token, or raises
+            HTTPException. Coroutine functions are awaited, plain functions
+            (which may block on the network) run in the threadpool.
+        excluded_paths: Paths served without a token
+        excluded_patterns: Glob patterns served without a token, "/static/*"
+    """
+
+    def __init__(
+        self,
+        app,
+        verifier=verify_token,
+        excluded_paths=(),
+        excluded_patterns=(),
+    ):
+        self.app = app
+        self.verifier = verifier
+        self.verifier_is_async = inspect.iscoroutinefunction(verifier)
+        self.excluded_paths = frozenset(excluded_paths)
+        self.excluded_pattern = compile_exclusions(excluded_patterns)
+
+    def is_excluded(self, path: str) -> bool:
+        return path in self.excluded_paths or (
+            self.excluded_pattern is not None
+            and self.excluded_pattern.match(path) is not None
+        )
+
+    async def verify(self, token: str) -> dict:
+        if self.verifier_is_async:
+            return await self.verifier(token)
+        return await run_in_threadpool(self.verifier, token)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] == "OPTIONS"
+            or self.is_excluded(scope["path"])
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        auth_header = Headers(scope=scope).get("authorization")
+        if auth_header is None or not auth_header.startswith("Bearer "):
+            response = failure_response("Access denied", {}, 401)
+            await response(scope, receive, send)
+            return
+
+        token = auth_header.split(" ")[1]
+        try:
+            with span("auth"):
+                user = await self.verify(token)
+        except HTTPException as e:
+            response = failure_response(e.detail, status_code=e.status_code)
+            await response(scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})
+        state["user"] = user["decoded_token"]
+        state["authenticated_client"] = user["authenticated_client"]
+        await self.app(scope, receive, send)
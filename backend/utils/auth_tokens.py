@@ -0,0 +1,96 @@
+import threading
+
+import httpx
+
+from .constants import (
+    AUTH_HTTP_MAX_CONNECTIONS,
+    AUTH_HTTP_TIMEOUT,
+    SUPABASE_ANON_KEY,
+    SUPABASE_URL,
+)
+from .timing import span
+
+
+class AuthAPIError(Exception):
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+# /login and /refresh post to GoTrue's token endpoint directly. Signing in
+# through the shared supabase client stored the session on it, so concurrent
+# logins in one container replaced each other's session, and every later
+# query through that client ran with the last user's token. Here nothing is
+# kept: the tokens go back to the caller, and the one pooled httpx.Client
+# (thread-safe) only holds connections.
+_client = None
+_client_lock = threading.Lock()
+
+
+def auth_http_client() -> httpx.Client:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = httpx.Client(
+                    base_url=f"{SUPABASE_URL}/auth/v1",
+                    headers={"apikey": SUPABASE_ANON_KEY},
+                    timeout=AUTH_HTTP_TIMEOUT,
+                    limits=httpx.Limits(
+                        max_connections=AUTH_HTTP_MAX_CONNECTIONS,
+                        max_keepalive_connections=AUTH_HTTP_MAX_CONNECTIONS,
+                    ),
+                )
+    return _client
+
+
+def request_token(grant_type: str, body: dict) -> dict:
+    """
+    POST /token with one grant and return GoTrue's session payload.
+
+    Raises:
+        AuthAPIError: GoTrue rejected the request, with its message and status
+    """
+    response = auth_http_client().post(
+        "/token", params={"grant_type": grant_type}, json=body
+    )
+    try:
+        payload = response.json()
+    except ValueError:
+        payload = {}
+    if response.status_code >= 400:
+        message = (
+            payload.get("error_description")
+            or payload.get("msg")
+            or payload.get("message")
+            or payload.get("error")
+            or response.reason_phrase
+        )
+        raise AuthAPIError(message, response.status_code)
+    return payload
+
+
+def session_data(session: dict) -> dict:
+    """The identity and tokens returned to the client, as /login always did."""
+    identities = (session.get("user") or {}).get("identities") or [{}]
+    return {
+        **(identities[0].get("identity_data") or {}),
+        "access_token": session["access_token"],
+        "refresh_token": session["refresh_token"],
+        "token_type": session["token_type"],
+        "expires_in": session.get("expires_in"),
+        "expires_at": session.get("expires_at"),
+    }
+
+
+def sign_in(email: str, password: str) -> dict:
+    with span("auth.sign_in"):
+        session = request_token("password", {"email": email, "password": password})
+    return session_data(session)
+
+
+def refresh_session(refresh_token: str) -> dict:
+    with span("auth.refresh"):
+        session = request_token("refresh_token", {"refresh_token": refresh_token})
+    return session_data(session)
@@ -0,0 +1,90 @@
+from realtime import AsyncRealtimeClient
+
+from .constants import (
+    CHANGE_FEED_BACKEND,
+    SUPABASE_ANON_KEY,
+    SUPABASE_SERVICE_ROLE_KEY,
+    SUPABASE_URL,
+)
+from .timing import logger
+
+
+class LocalChangeFeed:
+    """
+    In-process stand-in for Supabase Realtime: publish() calls the listeners
+    directly. Used by tests and benchmarks, and for the backend's own writes.
+    """
+
+    def __init__(self):
+        self.listeners = []
+
+    def subscribe(self, tables, callback):
+        """callback(table, payload) for every change to one of tables."""
+        self.listeners.append((set(tables), callback))
+
+    def publish(self, table: str, event_type: str = "UPDATE", record: dict = None):
+        payload = {"table": table, "type": event_type, "record": record or {}}
+        for tables, callback in self.listeners:
+            if table in tables:
+                callback(table, payload)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class RealtimeChangeFeed(LocalChangeFeed):
+    """
+    Postgres changes from Supabase Realtime over one websocket. Realtime
+    applies RLS to what it sends, so the key must be able to see the tables.
+    publish() still works for changes made by this process.
+    """
+
+    def __init__(self, url: str, key: str):
+        super().__init__()
+        self.client = AsyncRealtimeClient(
+            f"{url}/realtime/v1", key, max_retries=3, initial_backoff=0.5
+        )
+
+    def _dispatch(self, payload: dict):
+        data = payload.get("data", payload)
+        table = data.get("table")
+        for tables, callback in self.listeners:
+            if table in tables:
+                callback(table, data)
+
+    async def start(self):
+        tables = set().union(*(tables for tables, _ in self.listeners))
+        if not tables:
+            return
+        try:
+            await self.client.connect()
+            channel = self.client.channel("backend-change-feed")
+            for table in sorted(tables):
+                channel.on_postgres_changes("*", self._dispatch, table=table)
+            await channel.subscribe()
+        except Exception as e:
+            # Caches still expire on their TTL without the feed
+            logger.warning(f"Realtime change feed unavailable: {e}")
+
+    async def stop(self):
+        if self.client.is_connected:
+            await self.client.close()
+
+
+def get_change_feed() -> LocalChangeFeed:
+    if CHANGE_FEED_BACKEND == "realtime":
+        if not SUPABASE_SERVICE_ROLE_KEY:
+            logger.warning(
+                "Realtime change feed without SUPABASE_SERVICE_ROLE_KEY only "
+                "receives changes RLS shows to the anon key"
+            )
+        return RealtimeChangeFeed(
+            SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY or SUPABASE_ANON_KEY
+        )
+    return LocalChangeFeed()
+
+
+change_feed = get_change_feed()
@@ -0,0 +1,221 @@
+import zlib
+from fnmatch import fnmatchcase
+from functools import lru_cache
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from .constants import (
+    API_BINARY_MEDIA_TYPES,
+    COMPRESSION_BROTLI_QUALITY,
+    COMPRESSION_ENCODINGS,
+    COMPRESSION_GZIP_LEVEL,
+    COMPRESSION_MIN_BYTES,
+)
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - Brotli is pinned in requirements.txt
+    brotli = None
+
+
+# Only text formats are worth compressing. PDFs, XLSX (a zip) and images are
+# compressed already and come out the same size or larger, so they are sent
+# as they are, like anything else not listed here.
+COMPRESSIBLE_MEDIA_TYPES = {
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+}
+
+# No body, or a body the client already has (byte ranges of the identity body)
+UNCOMPRESSED_STATUS_CODES = {204, 206, 304}
+
+
+def is_compressible(content_type: str) -> bool:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return (
+        media_type.startswith("text/")
+        or media_type.endswith(("+json", "+xml"))
+        or media_type in COMPRESSIBLE_MEDIA_TYPES
+    )
+
+
+@lru_cache(maxsize=256)
+def accepts_binary(accept: str, binary_media_types: tuple) -> bool:
+    """
+    Whether API Gateway would decode a base64 body for a request with this
+    Accept header: its first media type matches one of binary_media_types,
+    which may hold wildcards like "image/*".
+    """
+    first = accept.split(",", 1)[0].split(";", 1)[0].strip().lower()
+    return bool(first) and any(
+        fnmatchcase(first, pattern) for pattern in binary_media_types
+    )
+
+
+@lru_cache(maxsize=256)
+def negotiate_encoding(accept_encoding: str, offered: tuple = COMPRESSION_ENCODINGS):
+    """
+    The coding from offered that Accept-Encoding rates highest, ties going to
+    the earlier one in offered, or None when identity should be sent.
+
+    Args:
+        accept_encoding (str): The request's Accept-Encoding header
+        offered (tuple): Codings the server can produce, by preference
+
+    Returns:
+        str | None: "br", "gzip" or None
+    """
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+    best, best_weight = None, 0.0
+    for coding in offered:
+        if coding == "br" and brotli is None:
+            continue
+        weight = weights.get(coding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+class BrotliEncoder:
+    def __init__(self, quality: int = COMPRESSION_BROTLI_QUALITY):
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        output = self.compressor.process(data) if data else b""
+        return output + (self.compressor.finish() if final else self.compressor.flush())
+
+
+class GzipEncoder:
+    def __init__(self, level: int = COMPRESSION_GZIP_LEVEL):
+        # wbits 16 + 15 writes the gzip header and trailer
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        output = self.compressor.compress(data)
+        return output + self.compressor.flush(
+            zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH
+        )
+
+
+ENCODERS = {"br": BrotliEncoder, "gzip": GzipEncoder}
+
+
+class CompressionMiddleware:
+    """
+    Compresses text responses with the best coding the client accepts.
+
+    A response with a Content-Length is compressed whole, and only when it is
+    at least minimum_size bytes and comes out smaller. A streamed response
+    without one (the exports) is compressed chunk by chunk and flushed after
+    each chunk, so rows still reach the client as they are produced.
+
+    Behind Mangum the compressed body fails its UTF-8 check and is returned
+    base64 encoded. API Gateway decodes it only when the request's Accept
+    matches the API's binaryMediaTypes, not by the response's Content-Type,
+    so with binary_media_types set (API_BINARY_MEDIA_TYPES, on Lambda) other
+    requests, e.g. with fetch's default Accept: */*, are answered
+    uncompressed.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = COMPRESSION_MIN_BYTES,
+        encodings: tuple = COMPRESSION_ENCODINGS,
+        binary_media_types: tuple = API_BINARY_MEDIA_TYPES,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encodings = tuple(coding for coding in encodings if coding in ENCODERS)
+        self.binary_media_types = binary_media_types
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.encodings:
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        coding = negotiate_encoding(
+            request_headers.get("accept-encoding", ""), self.encodings
+        )
+        if self.binary_media_types is not None and not accepts_binary(
+            request_headers.get("accept", ""), self.binary_media_types
+        ):
+            coding = None
+        start_message = None
+        chunks = []
+        encoder = None
+
+        async def send_compressed(message):
+            nonlocal start_message, encoder
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                if self.should_compress(message["status"], headers):
+                    headers.add_vary_header("Accept-Encoding")
+                    if self.binary_media_types is not None:
+                        headers.add_vary_header("Accept")
+                    length = headers.get("content-length")
+                    if coding is not None and length is None:
+                        encoder = ENCODERS[coding]()
+                        headers["Content-Encoding"] = coding
+                    elif coding is not None and int(length) >= self.minimum_size:
+                        # Held back until the whole body is in, to compress it
+                        # in one go and send its compressed Content-Length
+                        start_message = message
+                        return
+                await send(message)
+                return
+
+            if message["type"] == "http.response.body" and start_message is not None:
+                chunks.append(message.get("body", b""))
+                if message.get("more_body", False):
+                    return
+                body = b"".join(chunks)
+                compressed = ENCODERS[coding]().compress(body, final=True)
+                if len(compressed) < len(body):
+                    body = compressed
+                    headers = MutableHeaders(raw=start_message["headers"])
+                    headers["Content-Encoding"] = coding
+                    headers["Content-Length"] = str(len(body))
+                await send(start_message)
+                await send({**message, "body": body})
+                return
+
+            if message["type"] == "http.response.body" and encoder is not None:
+                message = {
+                    **message,
+                    "body": encoder.compress(
+                        message.get("body", b""),
+                        final=not message.get("more_body", False),
+                    ),
+                }
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+    @staticmethod
+    def should_compress(status: int, headers: MutableHeaders) -> bool:
+        return (
+            status >= 200
+            and status not in UNCOMPRESSED_STATUS_CODES
+            and "content-encoding" not in headers
+            and "no-transform" not in headers.get("cache-control", "").lower()
+            and is_compressible(headers.get("content-type", ""))
+        )
@@ -6,6 +6,182 @@ load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
+# Set on the Lambda only so utils.stats_rollup can keep order_monthly_stats,
+# which callers cannot read or write; every route queries with the caller's
+# client. Also used by the maintenance commands and, off Lambda, by the
+# Realtime change feed.
+SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Fraction of debug_sampled() calls that are actually logged
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", 0.01))
+
+# CloudWatch Embedded Metric Format in request logs, on by default in Lambda
+METRICS_EMF = os.getenv(
+    "METRICS_EMF", "true" if os.getenv("AWS_LAMBDA_FUNCTION_NAME") else "false"
+).lower() in ("1", "true", "yes")
+METRICS_NAMESPACE = os.getenv("METRICS_NAMESPACE", "MirrorManagement")
+
+# Request profiler: admins opt in with X-Profile: 1 (or ?profile=1), and
+# PROFILER_SAMPLE_RATE of all requests are profiled regardless
+PROFILER_SAMPLE_RATE = float(os.getenv("PROFILER_SAMPLE_RATE", 0))
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", 5))
+PROFILER_ADMIN_EMAILS = {
+    email.strip().lower()
+    for email in os.getenv("PROFILER_ADMIN_EMAILS", "").split(",")
+    if email.strip()
+}
+# "tmp" writes under PROFILER_DIR, "storage" uploads like DOCUMENT_STORAGE_*.
+# On Lambda /tmp is neither reachable by the client nor kept once the
+# container is recycled, so profiles go to storage there by default.
+PROFILER_STORAGE = os.getenv(
+    "PROFILER_STORAGE", "storage" if os.getenv("AWS_LAMBDA_FUNCTION_NAME") else "tmp"
+)
+PROFILER_DIR = os.getenv("PROFILER_DIR", "/tmp/profiles")
+
+# One of utils.pdf_optimizer.PDF_PRESETS: none, screen, ebook, print
+PDF_OPTIMIZE_PRESET = os.getenv("PDF_OPTIMIZE_PRESET", "ebook")
+
+# Rendered documents larger than this are uploaded and returned as a signed
+# URL. Lambda caps responses at 6 MB and API Gateway base64 adds ~33%.
+DOCUMENT_INLINE_MAX_BYTES = int(os.getenv("DOCUMENT_INLINE_MAX_BYTES", 4_000_000))
+DOCUMENT_SIGNED_URL_TTL = int(os.getenv("DOCUMENT_SIGNED_URL_TTL", 300))
+# "supabase" or "local" (filesystem stand-in under DOCUMENT_LOCAL_DIR)
+DOCUMENT_STORAGE_BACKEND = os.getenv("DOCUMENT_STORAGE_BACKEND", "supabase")
+DOCUMENT_STORAGE_BUCKET = os.getenv("DOCUMENT_STORAGE_BUCKET", "documents")
+DOCUMENT_LOCAL_DIR = os.getenv("DOCUMENT_LOCAL_DIR", "/tmp/documents")
+# Signs the links the local store hands out, served by DOCUMENT_LOCAL_URL_PREFIX.
+# Required with the local backend; never reuse a key clients can see.
+DOCUMENT_LOCAL_SECRET = os.getenv("DOCUMENT_LOCAL_SECRET")
+DOCUMENT_LOCAL_URL_PREFIX = os.getenv("DOCUMENT_LOCAL_URL_PREFIX", "/documents/local")
+
+# Render admission control. The budget defaults to the Lambda memory size
+# minus what the interpreter and imports already hold.
+RENDER_MEMORY_BUDGET_MB = float(
+    os.getenv(
+        "RENDER_MEMORY_BUDGET_MB",
+        int(os.getenv("AWS_LAMBDA_FUNCTION_MEMORY_SIZE", 1024)) - 300,
+    )
+)
+RENDER_MEMORY_PER_RENDER_MB = float(os.getenv("RENDER_MEMORY_PER_RENDER_MB", 150))
+RENDER_QUEUE_MAX = int(os.getenv("RENDER_QUEUE_MAX", 8))
+RENDER_QUEUE_TIMEOUT = float(os.getenv("RENDER_QUEUE_TIMEOUT", 10))
+
+# Render memory profiling, see utils.render_memory. Off unless
+# RENDER_MEMORY_SAMPLE_RATE > 0; tracemalloc slows a traced render down
+# noticeably, so keep the rate low in production.
+RENDER_MEMORY_SAMPLE_RATE = float(os.getenv("RENDER_MEMORY_SAMPLE_RATE", 0))
+RENDER_MEMORY_RSS_INTERVAL_MS = float(os.getenv("RENDER_MEMORY_RSS_INTERVAL_MS", 5))
+
+
+# /stats runs the order_monthly_stats delta scan at most this often per container
+STATS_ROLLUP_SCAN_SECONDS = float(os.getenv("STATS_ROLLUP_SCAN_SECONDS", 30))
+
+# /stats response cache: fresh for STATS_CACHE_TTL seconds, then served stale
+# while one refresh runs for STATS_CACHE_STALE_TTL more. STATS_CACHE_SCOPE is
+# "user" or "role", see utils.response_cache.visibility_scope.
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", 15))
+STATS_CACHE_STALE_TTL = float(os.getenv("STATS_CACHE_STALE_TTL", 45))
+STATS_CACHE_SCOPE = os.getenv("STATS_CACHE_SCOPE", "user")
+# "realtime" subscribes to Supabase Realtime for cache invalidation, "local"
+# only sees this process's writes (tests and benchmarks). Mangum runs the
+# lifespan on every invocation, so on Lambda the default is "local": other
+# containers' writes reach /stats within STATS_ROLLUP_SCAN_SECONDS plus the
+# cache TTLs, through the rollup delta scan.
+CHANGE_FEED_BACKEND = os.getenv(
+    "CHANGE_FEED_BACKEND",
+    "local" if os.getenv("AWS_LAMBDA_FUNCTION_NAME") else "realtime",
+)
+
+# /export/orders stops at an order boundary and returns a cursor to resume
+# from once EXPORT_TIME_BUDGET seconds have passed (or the Lambda has less than
+# EXPORT_DEADLINE_MARGIN seconds left), or before the body would pass
+# EXPORT_MAX_BYTES. Mangum buffers the whole body, so on Lambda the byte
+# budget defaults to DOCUMENT_INLINE_MAX_BYTES; 0 means no limit. A part always
+# carries at least one order, even one larger than the byte budget.
+EXPORT_PAGE_ORDERS = int(os.getenv("EXPORT_PAGE_ORDERS", 50))
+EXPORT_TIME_BUDGET = float(os.getenv("EXPORT_TIME_BUDGET", 25))
+EXPORT_DEADLINE_MARGIN = float(os.getenv("EXPORT_DEADLINE_MARGIN", 4))
+EXPORT_MAX_BYTES = int(
+    os.getenv(
+        "EXPORT_MAX_BYTES",
+        DOCUMENT_INLINE_MAX_BYTES if os.getenv("AWS_LAMBDA_FUNCTION_NAME") else 0,
+    )
+)
+
+# /customers/search keeps an in-memory index per visibility scope, refreshed
+# from customers.updated_at at most every CUSTOMER_SEARCH_REFRESH_SECONDS and
+# rebuilt from scratch (dropping deleted customers) every
+# CUSTOMER_SEARCH_REBUILD_SECONDS. The least recently used indexes are dropped
+# once all of them together hold more than CUSTOMER_SEARCH_MAX_MB
+CUSTOMER_SEARCH_REFRESH_SECONDS = float(
+    os.getenv("CUSTOMER_SEARCH_REFRESH_SECONDS", 30)
+)
+CUSTOMER_SEARCH_REBUILD_SECONDS = float(
+    os.getenv("CUSTOMER_SEARCH_REBUILD_SECONDS", 3600)
+)
+CUSTOMER_SEARCH_MAX_MB = float(os.getenv("CUSTOMER_SEARCH_MAX_MB", 64))
+
+# Invoice numbers come from get_next_invoice_number one at a time ("strict"),
+# or with INVOICE_GAP_POLICY=release are reserved INVOICE_BLOCK_SIZE at a time
+# and kept for at most INVOICE_BLOCK_TTL seconds, see utils.invoice_numbers.
+# /latest-invoice-number?peek=true needs the invoice number migration under
+# either policy.
+INVOICE_GAP_POLICY = os.getenv("INVOICE_GAP_POLICY", "strict")
+INVOICE_BLOCK_SIZE = int(os.getenv("INVOICE_BLOCK_SIZE", 20))
+INVOICE_BLOCK_TTL = float(os.getenv("INVOICE_BLOCK_TTL", 300))
+# Release unused block tails when the app shuts down. Mangum runs the lifespan
+# on every invocation, so on Lambda this is off by default and blocks are only
+# given up by INVOICE_BLOCK_TTL or a change of financial year.
+INVOICE_RELEASE_ON_SHUTDOWN = os.getenv(
+    "INVOICE_RELEASE_ON_SHUTDOWN",
+    "false" if os.getenv("AWS_LAMBDA_FUNCTION_NAME") else "true",
+).lower() in ("1", "true", "yes")
+
+# Response JSON encoder, see utils.json_response: "orjson" or "json"
+JSON_ENCODER = os.getenv("JSON_ENCODER", "orjson")
+
+# Response compression, see utils.compression. Bodies under
+# COMPRESSION_MIN_BYTES are sent as they are; streamed bodies are always
+# compressed. COMPRESSION_ENCODINGS lists the codings offered, in order of
+# preference when the client accepts several equally.
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", 1024))
+COMPRESSION_ENCODINGS = tuple(
+    coding.strip().lower()
+    for coding in os.getenv("COMPRESSION_ENCODINGS", "br,gzip").split(",")
+    if coding.strip()
+)
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", 4))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", 6))
+# The REST API's binaryMediaTypes, set by infra/cdk/cdk_stack.py. API Gateway
+# only decodes a base64 body when the request's Accept matches one of them,
+# so on Lambda other requests get uncompressed responses (none at all when
+# this is unset there). Off Lambda every request may be compressed.
+API_BINARY_MEDIA_TYPES = (
+    tuple(
+        media_type.strip().lower()
+        for media_type in os.getenv("API_BINARY_MEDIA_TYPES", "").split(",")
+        if media_type.strip()
+    )
+    if os.getenv("AWS_LAMBDA_FUNCTION_NAME") or os.getenv("API_BINARY_MEDIA_TYPES")
+    else None
+)
+
+# /login and /refresh call GoTrue over one pooled HTTP client per container
+AUTH_HTTP_TIMEOUT = float(os.getenv("AUTH_HTTP_TIMEOUT", 10))
+AUTH_HTTP_MAX_CONNECTIONS = int(os.getenv("AUTH_HTTP_MAX_CONNECTIONS", 20))
+
+# /size-sheet-batch takes at most SIZE_SHEET_BATCH_MAX customers and renders
+# up to SIZE_SHEET_BATCH_CONCURRENCY of them at once, as render slots allow
+SIZE_SHEET_BATCH_MAX = int(os.getenv("SIZE_SHEET_BATCH_MAX", 50))
+SIZE_SHEET_BATCH_CONCURRENCY = int(os.getenv("SIZE_SHEET_BATCH_CONCURRENCY", 4))
+
+# /customers/{id}/statement reads the customer's orders STATEMENT_PAGE_ORDERS
+# at a time; statement rows are a few fields each
+STATEMENT_PAGE_ORDERS = int(os.getenv("STATEMENT_PAGE_ORDERS", 500))
+
+# order_metrics rows written with another version are recomputed on read
+ORDER_METRICS_VERSION = 1
 
 
 TIMESTAMP_FORMAT = "%d-%m-%Y"
@@ -17,6 +193,7 @@ class SUPABASE_TABLES:
     customers = "customers"
     orders = "orders"
     order_metrics = "order_metrics"
+    order_monthly_stats = "order_monthly_stats"
     order_view = "order_view"
     products = "products"
     proforma_additional_costs = "proforma_additional_costs"
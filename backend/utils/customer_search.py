@@ -0,0 +1,363 @@
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from heapq import merge, nsmallest
+
+from supabase import Client
+
+from .constants import (
+    CUSTOMER_SEARCH_MAX_MB,
+    CUSTOMER_SEARCH_REBUILD_SECONDS,
+    CUSTOMER_SEARCH_REFRESH_SECONDS,
+    SUPABASE_TABLES,
+)
+from .timing import logger, span
+
+
+# The customer columns size_sheet reads to identify a customer
+CUSTOMER_SEARCH_COLUMNS = ("id", "name", "company_name", "gstin", "phone", "mobile")
+CUSTOMER_SEARCH_NAME_FIELDS = ("name", "company_name")
+CUSTOMER_SEARCH_ID_FIELDS = ("gstin", "phone", "mobile")
+CUSTOMER_SEARCH_MAX_LIMIT = 50
+# PostgREST caps responses at max-rows (1000 by default)
+CUSTOMER_SEARCH_PAGE_SIZE = 1000
+# Token prefixes up to this length are indexed; longer query words are
+# looked up by their first GRAM_LENGTH characters and then verified
+GRAM_LENGTH = 4
+# Matches collected in static order before re-ranking, per requested result
+RERANK_WINDOW = 10
+# Rough CPython costs behind CustomerSearchIndex.size: a dict slot holding an
+# entry or a posting list, an empty list, and one ordinal in a posting list
+SLOT_BYTES = 40
+LIST_BYTES = sys.getsizeof([])
+POINTER_BYTES = 8
+
+# Rank classes, best first
+MATCH_EXACT = 0
+MATCH_PREFIX = 1
+MATCH_WORDS = 2
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(value) -> str:
+    """Lowercase words separated by single spaces, punctuation dropped."""
+    return _NON_ALNUM.sub(" ", str(value or "").lower()).strip()
+
+
+def compact(value) -> str:
+    """Lowercase letters and digits only, e.g. "+91 98765-43210" -> "919876543210"."""
+    return _NON_ALNUM.sub("", str(value or "").lower())
+
+
+def display_name(row: dict) -> str:
+    return row.get("company_name") or row.get("name") or ""
+
+
+def haystack(row: dict) -> str:
+    """
+    One string holding a customer's searchable fields, each preceded by a
+    tab: names normalized word by word, identifiers compacted to one word.
+    "\t" + q finds fields starting with q, " " + w or "\t" + w words.
+    """
+    fields = [normalize(row.get(column)) for column in CUSTOMER_SEARCH_NAME_FIELDS]
+    for column in CUSTOMER_SEARCH_ID_FIELDS:
+        value = compact(row.get(column))
+        fields.append(value)
+        # Numbers stored with a country code are typed without it
+        if value.isdigit() and len(value) > 10:
+            fields.append(value[-10:])
+    return "".join(f"\t{field}" for field in fields if field) + "\t"
+
+
+def grams(text: str) -> set:
+    """Prefixes of up to GRAM_LENGTH characters of every word in text."""
+    return {
+        word[:length]
+        for word in text.split()
+        for length in range(1, min(len(word), GRAM_LENGTH) + 1)
+    }
+
+
+def entry_size(entry: tuple) -> int:
+    """Bytes one indexed customer holds, outside its posting lists."""
+    values, text = entry
+    return (
+        2 * SLOT_BYTES
+        + sys.getsizeof(entry)
+        + sys.getsizeof(values)
+        + sum(sys.getsizeof(value) for value in values if value is not None)
+        + sys.getsizeof(text)
+    )
+
+
+def iter_customer_pages(client: Client):
+    """Every customer's search columns, in keyset-paginated pages."""
+    last_id = None
+    while True:
+        query = client.table(SUPABASE_TABLES.customers).select(
+            ",".join(CUSTOMER_SEARCH_COLUMNS + ("updated_at",))
+        )
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        with span("db.customers"):
+            page = (query.order("id").limit(CUSTOMER_SEARCH_PAGE_SIZE).execute()).data
+        yield page
+        if len(page) < CUSTOMER_SEARCH_PAGE_SIZE:
+            return
+        last_id = page[-1]["id"]
+
+
+class CustomerSearchIndex:
+    """
+    Edge n-gram index over the customers one client can see, for autocomplete.
+
+    Customers are numbered in static rank order (shortest display name first),
+    and every word prefix of up to GRAM_LENGTH characters maps to the sorted
+    numbers of the customers having it. A query walks the posting list of its rarest word in
+    that order, keeps the customers whose words start with every query word,
+    and stops after RERANK_WINDOW matches per result. Those are re-ranked:
+    a field equal to the query, then a field starting with it, then the rest.
+    A query with digits also matches identifiers starting with it once
+    spaces and punctuation are dropped, so "98765 43210" finds mobile
+    +91 9876543210.
+
+    The index is built on first use from one projected bulk read and then
+    kept current from an updated_at high-water mark at most every
+    CUSTOMER_SEARCH_REFRESH_SECONDS. Changed customers are renumbered after
+    all others, so they rank last among equals until the full rebuild every
+    CUSTOMER_SEARCH_REBUILD_SECONDS, which also drops deleted customers.
+
+    size estimates the bytes the index holds, kept up to date as customers
+    are added and removed, so the indexes of all scopes can share one budget.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.ordinals = {}
+        self.postings = {}
+        self.next_ordinal = 0
+        self.size = 0
+        self.high_water = None
+        self.built_at = None
+        self.checked_at = float("-inf")
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _add(self, row: dict):
+        ordinal = self.next_ordinal
+        self.next_ordinal += 1
+        self.ordinals[row["id"]] = ordinal
+        text = haystack(row)
+        entry = self.entries[ordinal] = (
+            tuple(row.get(column) for column in CUSTOMER_SEARCH_COLUMNS),
+            text,
+        )
+        text_grams = grams(text)
+        self.size += entry_size(entry) + len(text_grams) * POINTER_BYTES
+        # Ordinals only grow, so appending keeps every posting list sorted
+        for gram in text_grams:
+            posting = self.postings.get(gram)
+            if posting is None:
+                posting = self.postings[gram] = []
+                self.size += SLOT_BYTES + LIST_BYTES + sys.getsizeof(gram)
+            posting.append(ordinal)
+
+    def _remove(self, customer_id: int):
+        ordinal = self.ordinals.pop(customer_id, None)
+        if ordinal is None:
+            return
+        entry = self.entries.pop(ordinal)
+        text_grams = grams(entry[1])
+        self.size -= entry_size(entry) + len(text_grams) * POINTER_BYTES
+        for gram in text_grams:
+            posting = self.postings[gram]
+            del posting[bisect_left(posting, ordinal)]
+
+    def _track(self, row: dict):
+        if row.get("updated_at") and (
+            self.high_water is None or row["updated_at"] > self.high_water
+        ):
+            self.high_water = row["updated_at"]
+
+    def upsert(self, rows: list):
+        for row in rows:
+            self._remove(row["id"])
+            self._add(row)
+            self._track(row)
+
+    def build(self, pages):
+        """Replace the index with the customers in pages (lists of rows)."""
+        rows = [row for page in pages for row in page]
+        rows.sort(
+            key=lambda row: (len(display_name(row)), display_name(row), row["id"])
+        )
+        self.entries, self.ordinals, self.postings = {}, {}, {}
+        self.next_ordinal, self.size, self.high_water = 0, 0, None
+        for row in rows:
+            self._add(row)
+            self._track(row)
+        self.built_at = self.checked_at = time.monotonic()
+
+    def refresh(self, client: Client) -> int:
+        """
+        Re-index customers updated at or after the high-water mark. Rows at the
+        mark itself are read again, so one committed later with the same
+        timestamp is not missed. Returns the number of rows read.
+        """
+        count, offset = 0, 0
+        while True:
+            query = client.table(SUPABASE_TABLES.customers).select(
+                ",".join(CUSTOMER_SEARCH_COLUMNS + ("updated_at",))
+            )
+            if self.high_water:
+                query = query.gte("updated_at", self.high_water)
+            with span("db.customers"):
+                page = (
+                    query.order("updated_at")
+                    .order("id")
+                    .range(offset, offset + CUSTOMER_SEARCH_PAGE_SIZE - 1)
+                    .execute()
+                ).data
+            self.upsert(page)
+            count += len(page)
+            if len(page) < CUSTOMER_SEARCH_PAGE_SIZE:
+                break
+            offset += CUSTOMER_SEARCH_PAGE_SIZE
+        self.checked_at = time.monotonic()
+        return count
+
+    def ensure(self, client: Client):
+        """Build, rebuild or refresh, whichever is due."""
+        now = time.monotonic()
+        if (
+            self.built_at is None
+            or now - self.built_at >= CUSTOMER_SEARCH_REBUILD_SECONDS
+        ):
+            started = time.perf_counter()
+            self.build(iter_customer_pages(client))
+            logger.info(
+                f"Customer search index built: {len(self)} customers, "
+                f"{len(self.postings)} grams in {time.perf_counter() - started:.2f}s"
+            )
+        elif now - self.checked_at >= CUSTOMER_SEARCH_REFRESH_SECONDS:
+            self.refresh(client)
+
+    def request_refresh(self):
+        """Refresh on the next lookup, e.g. after a change event."""
+        self.checked_at = float("-inf")
+
+    def _posting(self, word: str) -> list:
+        return self.postings.get(word[:GRAM_LENGTH], [])
+
+    def search(self, query: str, limit: int = 10) -> list:
+        """
+        Best matches for query, see the class docstring for the ranking.
+
+        Returns:
+            list: customer dicts with CUSTOMER_SEARCH_COLUMNS
+        """
+        words = normalize(query).split()
+        if not words:
+            return []
+        phrase = " ".join(words)
+        compact_query = compact(query)
+        # A number or GSTIN typed in groups, e.g. "98765 43210"
+        whole = len(words) > 1 and any(c.isdigit() for c in compact_query)
+
+        window = limit * RERANK_WINDOW
+        postings = sorted((self._posting(word) for word in words), key=len)
+        sources = [postings[0]]
+        if len(postings) > 1 and len(postings[0]) > window:
+            # Narrow a long list with the next rarest word at C speed, rather
+            # than checking every customer on it in Python
+            sources = [sorted(set(postings[0]).intersection(postings[1]))]
+        if whole:
+            sources.append(self._posting(compact_query))
+        needles = [(f" {word}", f"\t{word}") for word in words]
+
+        matches, last = [], None
+        for ordinal in merge(*sources) if whole else sources[0]:
+            if ordinal == last:
+                continue
+            last = ordinal
+            text = self.entries[ordinal][1]
+            if all(a in text or b in text for a, b in needles) or (
+                whole and f"\t{compact_query}" in text
+            ):
+                matches.append(ordinal)
+                if len(matches) >= window:
+                    break
+
+        def rank(ordinal: int) -> tuple:
+            text = self.entries[ordinal][1]
+            for target in {phrase, compact_query}:
+                if f"\t{target}\t" in text:
+                    return MATCH_EXACT, ordinal
+            for target in {phrase, compact_query}:
+                if f"\t{target}" in text:
+                    return MATCH_PREFIX, ordinal
+            return MATCH_WORDS, ordinal
+
+        best = nsmallest(limit, matches, key=rank)
+        return [dict(zip(CUSTOMER_SEARCH_COLUMNS, self.entries[o][0])) for o in best]
+
+    def lookup(self, client: Client, query: str, limit: int = 10) -> list:
+        """search() on an index brought up to date first; blocking, run off the loop."""
+        with self.lock:
+            self.ensure(client)
+            with span("customer_search"):
+                results = self.search(query, limit)
+        trim_customer_search_indexes(keep=self)
+        return results
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def customer_search_index(scope: str) -> CustomerSearchIndex:
+    """
+    The index for one visibility scope (see response_cache.visibility_scope),
+    since RLS decides which customers a client can read. Indexes of every
+    scope share CUSTOMER_SEARCH_MAX_MB, see trim_customer_search_indexes.
+    """
+    with _indexes_lock:
+        index = _indexes.get(scope)
+        if index is None:
+            index = _indexes[scope] = CustomerSearchIndex()
+        _indexes.move_to_end(scope)
+        return index
+
+
+def trim_customer_search_indexes(keep: CustomerSearchIndex = None):
+    """
+    Drop the least recently used indexes until all of them together hold at
+    most CUSTOMER_SEARCH_MAX_MB. keep, the index just searched, stays even
+    when it is over the budget on its own.
+    """
+    budget = CUSTOMER_SEARCH_MAX_MB * 1e6
+    with _indexes_lock:
+        total = sum(index.size for index in _indexes.values())
+        for scope, index in list(_indexes.items()):
+            if total <= budget:
+                break
+            if index is keep:
+                continue
+            del _indexes[scope]
+            total -= index.size
+            logger.info(
+                f"Customer search index for {scope} dropped: "
+                f"{index.size / 1e6:.1f} MB, {len(index)} customers"
+            )
+
+
+def request_customer_search_refresh():
+    with _indexes_lock:
+        for index in _indexes.values():
+            index.request_refresh()
@@ -0,0 +1,171 @@
+import hashlib
+import hmac
+import os
+import time
+from datetime import datetime
+from uuid import uuid4
+
+from fastapi import Response
+from starlette.concurrency import run_in_threadpool
+
+from .constants import (
+    DOCUMENT_STORAGE_BACKEND,
+    DOCUMENT_STORAGE_BUCKET,
+    DOCUMENT_LOCAL_DIR,
+    DOCUMENT_LOCAL_SECRET,
+    DOCUMENT_LOCAL_URL_PREFIX,
+    DOCUMENT_INLINE_MAX_BYTES,
+    DOCUMENT_SIGNED_URL_TTL,
+)
+from .helpers import success_response
+
+
+# Accepted values for the ?delivery= query parameter
+DELIVERY_INLINE = "inline"
+DELIVERY_URL = "url"
+
+
+class SupabaseDocumentStore:
+    def __init__(self, client, bucket: str = DOCUMENT_STORAGE_BUCKET):
+        self.bucket = client.storage.from_(bucket)
+
+    def upload(self, path: str, content: bytes, media_type: str):
+        self.bucket.upload(
+            path,
+            content,
+            file_options={"content-type": media_type, "upsert": "true"},
+        )
+
+    def signed_url(self, path: str, expires_in: int) -> str:
+        data = self.bucket.create_signed_url(path, expires_in)
+        return data.get("signedURL") or data.get("signedUrl")
+
+
+class LocalDocumentStore:
+    """
+    Filesystem stand-in for Supabase Storage, used offline and in tests.
+
+    Signed URLs point at the /documents/local route and carry an expiry and
+    an HMAC over the path, which the route checks with resolve() before
+    serving the file. The HMAC key must be DOCUMENT_LOCAL_SECRET, never a
+    key that is handed out to clients.
+    """
+
+    def __init__(
+        self,
+        root: str = DOCUMENT_LOCAL_DIR,
+        secret: str = DOCUMENT_LOCAL_SECRET,
+        url_prefix: str = DOCUMENT_LOCAL_URL_PREFIX,
+    ):
+        if not secret:
+            raise RuntimeError(
+                "DOCUMENT_LOCAL_SECRET must be set to use the local document store"
+            )
+        self.root = os.path.abspath(root)
+        self.secret = secret.encode()
+        self.url_prefix = url_prefix.rstrip("/")
+
+    def _sign(self, path: str, expires: int) -> str:
+        message = f"{path}:{expires}".encode()
+        return hmac.new(self.secret, message, hashlib.sha256).hexdigest()
+
+    def upload(self, path: str, content: bytes, media_type: str):
+        full_path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "wb") as f:
+            f.write(content)
+
+    def signed_url(self, path: str, expires_in: int) -> str:
+        expires = int(time.time()) + expires_in
+        token = self._sign(path, expires)
+        return f"{self.url_prefix}/{path}?expires={expires}&token={token}"
+
+    def resolve(self, path: str, expires: int, token: str):
+        """
+        The file behind a signed URL, or None if the link has expired, was
+        not signed with this store's secret or points outside the root.
+        """
+        if expires < time.time():
+            return None
+        if not hmac.compare_digest(self._sign(path, expires), token):
+            return None
+        full_path = os.path.abspath(os.path.join(self.root, path))
+        if os.path.commonpath([self.root, full_path]) != self.root:
+            return None
+        return full_path if os.path.isfile(full_path) else None
+
+
+def get_document_store(authenticated_client=None):
+    if DOCUMENT_STORAGE_BACKEND == "local":
+        return LocalDocumentStore()
+    return SupabaseDocumentStore(authenticated_client)
+
+
+def store_document(
+    content: bytes, filename: str, media_type: str, authenticated_client=None
+) -> str:
+    """Upload a document and sign a URL for it; blocking, run off the loop."""
+    path = f"{datetime.now().strftime('%Y-%m-%d')}/{uuid4().hex}/{filename}"
+    store = get_document_store(authenticated_client)
+    store.upload(path, content, media_type)
+    return store.signed_url(path, DOCUMENT_SIGNED_URL_TTL)
+
+
+async def document_response(
+    content: bytes,
+    filename: str,
+    media_type: str,
+    authenticated_client=None,
+    delivery: str = None,
+):
+    """
+    Return a rendered document inline, or upload it and return a signed URL.
+
+    Args:
+        content (bytes): Rendered PDF/XLSX
+        filename (str): Download filename
+        media_type (str): MIME type of content
+        authenticated_client (Client, optional): Caller's client, so uploads
+            go through storage RLS
+        delivery (str, optional): "inline" or "url" to force a mode; by
+            default documents above DOCUMENT_INLINE_MAX_BYTES are offloaded
+
+    Returns:
+        Response: The document bytes, or a JSON envelope with the URL
+    """
+    if delivery is None:
+        delivery = (
+            DELIVERY_URL
+            if len(content) > DOCUMENT_INLINE_MAX_BYTES
+            else DELIVERY_INLINE
+        )
+
+    if delivery == DELIVERY_INLINE:
+        return Response(
+            content=content,
+            media_type=media_type,
+            headers={
+                "Content-Type": media_type,
+                "Content-Disposition": f'attachment; filename="{filename}"',
+            },
+        )
+
+    if delivery != DELIVERY_URL:
+        raise ValueError(f"Unknown delivery mode: {delivery}")
+
+    # The storage client is synchronous; the upload must not hold up the loop
+    url = await run_in_threadpool(
+        store_document, content, filename, media_type, authenticated_client
+    )
+
+    return success_response(
+        "Document uploaded successfully",
+        {
+            "url": url,
+            "filename": filename,
+            "media_type": media_type,
+            "size": len(content),
+            "expires_in": DOCUMENT_SIGNED_URL_TTL,
+        },
+        200,
+    )
@@ -0,0 +1,319 @@
+import csv
+import io
+import json
+import re
+import time
+from datetime import date
+
+from openpyxl import Workbook
+from supabase import Client
+
+from .constants import (
+    EXPORT_DEADLINE_MARGIN,
+    EXPORT_MAX_BYTES,
+    EXPORT_PAGE_ORDERS,
+    EXPORT_TIME_BUDGET,
+    SUPABASE_TABLES,
+)
+from .order_listing import decode_cursor, encode_cursor
+from .projections import select_string
+from .stats_series import ist_midnight
+from .timing import span
+
+
+# One export row per proforma item, with the order and proforma columns
+# repeated; an order without items still gets one row
+EXPORT_FIELDS = {
+    "id": None,
+    "created_at": None,
+    "status": None,
+    "delivery_date": None,
+    SUPABASE_TABLES.customers: {"name": None, "company_name": None, "gstin": None},
+    SUPABASE_TABLES.proforma_invoices: {
+        "pi_no": None,
+        "created_at": None,
+        "is_gst": None,
+        "total_amount": None,
+        "gst_amount": None,
+        "grand_total": None,
+        SUPABASE_TABLES.proforma_invoice_items: {
+            "id": None,
+            "customer_order_no": None,
+            "unit": None,
+            "size_width": None,
+            "size_width_fraction": None,
+            "size_height": None,
+            "size_height_fraction": None,
+            "quantity": None,
+            "rate": None,
+            "rate_type": None,
+            "amount": None,
+            SUPABASE_TABLES.products: {"name": None},
+            SUPABASE_TABLES.thickness_master: {"name": None},
+        },
+    },
+}
+EXPORT_SELECT = select_string(EXPORT_FIELDS)
+
+EXPORT_COLUMNS = (
+    "order_id",
+    "order_created_at",
+    "status",
+    "delivery_date",
+    "customer",
+    "customer_gstin",
+    "pi_no",
+    "pi_created_at",
+    "is_gst",
+    "total_amount",
+    "gst_amount",
+    "grand_total",
+    "item_id",
+    "customer_order_no",
+    "product",
+    "thickness",
+    "unit",
+    "size_width",
+    "size_width_fraction",
+    "size_height",
+    "size_height_fraction",
+    "quantity",
+    "rate",
+    "rate_type",
+    "amount",
+)
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+XLSX_CHUNK_BYTES = 64 * 1024
+
+
+def financial_year_range(fy: str) -> tuple:
+    """
+    [start, end) of an Indian financial year such as "2025-26", as IST
+    midnights of 1 April; the labels match get_financial_year().
+    """
+    match = re.fullmatch(r"(\d{4})-(\d{2})", fy or "")
+    if not match or int(match.group(2)) != (int(match.group(1)) + 1) % 100:
+        raise ValueError("fy must look like 2025-26")
+    year = int(match.group(1))
+    return ist_midnight(date(year, 4, 1)), ist_midnight(date(year + 1, 4, 1))
+
+
+class ExportBudget:
+    """
+    How much one export response may do before it stops at an order boundary
+    and hands out a cursor: a deadline, and optionally a body size.
+    """
+
+    def __init__(self, seconds: float, max_bytes: int = EXPORT_MAX_BYTES):
+        self.deadline = time.monotonic() + seconds
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.orders = 0
+        self.stopped_early = False
+
+    @classmethod
+    def for_request(cls, aws_context=None) -> "ExportBudget":
+        """EXPORT_TIME_BUDGET, cut down to what the Lambda invocation has left."""
+        seconds = EXPORT_TIME_BUDGET
+        if aws_context is not None:
+            remaining = aws_context.get_remaining_time_in_millis() / 1000
+            seconds = min(seconds, remaining - EXPORT_DEADLINE_MARGIN)
+        return cls(seconds)
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.deadline
+
+    def charge(self, size: int):
+        """Count size bytes that are sent whatever the budget, e.g. a header."""
+        self.used_bytes += size
+
+    def take(self, size: int) -> bool:
+        """
+        Reserve size bytes for one order; False if they do not fit. The first
+        order of a part always fits, however large, so every part moves the
+        cursor on.
+        """
+        if self.max_bytes and self.orders and self.used_bytes + size > self.max_bytes:
+            return False
+        self.used_bytes += size
+        self.orders += 1
+        return True
+
+
+def fetch_export_page(
+    client: Client, start, end, after: str = None, limit: int = EXPORT_PAGE_ORDERS
+) -> list:
+    """
+    Up to limit active orders created in [start, end) with their proforma and
+    items, oldest first, after the cursor. Keyset condition on (created_at, id),
+    so every page costs the same however deep the export is.
+    """
+    query = (
+        client.table(SUPABASE_TABLES.orders)
+        .select(EXPORT_SELECT)
+        .gte("created_at", start.isoformat())
+        .lt("created_at", end.isoformat())
+        .eq("active", True)
+    )
+    if after:
+        created_at, order_id = decode_cursor(after)
+        query = query.or_(
+            f'created_at.gt."{created_at}",'
+            f'and(created_at.eq."{created_at}",id.gt.{order_id})'
+        )
+    with span("db.orders"):
+        return (query.order("created_at").order("id").limit(limit).execute()).data
+
+
+def iter_export_orders(client: Client, start, end, cursor: str, budget: ExportBudget):
+    """
+    Yield (order, cursor after it) until the range is done or the budget's
+    deadline passes, in which case budget.stopped_early is set. Only one page
+    of orders is held at a time.
+    """
+    after = cursor
+    while True:
+        page = fetch_export_page(client, start, end, after)
+        for order in page:
+            after = encode_cursor(order)
+            yield order, after
+        if len(page) < EXPORT_PAGE_ORDERS:
+            return
+        # Checked after the first page, so every part makes progress
+        if budget.expired():
+            budget.stopped_early = True
+            return
+
+
+def export_rows(order: dict) -> list:
+    """The export rows of one order, as tuples in EXPORT_COLUMNS order."""
+    customer = order.get(SUPABASE_TABLES.customers) or {}
+    proforma = order.get(SUPABASE_TABLES.proforma_invoices) or {}
+    head = (
+        order["id"],
+        order.get("created_at"),
+        order.get("status"),
+        order.get("delivery_date"),
+        customer.get("company_name") or customer.get("name"),
+        customer.get("gstin"),
+        proforma.get("pi_no"),
+        proforma.get("created_at"),
+        proforma.get("is_gst"),
+        proforma.get("total_amount"),
+        proforma.get("gst_amount"),
+        proforma.get("grand_total"),
+    )
+    items = sorted(
+        proforma.get(SUPABASE_TABLES.proforma_invoice_items) or [],
+        key=lambda item: item.get("id") or 0,
+    )
+    if not items:
+        return [head + (None,) * (len(EXPORT_COLUMNS) - len(head))]
+    return [
+        head
+        + (
+            item.get("id"),
+            item.get("customer_order_no"),
+            (item.get(SUPABASE_TABLES.products) or {}).get("name"),
+            (item.get(SUPABASE_TABLES.thickness_master) or {}).get("name"),
+            item.get("unit"),
+            item.get("size_width"),
+            item.get("size_width_fraction"),
+            item.get("size_height"),
+            item.get("size_height_fraction"),
+            item.get("quantity"),
+            item.get("rate"),
+            item.get("rate_type"),
+            item.get("amount"),
+        )
+        for item in items
+    ]
+
+
+def encode_csv(rows: list) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def encode_ndjson(rows: list) -> bytes:
+    return "".join(
+        json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=str) + "\n" for row in rows
+    ).encode()
+
+
+def stream_export(
+    client: Client, start, end, fmt: str, cursor: str, budget: ExportBudget
+):
+    """
+    CSV or NDJSON body of an export, one chunk per order, produced while the
+    pages are fetched. The CSV header is only written on the first part, so
+    resumed parts concatenate into one file. A part that stops early ends with
+    a continuation line holding the cursor to resume from:
+        CSV     #next_cursor,<cursor>
+        NDJSON  {"next_cursor": "<cursor>"}
+    """
+    encode = encode_csv if fmt == "csv" else encode_ndjson
+    if fmt == "csv" and not cursor:
+        header = encode_csv([EXPORT_COLUMNS])
+        budget.charge(len(header))
+        yield header
+
+    after = cursor
+    for order, order_cursor in iter_export_orders(client, start, end, cursor, budget):
+        chunk = encode(export_rows(order))
+        if not budget.take(len(chunk)):
+            budget.stopped_early = True
+            break
+        yield chunk
+        after = order_cursor
+
+    if budget.stopped_early:
+        if fmt == "csv":
+            yield f"#next_cursor,{after}\r\n".encode()
+        else:
+            yield (json.dumps({"next_cursor": after}) + "\n").encode()
+
+
+def write_xlsx_export(
+    client: Client, start, end, cursor: str, budget: ExportBudget, file
+) -> str:
+    """
+    Write one part of an export to file as a write-only workbook, which keeps
+    rows on disk instead of in memory. The byte budget is charged with the CSV
+    size of each order, more than it adds to the zipped file.
+
+    Returns:
+        str: cursor to resume from, or None when the export is complete
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Orders")
+    sheet.append(EXPORT_COLUMNS)
+
+    after = None
+    for order, order_cursor in iter_export_orders(client, start, end, cursor, budget):
+        rows = export_rows(order)
+        if not budget.take(len(encode_csv(rows))):
+            budget.stopped_early = True
+            break
+        for row in rows:
+            sheet.append(row)
+        after = order_cursor
+
+    workbook.save(file)
+    file.seek(0)
+    return after if budget.stopped_early else None
+
+
+def iter_file(file, chunk_size: int = XLSX_CHUNK_BYTES):
+    """Stream a file in chunks and close it at the end."""
+    try:
+        while chunk := file.read(chunk_size):
+            yield chunk
+    finally:
+        file.close()
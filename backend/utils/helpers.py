@@ -1,20 +1,45 @@
 from datetime import datetime
 
 from fastapi import HTTPException, status, Request
-from fastapi.responses import JSONResponse
 from .constants import (
     TIMESTAMP_FORMAT,
     CURRENT_TIME,
+    PDF_OPTIMIZE_PRESET,
+    RATE_TYPE,
+    ORDER_METRICS_VERSION,
 )
 from datetime import datetime
+import hashlib
+import json
 import jwt
 import pytz
 from weasyprint import HTML
 from io import BytesIO
+from pypdf import PdfWriter
 from .supabaseClient import supabase, SUPABASE_URL, SUPABASE_ANON_KEY
+from .pdf_optimizer import downscale_image_source, get_preset, optimize_pdf
+from .timing import logger, span
+from .metrics import RENDER_LATENCY
+from .render_memory import measure_render_memory, render_item_count
+from .json_response import FastJSONResponse
+import time
+from math import ceil
+from natsort import natsorted
 from supabase import create_client, ClientOptions
 
 
+_server_date = (None, "")
+
+
+def server_date() -> str:
+    """Today in TIMESTAMP_FORMAT, formatted once per day rather than per response."""
+    global _server_date
+    today = datetime.now().date()
+    if _server_date[0] != today:
+        _server_date = (today, today.strftime(TIMESTAMP_FORMAT))
+    return _server_date[1]
+
+
 def response_content(
     msg: str = "",
     data: dict = dict(),
@@ -28,7 +53,7 @@ def response_content(
         "error": error_type,
         "messages": msg,
         "result": data,
-        "serverdatetime": datetime.now().strftime(TIMESTAMP_FORMAT),
+        "serverdatetime": server_date(),
         "db_version": 1.0,
     }
 
@@ -41,9 +66,9 @@ def success_response(
     another_response: dict = dict(),
 ):
     if different_response:
-        return JSONResponse(content=another_response, status_code=status_code)
+        return FastJSONResponse(content=another_response, status_code=status_code)
 
-    return JSONResponse(
+    return FastJSONResponse(
         content=response_content(msg=msg, data=data, status_code=status_code),
         status_code=status_code,
     )
@@ -57,9 +82,9 @@ def failure_response(
     another_response: dict = dict(),
 ):
     if different_response:
-        return JSONResponse(content=another_response, status_code=status_code)
+        return FastJSONResponse(content=another_response, status_code=status_code)
 
-    return JSONResponse(
+    return FastJSONResponse(
         content=response_content(
             msg=msg,
             data=data,
@@ -90,7 +115,6 @@ def convertDOB(value: str) -> str:
 def verify_token(access_token: str):
     token = access_token
     try:
-        print("Creating authenticated client")
         token_data = supabase.auth.get_user(access_token)
 
         authenticated_client = create_client(
@@ -141,32 +165,84 @@ def convertDateToProperFormat(string_date: str):
     )
 
 
-def createPdf(data, templates, template_to_choose):
-    try:
-        print(f"Creating PDF with template: {template_to_choose}")
-        context = {
-            **data,
-            "date": CURRENT_TIME.strftime(TIMESTAMP_FORMAT),
-            "current_year": CURRENT_TIME.year,
-        }
+def layout_pdf(data, templates, template_to_choose, preset=PDF_OPTIMIZE_PRESET):
+    """
+    Render a template to HTML and lay it out, without writing the PDF.
 
-        template = templates.get_template(template_to_choose)
+    Returns:
+        Document: The laid out WeasyPrint document
+    """
+    settings = get_preset(preset)
+    form = data.get("form", {})
+    if settings["image_dpi"] and form.get("company_logo"):
+        with span("logo"):
+            form = {
+                **form,
+                "company_logo": downscale_image_source(
+                    form["company_logo"], dpi=settings["image_dpi"]
+                ),
+            }
 
-        print("Template loaded successfully")
+    context = {
+        **data,
+        "form": form,
+        "date": CURRENT_TIME.strftime(TIMESTAMP_FORMAT),
+        "current_year": CURRENT_TIME.year,
+    }
 
+    with span("jinja"):
+        template = templates.get_template(template_to_choose)
         html_content = template.render(context)
-        print("HTML content rendered successfully")
 
+    with span("layout"):
+        return HTML(string=html_content).render()
+
+
+def write_pdf(document, preset=PDF_OPTIMIZE_PRESET) -> bytes:
+    with span("serialize"):
         pdf_bytes = BytesIO()
-        HTML(string=html_content).write_pdf(pdf_bytes)
-        print("PDF generation completed")
+        document.write_pdf(pdf_bytes)
+
+    with span("optimize"):
+        return optimize_pdf(pdf_bytes.getvalue(), preset)
 
-        pdf_bytes.seek(0)
-        return pdf_bytes.getvalue()
+
+def merge_pdfs(pdfs: list) -> bytes:
+    """
+    One PDF with the pages, and so the bookmarks, of each PDF in turn. Objects
+    the PDFs have in common, such as the logo, are stored once.
+    """
+    writer = PdfWriter()
+    with span("merge"):
+        for pdf in pdfs:
+            writer.append(BytesIO(pdf))
+        writer.compress_identical_objects()
+        merged = BytesIO()
+        writer.write(merged)
+    return merged.getvalue()
+
+
+def createPdf(data, templates, template_to_choose, preset=PDF_OPTIMIZE_PRESET):
+    try:
+        started = time.perf_counter()
+        with measure_render_memory(
+            template_to_choose, render_item_count(data)
+        ) as memory:
+            # One expression, so the laid out document is freed before the
+            # retained memory is measured
+            result = write_pdf(
+                layout_pdf(data, templates, template_to_choose, preset), preset
+            )
+            if memory is not None:
+                memory.output_bytes = len(result)
+
+        RENDER_LATENCY.observe(
+            (time.perf_counter() - started) * 1000, template_to_choose
+        )
+        return result
 
     except Exception as e:
-        print(f"Error in createPdf: {str(e)}")
-        print(f"Template: {template_to_choose}")
+        logger.error(f"Error in createPdf ({template_to_choose}): {str(e)}")
         raise e
 
 
@@ -207,3 +283,284 @@ def parse_fractional_inch(whole: str, fraction: str = None) -> float:
             pass
 
     return w
+
+
+# The proforma_items columns compute_item_metrics reads
+ITEM_METRICS_INPUTS = (
+    "quantity",
+    "weight",
+    "unit",
+    "size_width",
+    "size_height",
+    "size_width_fraction",
+    "size_height_fraction",
+    "width_rounding_value",
+    "height_rounding_value",
+)
+
+
+def item_metrics_source(item: dict) -> str:
+    """
+    Digest of the columns compute_item_metrics reads from an item. Stored
+    with the item's metrics, so metrics of an item edited since are not used.
+    """
+    inputs = json.dumps([item.get(key) for key in ITEM_METRICS_INPUTS], default=str)
+    return hashlib.blake2b(inputs.encode(), digest_size=8).hexdigest()
+
+
+def compute_item_metrics(item: dict) -> dict:
+    """
+    Chargeable size, square feet, weight and quantity of one proforma item.
+    Bump ORDER_METRICS_VERSION whenever these formulas change.
+
+    Args:
+        item (dict): proforma_items row
+
+    Returns:
+        dict: id, quantity, weight, chargeable_width, chargeable_height, sqft
+    """
+    # Reset per-item chargeable sizes
+    chargeable_width = 0.0
+    chargeable_height = 0.0
+    quantity = int(item.get("quantity", 0))
+
+    # first convert the width and height to feet
+    # if the unit is mm, then convert to feet
+    if item.get("unit") == "mm":
+        width_feet = float(item.get("size_width", 0))
+        height_feet = float(item.get("size_height", 0))
+
+        total_sqft = width_feet * height_feet * quantity * 10.764 / 1000000
+    elif item.get("unit") == "inch":
+        size_width_fraction = item.get("size_width_fraction", "")
+        size_height_fraction = item.get("size_height_fraction", "")
+        width_whole = item.get("size_width", 0)
+        height_whole = item.get("size_height", 0)
+
+        width_inches = parse_fractional_inch(width_whole, size_width_fraction)
+        height_inches = parse_fractional_inch(height_whole, size_height_fraction)
+
+        width_rounding_value = int(item.get("width_rounding_value", 0))
+        height_rounding_value = int(item.get("height_rounding_value", 0))
+
+        if width_rounding_value and width_rounding_value > 0:
+            width_inches = (
+                ceil(width_inches / width_rounding_value) * width_rounding_value
+            )
+        if height_rounding_value and height_rounding_value > 0:
+            height_inches = (
+                ceil(height_inches / height_rounding_value) * height_rounding_value
+            )
+
+        chargeable_width = width_inches
+        chargeable_height = height_inches
+        width_feet = width_inches
+        height_feet = height_inches
+
+        total_sqft = width_feet * height_feet * quantity / 144
+    else:
+        width_feet = item.get("size_width", 0)
+        height_feet = item.get("size_height", 0)
+
+        total_sqft = width_feet * height_feet * quantity
+
+    return {
+        "id": item.get("id"),
+        "quantity": quantity,
+        "weight": item.get("weight", 0),
+        "chargeable_width": chargeable_width,
+        "chargeable_height": chargeable_height,
+        "sqft": total_sqft,
+    }
+
+
+def build_invoice_context(company_details: dict, order_data: dict) -> dict:
+    """
+    Build the invoice.html context from a company_master row and an orders row
+    fetched with INVOICE_COMPANY_SELECT / INVOICE_ORDER_SELECT.
+
+    Args:
+        company_details (dict): company_master row
+        order_data (dict): orders row with the proforma invoice embedded
+
+    Returns:
+        dict: {"form": ...} template context
+    """
+    proforma_invoice = order_data["proforma_invoices"]
+    customer = order_data["customers"]
+    items = proforma_invoice.get("proforma_items", [])
+
+    # Per-item metrics stored at write time, when they match the current
+    # formulas and were computed from the item as it is now
+    stored = order_data.get("order_metrics") or {}
+    stored_items = (
+        {m["id"]: m for m in stored.get("items") or []}
+        if stored.get("formula_version") == ORDER_METRICS_VERSION
+        else {}
+    )
+
+    total_qty = 0
+    total_weight = 0
+
+    # Process items
+    processed_items = []
+    total_items_sqft = 0
+    for item in items:
+        metrics = stored_items.get(item.get("id"))
+        if metrics is None or metrics.get("source") != item_metrics_source(item):
+            metrics = compute_item_metrics(item)
+        chargeable_width = metrics["chargeable_width"]
+        chargeable_height = metrics["chargeable_height"]
+        total_sqft = metrics["sqft"]
+        total_weight += metrics["weight"]
+        total_qty += metrics["quantity"]
+        total_items_sqft += total_sqft
+
+        processed_items.append(
+            {
+                "customer_order_no": item.get("customer_order_no", ""),
+                "name": item.get("products", {}).get("name", ""),
+                "weight": f'{item.get("weight", 0):.2f}',
+                "chargeable_width": chargeable_width,
+                "chargeable_height": chargeable_height,
+                "width": item.get("size_width", ""),
+                "height": item.get("size_height", ""),
+                "total_sqft": f"{total_sqft:.2f}",
+                "qty": item.get("quantity", 0),
+                "rate": item.get("rate", 0),
+                "unit": item.get("unit", ""),
+                "amount": item.get("amount", 0),
+                "rate_type": RATE_TYPE[item.get("rate_type", "")],
+                "size_width_fraction": item.get("size_width_fraction", ""),
+                "size_height_fraction": item.get("size_height_fraction", ""),
+                "thickness": item.get("thickness_master", {}).get("name", ""),
+            }
+        )
+
+    # sort the processed_items by customer_order_no
+    # processed_items.sort(key=lambda x: x.get("customer_order_no", ""))
+    processed_items = natsorted(
+        processed_items, key=lambda x: x.get("customer_order_no", "")
+    )
+
+    additional_costs = proforma_invoice.get("proforma_additional_costs", [])
+    additional_costs_data = list()
+
+    if len(additional_costs) > 0:
+        additional_costs_data = [
+            {
+                "name": cost.get("cost_name"),
+                "amount": cost.get("amount", 0),
+            }
+            for cost in additional_costs
+        ]
+
+    # Calculate GST
+    is_gst = proforma_invoice.get("is_gst", False)
+    total_cost_with_additional_cost = proforma_invoice.get("total_amount", 0)
+
+    if len(additional_costs_data) > 0:
+        total_cost_with_additional_cost = total_cost_with_additional_cost + sum(
+            cost.get("amount", 0) for cost in additional_costs_data
+        )
+
+    total_gst = proforma_invoice.get("gst_amount", 0)
+    cgst = total_gst / 2 if is_gst else 0
+    sgst = total_gst / 2 if is_gst else 0
+
+    # Calculate advanced payment
+    has_advanced_payment = proforma_invoice.get("has_advanced_payment", False)
+    advanced_payment_amount = (
+        proforma_invoice.get("advanced_payment_amount", 0)
+        if has_advanced_payment
+        else 0
+    )
+    advanced_payment_notes = (
+        proforma_invoice.get("advanced_payment_notes", "")
+        if has_advanced_payment
+        else ""
+    )
+
+    grand_total = proforma_invoice.get("grand_total", 0)
+    balance_amount = (
+        grand_total - advanced_payment_amount if has_advanced_payment else grand_total
+    )
+
+    sales_person = "Default"
+    if proforma_invoice.get("users", {}) is not None:
+        sales_person = proforma_invoice.get("users", {}).get("full_name", "")
+
+    form_data = {
+        "company_logo": company_details.get("logo"),
+        "company_name": company_details.get("company_name"),
+        "company_address": company_details.get("address"),
+        "company_mobile": ", ".join(company_details.get("mobile_nos", [])),
+        "company_email": company_details.get("email_id"),
+        "company_gst": company_details.get("gst_no"),
+        "company_pan": company_details.get("pan_no"),
+        "proforma_no": proforma_invoice.get("pi_no"),
+        "sales_person": sales_person,
+        "pi_date": convertDateToProperFormat(proforma_invoice.get("created_at")),
+        "payment_terms": proforma_invoice.get("payment_terms", ""),
+        "destination": (
+            proforma_invoice.get("destination", "N/A")
+            if proforma_invoice.get("destination") is not None
+            else "N/A"
+        ),
+        "delivery_date": (
+            convertDateToProperFormat(order_data.get("delivery_date"))
+            if order_data.get("delivery_date") is not None
+            else "N/A"
+        ),
+        "transport": (
+            proforma_invoice.get("transport_info", "N/A")
+            if proforma_invoice.get("transport_info") is not None
+            else "N/A"
+        ),
+        "unloading": (
+            proforma_invoice.get("unloading_info", "N/A")
+            if proforma_invoice.get("unloading_info") is not None
+            else "N/A"
+        ),
+        "bill_to": {
+            "name": customer.get("company_name") or customer.get("name"),
+            "address": customer.get("address"),
+            "phone": customer.get("phone"),
+            "mobile": customer.get("mobile"),
+            "gst": customer.get("gstin"),
+        },
+        "ship_to": {
+            "name": customer.get("company_name") or customer.get("name"),
+            "address": customer.get("shipping_address") or customer.get("address"),
+            "phone": customer.get("phone"),
+            "mobile": customer.get("mobile"),
+        },
+        "proforma_items": processed_items,
+        "has_inch_unit": any((it.get("unit", "").lower() == "inch") for it in items),
+        "total_qty": total_qty,
+        "basic_total": proforma_invoice.get("total_amount", 0),
+        "total_cost_with_additional_cost": f"{total_cost_with_additional_cost:.2f}",
+        "remarks": proforma_invoice.get("remarks", ""),
+        "total_weight": f"{total_weight:.2f}",
+        "total_sqft": f"{total_items_sqft:.2f}",
+        "additional_costs": additional_costs_data,
+        "cgst": f"{cgst:.2f}",
+        "sgst": f"{sgst:.2f}",
+        "is_gst": is_gst,
+        "total_gst": f"{total_gst:.2f}" if is_gst else 0,
+        "grand_total": f"{proforma_invoice.get('grand_total', 0):.2f}",
+        "has_advanced_payment": has_advanced_payment,
+        "advanced_payment_amount": advanced_payment_amount,
+        "advanced_payment_notes": advanced_payment_notes,
+        "balance_amount": f"{balance_amount:.2f}",
+        "bank_name": company_details.get("bank_account_name"),
+        "bank": company_details.get("bank_name"),
+        "branch": company_details.get("branch", ""),
+        "account_no": company_details.get("bank_account_no"),
+        "ifsc": company_details.get("ifsc_code"),
+        "terms": company_details.get("terms_and_conditions", []),
+    }
+
+    pdf_context = {"form": form_data}
+
+    return pdf_context
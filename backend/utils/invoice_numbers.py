@@ -0,0 +1,186 @@
+import threading
+import time
+
+from supabase import Client
+
+from .constants import INVOICE_BLOCK_SIZE, INVOICE_BLOCK_TTL, INVOICE_GAP_POLICY
+from .timing import log_json, span
+
+
+# Numbers are reserved in blocks from the same invoice_counters row that
+# get_next_invoice_number increments. The functions are in
+# supabase/migrations/20261019000000_invoice_number_blocks.sql:
+#
+#   reserve_invoice_numbers(fy_param, block_size)
+#       the next block_size numbers, each formatted by get_next_invoice_number
+#       itself, called block_size times in one transaction
+#   release_invoice_numbers(fy_param, first_number, last_number)
+#       gives back the tail of a block, only if nothing was reserved after it
+#   peek_invoice_number(fy_param)
+#       what get_next_invoice_number would return next, from a call that is
+#       rolled back
+#
+# Gap policy (INVOICE_GAP_POLICY):
+#   strict   get_next_invoice_number per number, as before; no gaps. The
+#            default; issuing numbers works without the migration, peek()
+#            needs it under either policy
+#   release  blocks of INVOICE_BLOCK_SIZE. A block is given up after
+#            INVOICE_BLOCK_TTL seconds, when the financial year changes or
+#            on shutdown (INVOICE_RELEASE_ON_SHUTDOWN, off on Lambda), and
+#            its unused tail is released if it is still the top of the
+#            counter. A tail that cannot be released, or that a recycled
+#            container never got to release, stays a gap. Every reserved,
+#            released and abandoned range is logged, so gaps can be
+#            reconciled from the logs.
+# With blocks, numbers are unique but containers interleave: one may issue
+# 21 before another issues 20.
+INVOICE_GAP_POLICIES = ("strict", "release")
+
+
+class InvoiceBlock:
+    def __init__(self, fy: str, rows: list, client: Client):
+        self.fy = fy
+        self.first = rows[0]["number"]
+        self.next = self.first
+        self.last = rows[-1]["number"]
+        self.invoice_numbers = [row["invoice_number"] for row in rows]
+        # Released with the client that reserved it, e.g. on shutdown
+        self.client = client
+        self.reserved_at = time.monotonic()
+
+    @property
+    def remaining(self) -> int:
+        return self.last - self.next + 1
+
+    def expired(self) -> bool:
+        return time.monotonic() - self.reserved_at >= INVOICE_BLOCK_TTL
+
+    def invoice_number(self, number: int) -> str:
+        return self.invoice_numbers[number - self.first]
+
+
+class InvoiceNumberAllocator:
+    """
+    Hands out invoice numbers per financial year from blocks reserved with
+    one atomic RPC each (hi/lo), instead of one RPC per number.
+    """
+
+    def __init__(
+        self,
+        block_size: int = INVOICE_BLOCK_SIZE,
+        policy: str = INVOICE_GAP_POLICY,
+    ):
+        if policy not in INVOICE_GAP_POLICIES:
+            raise ValueError(f"Unknown invoice gap policy: {policy}")
+        self.block_size = max(1, block_size)
+        self.policy = policy
+        self.blocks = {}
+        self.lock = threading.Lock()
+
+    def _reserve(self, client: Client, fy: str) -> InvoiceBlock:
+        with span("db.rpc.reserve_invoice_numbers"):
+            rows = client.rpc(
+                "reserve_invoice_numbers",
+                {"fy_param": fy, "block_size": self.block_size},
+            ).execute()
+        block = InvoiceBlock(fy, rows.data, client)
+        log_json("invoice_numbers_reserved", fy=fy, first=block.next, last=block.last)
+        return block
+
+    def _give_up(self, client: Client, block: InvoiceBlock) -> bool:
+        """Release the unused tail of a block, or log it as a gap."""
+        if block.remaining <= 0:
+            return True
+        released, error = False, None
+        try:
+            with span("db.rpc.release_invoice_numbers"):
+                released = (
+                    client.rpc(
+                        "release_invoice_numbers",
+                        {
+                            "fy_param": block.fy,
+                            "first_number": block.next,
+                            "last_number": block.last,
+                        },
+                    )
+                    .execute()
+                    .data
+                )
+        except Exception as e:
+            # The numbers are already unique; a failed release is only a gap
+            error = str(e)
+        log_json(
+            "invoice_numbers_released" if released else "invoice_numbers_abandoned",
+            fy=block.fy,
+            first=block.next,
+            last=block.last,
+            error=error,
+        )
+        return bool(released)
+
+    def _current_block(self, client: Client, fy: str) -> InvoiceBlock:
+        """A block for fy with numbers left, giving up stale ones first."""
+        for other in [key for key in self.blocks if key != fy]:
+            self._give_up(client, self.blocks.pop(other))
+        block = self.blocks.get(fy)
+        if block is not None and block.remaining > 0 and not block.expired():
+            return block
+        if block is not None:
+            self._give_up(client, block)
+        block = self.blocks[fy] = self._reserve(client, fy)
+        return block
+
+    def release_all(self):
+        """
+        Give up every block with the client that reserved it, e.g. on
+        shutdown. A block whose client can no longer call the RPC (an expired
+        token) is logged as abandoned.
+        """
+        with self.lock:
+            for fy in list(self.blocks):
+                block = self.blocks.pop(fy)
+                self._give_up(block.client, block)
+
+    def take(self, client: Client, fy: str) -> tuple:
+        """
+        Consume the next number for fy from this container's block.
+
+        Returns:
+            tuple: (number, formatted invoice number)
+        """
+        with self.lock:
+            block = self._current_block(client, fy)
+            number = block.next
+            block.next += 1
+            return number, block.invoice_number(number)
+
+    def next_number(self, client: Client, fy: str) -> str:
+        """
+        Consume and return the next invoice number for fy, formatted. Under
+        the strict policy this is get_next_invoice_number's result, unchanged.
+        """
+        if self.policy == "strict":
+            with span("db.rpc.get_next_invoice_number"):
+                return (
+                    client.rpc("get_next_invoice_number", {"fy_param": fy})
+                    .execute()
+                    .data
+                )
+        return self.take(client, fy)[1]
+
+    def peek(self, client: Client, fy: str) -> str:
+        """
+        The invoice number next_number() would return now, without consuming
+        it or reserving a block. Another container may still issue it first.
+        Calls the peek_invoice_number RPC unless this container holds a block,
+        so it needs the invoice number migration under either policy.
+        """
+        with self.lock:
+            block = self.blocks.get(fy)
+            if block is not None and block.remaining > 0 and not block.expired():
+                return block.invoice_number(block.next)
+        with span("db.rpc.peek_invoice_number"):
+            return client.rpc("peek_invoice_number", {"fy_param": fy}).execute().data
+
+
+invoice_numbers = InvoiceNumberAllocator()
@@ -0,0 +1,64 @@
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from uuid import UUID
+
+from fastapi.responses import JSONResponse
+
+from .constants import JSON_ENCODER
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+
+def json_default(value):
+    """Types the encoders do not handle themselves."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_orjson(content) -> bytes:
+    # orjson writes datetimes, dates and UUIDs natively, in ISO 8601 like
+    # isoformat(), and int keys as strings like the json module
+    return orjson.dumps(content, default=json_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def dumps_stdlib(content) -> bytes:
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+        default=json_default,
+    ).encode("utf-8")
+
+
+# JSON_ENCODER picks one of these; "orjson" falls back to "json" without it
+JSON_ENCODERS = {"orjson": dumps_orjson, "json": dumps_stdlib}
+
+
+def get_json_encoder(name: str = JSON_ENCODER):
+    if name == "orjson" and orjson is None:
+        name = "json"
+    return JSON_ENCODERS[name]
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse with a pluggable encoder, orjson by default. Unlike the
+    stock one it also accepts Decimal, datetime, date and UUID values.
+    """
+
+    encoder = staticmethod(get_json_encoder())
+
+    def render(self, content) -> bytes:
+        return self.encoder(content)
@@ -0,0 +1,254 @@
+import threading
+import time
+from bisect import bisect_left
+
+from .constants import METRICS_EMF, METRICS_NAMESPACE
+
+
+LATENCY_BUCKETS_MS = (
+    1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000,
+)  # fmt: skip
+SIZE_BUCKETS_BYTES = (
+    1_000, 10_000, 100_000, 500_000, 1_000_000, 2_000_000, 4_000_000,
+    6_000_000, 10_000_000,
+)  # fmt: skip
+MEMORY_BUCKETS_MB = (
+    1, 5, 10, 25, 50, 100, 150, 200, 300, 500, 750, 1000,
+)  # fmt: skip
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, label_names: tuple, buckets: tuple):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # per-bucket counts (+Inf last), sum
+                series = self._series[label_values] = [
+                    [0] * (len(self.buckets) + 1),
+                    0.0,
+                ]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, list(v[0]), v[1]) for k, v in self._series.items()]
+        for label_values, counts, total in sorted(items):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                labels = _format_labels(self.label_names, label_values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, label_names: tuple):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._series.get(label_values, 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._series.items())
+        for label_values, value in items:
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}{labels} {value}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+
+    def histogram(self, name, help, label_names=(), buckets=LATENCY_BUCKETS_MS):
+        return self._metrics.setdefault(
+            name, Histogram(name, help, tuple(label_names), tuple(buckets))
+        )
+
+    def counter(self, name, help, label_names=()):
+        return self._metrics.setdefault(name, Counter(name, help, tuple(label_names)))
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+ROUTE_LATENCY = registry.histogram(
+    "http_request_duration_ms", "Request latency by route", ("route", "method")
+)
+UPSTREAM_LATENCY = registry.histogram(
+    "supabase_call_duration_ms", "Supabase call latency by table or RPC", ("target",)
+)
+RENDER_LATENCY = registry.histogram(
+    "render_duration_ms", "Document render time by template", ("template",)
+)
+RESPONSE_BYTES = registry.histogram(
+    "response_bytes",
+    "Response body size by route",
+    ("route",),
+    buckets=SIZE_BUCKETS_BYTES,
+)
+RENDER_PEAK_MEMORY = registry.histogram(
+    "render_memory_peak_mb",
+    "Peak Python heap during a profiled render, by template",
+    ("template",),
+    buckets=MEMORY_BUCKETS_MB,
+)
+RENDER_RETAINED_MEMORY = registry.histogram(
+    "render_memory_retained_mb",
+    "Python heap still held after a profiled render, by template",
+    ("template",),
+    buckets=MEMORY_BUCKETS_MB,
+)
+RENDER_RSS_GROWTH = registry.histogram(
+    "render_rss_growth_mb",
+    "Peak RSS above the RSS at the start of a profiled render, by template",
+    ("template",),
+    buckets=MEMORY_BUCKETS_MB,
+)
+CACHE_REQUESTS = registry.counter(
+    "cache_requests_total", "Cache lookups by cache and result", ("cache", "result")
+)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+
+
+def record_render_memory(
+    template: str, peak_mb: float, retained_mb: float, rss_growth_mb: float
+) -> dict:
+    """
+    Feed one profiled render into the registry.
+
+    Returns:
+        dict: CloudWatch Embedded Metric Format fields to merge into the
+        render_memory log line, empty when METRICS_EMF is off
+    """
+    RENDER_PEAK_MEMORY.observe(peak_mb, template)
+    RENDER_RETAINED_MEMORY.observe(retained_mb, template)
+    RENDER_RSS_GROWTH.observe(rss_growth_mb, template)
+
+    if not METRICS_EMF:
+        return {}
+
+    return {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [["Template"]],
+                    "Metrics": [
+                        {"Name": "RenderPeakMemory", "Unit": "Megabytes"},
+                        {"Name": "RenderRetainedMemory", "Unit": "Megabytes"},
+                        {"Name": "RenderRssGrowth", "Unit": "Megabytes"},
+                    ],
+                }
+            ],
+        },
+        "Template": template,
+        "RenderPeakMemory": round(peak_mb, 2),
+        "RenderRetainedMemory": round(retained_mb, 2),
+        "RenderRssGrowth": round(rss_growth_mb, 2),
+    }
+
+
+def record_request(route: str, method: str, duration_ms: float, size, spans) -> dict:
+    """
+    Feed one finished request into the registry.
+
+    Args:
+        route (str): Route template, e.g. /invoice/{order_id}
+        method (str): HTTP method
+        duration_ms (float): Total request time
+        size (int, optional): Response body size, None when streamed
+        spans (list): (name, ms) pairs from the request timer
+
+    Returns:
+        dict: CloudWatch Embedded Metric Format fields to merge into the
+        request log line, empty when METRICS_EMF is off
+    """
+    ROUTE_LATENCY.observe(duration_ms, route, method)
+    if size is not None:
+        RESPONSE_BYTES.observe(size, route)
+
+    upstream_ms = 0.0
+    render_ms = 0.0
+    for name, ms in spans:
+        if name.startswith("db."):
+            UPSTREAM_LATENCY.observe(ms, name[3:])
+            upstream_ms += ms
+        elif name in ("jinja", "layout", "serialize", "optimize"):
+            render_ms += ms
+
+    if not METRICS_EMF:
+        return {}
+
+    metrics = [
+        {"Name": "Latency", "Unit": "Milliseconds"},
+        {"Name": "SupabaseTime", "Unit": "Milliseconds"},
+        {"Name": "RenderTime", "Unit": "Milliseconds"},
+    ]
+    fields = {
+        "Route": route,
+        "Latency": round(duration_ms, 1),
+        "SupabaseTime": round(upstream_ms, 1),
+        "RenderTime": round(render_ms, 1),
+    }
+    if size is not None:
+        metrics.append({"Name": "ResponseBytes", "Unit": "Bytes"})
+        fields["ResponseBytes"] = size
+
+    return {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [["Route"]],
+                    "Metrics": metrics,
+                }
+            ],
+        },
+        **fields,
+    }
@@ -0,0 +1,118 @@
+import base64
+import json
+from datetime import datetime
+
+from supabase import Client
+
+from .constants import SUPABASE_TABLES
+from .timing import span
+
+
+# Columns of order_view the listing may return; ?fields= picks a subset
+ORDER_LIST_COLUMNS = (
+    "id",
+    "created_at",
+    "status",
+    "customer_id",
+    "customer_name",
+    "pi_no",
+    "grand_total",
+    "delivery_date",
+)
+ORDER_LIST_MAX_LIMIT = 100
+
+
+def encode_cursor(row: dict) -> str:
+    """Opaque token for the position after row in (created_at, id) order."""
+    raw = json.dumps([row["created_at"], row["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> tuple:
+    """
+    (created_at, id) from a cursor token; ValueError if it is not one. The
+    token comes from the caller and created_at goes into an or= filter, so it
+    is parsed as a timestamp and re-serialised rather than passed through.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        created_at, order_id = json.loads(raw)
+        if not isinstance(order_id, int) or isinstance(order_id, bool):
+            raise ValueError
+        created_at = datetime.fromisoformat(created_at).isoformat()
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return created_at, order_id
+
+
+def parse_fields(fields: str) -> list:
+    """Requested columns, in ORDER_LIST_COLUMNS order; ValueError on unknown."""
+    if not fields:
+        return list(ORDER_LIST_COLUMNS)
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(ORDER_LIST_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return [column for column in ORDER_LIST_COLUMNS if column in requested]
+
+
+def list_orders(
+    client: Client,
+    limit: int,
+    cursor: str = None,
+    statuses: list = None,
+    customer_id: int = None,
+    created_from=None,
+    created_to=None,
+    columns: list = None,
+) -> dict:
+    """
+    One page of order_view, newest first, continuing after cursor.
+
+    Keyset pagination: the page is found with a (created_at, id) range
+    condition, so it costs the same at any depth given an index on
+    order_view's (created_at desc, id desc) source columns.
+
+    Returns:
+        dict: orders, next_cursor (None on the last page), and the planner's
+        estimated_total on the first page or estimated_remaining after it
+    """
+    columns = columns or list(ORDER_LIST_COLUMNS)
+    # The cursor needs created_at and id even when they are not requested
+    select = list(dict.fromkeys(columns + ["created_at", "id"]))
+
+    query = client.table(SUPABASE_TABLES.order_view).select(
+        ",".join(select), count="estimated"
+    )
+    if statuses:
+        query = query.in_("status", statuses)
+    if customer_id is not None:
+        query = query.eq("customer_id", customer_id)
+    if created_from is not None:
+        query = query.gte("created_at", created_from.isoformat())
+    if created_to is not None:
+        query = query.lt("created_at", created_to.isoformat())
+    if cursor:
+        created_at, order_id = decode_cursor(cursor)
+        query = query.or_(
+            f'created_at.lt."{created_at}",'
+            f'and(created_at.eq."{created_at}",id.lt.{order_id})'
+        )
+
+    with span("db.order_view"):
+        response = (
+            query.order("created_at", desc=True)
+            .order("id", desc=True)
+            .limit(limit + 1)
+            .execute()
+        )
+
+    rows = response.data[:limit]
+    has_more = len(response.data) > limit
+    # With a cursor the count covers only the rows after it
+    count_key = "estimated_remaining" if cursor else "estimated_total"
+    return {
+        "orders": [{column: row.get(column) for column in columns} for row in rows],
+        "next_cursor": encode_cursor(rows[-1]) if has_more else None,
+        count_key: response.count,
+    }
@@ -0,0 +1,223 @@
+from datetime import datetime, timezone
+
+from supabase import Client, create_client
+
+from .constants import (
+    ORDER_METRICS_VERSION,
+    SUPABASE_ANON_KEY,
+    SUPABASE_SERVICE_ROLE_KEY,
+    SUPABASE_TABLES,
+    SUPABASE_URL,
+)
+from .helpers import ITEM_METRICS_INPUTS, compute_item_metrics, item_metrics_source
+from .projections import select_string
+from .timing import span
+
+
+# order_metrics holds the derived metrics of one order per row, created by
+# supabase/migrations/20261019000200_order_metrics.sql:
+#
+#   order_id         bigint primary key references orders(id)
+#   formula_version  int
+#   item_count       int
+#   total_qty        int
+#   total_weight     numeric
+#   total_sqft       numeric
+#   items            jsonb  [{id, quantity, weight, chargeable_width,
+#                              chargeable_height, sqft, source}]
+#   updated_at       timestamptz
+#
+# Rows are written by POST /orders/{order_id}/metrics whenever an order or its
+# proforma items are saved, and rebuilt or verified in bulk with
+#   python -m utils.order_metrics rebuild [--order-id 12 13]
+#   python -m utils.order_metrics check
+#
+# source is item_metrics_source() of the item the metrics were computed from;
+# documents recompute an item's metrics when it no longer matches, so an item
+# edited without a metrics refresh is never printed with stale ones.
+ORDER_METRICS_ITEM_FIELDS = {"id": None, **dict.fromkeys(ITEM_METRICS_INPUTS)}
+
+ORDER_METRICS_SOURCE_SELECT = select_string(
+    {
+        "order_id": None,
+        SUPABASE_TABLES.proforma_invoice_items: ORDER_METRICS_ITEM_FIELDS,
+    }
+)
+
+# Stored vs recomputed values closer than this are considered equal
+TOLERANCE = 1e-6
+
+
+def compute_order_metrics(order_id: int, items: list) -> dict:
+    """
+    Compute the order_metrics row for an order from its proforma items.
+
+    Args:
+        order_id (int): orders.id
+        items (list): proforma_items rows with ORDER_METRICS_ITEM_FIELDS
+
+    Returns:
+        dict: order_metrics row
+    """
+    item_metrics = [
+        dict(compute_item_metrics(item), source=item_metrics_source(item))
+        for item in items
+    ]
+    return {
+        "order_id": order_id,
+        "formula_version": ORDER_METRICS_VERSION,
+        "item_count": len(item_metrics),
+        "total_qty": sum(m["quantity"] for m in item_metrics),
+        "total_weight": sum(m["weight"] for m in item_metrics),
+        "total_sqft": sum(m["sqft"] for m in item_metrics),
+        "items": item_metrics,
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def fetch_order_items(client: Client, order_ids: list) -> dict:
+    """Proforma items of the given orders, keyed by order id."""
+    with span("db.proforma_invoices"):
+        response = (
+            client.table(SUPABASE_TABLES.proforma_invoices)
+            .select(ORDER_METRICS_SOURCE_SELECT)
+            .in_("order_id", order_ids)
+            .execute()
+        )
+    items = {order_id: [] for order_id in order_ids}
+    for proforma in response.data:
+        items.setdefault(proforma["order_id"], []).extend(
+            proforma.get(SUPABASE_TABLES.proforma_invoice_items) or []
+        )
+    return items
+
+
+def refresh_order_metrics(client: Client, order_ids: list) -> list:
+    """Recompute and upsert the order_metrics rows of the given orders."""
+    rows = [
+        compute_order_metrics(order_id, items)
+        for order_id, items in fetch_order_items(client, order_ids).items()
+    ]
+    if rows:
+        with span("db.order_metrics"):
+            client.table(SUPABASE_TABLES.order_metrics).upsert(
+                rows, on_conflict="order_id"
+            ).execute()
+    return rows
+
+
+def iter_order_id_batches(client: Client, batch_size: int):
+    """Every order id, in keyset-paginated batches."""
+    last_id = 0
+    while True:
+        response = (
+            client.table(SUPABASE_TABLES.orders)
+            .select("id")
+            .gt("id", last_id)
+            .order("id")
+            .limit(batch_size)
+            .execute()
+        )
+        if not response.data:
+            return
+        ids = [row["id"] for row in response.data]
+        yield ids
+        last_id = ids[-1]
+
+
+def rebuild_order_metrics(client: Client, batch_size: int = 200) -> int:
+    """Backfill: recompute every order's metrics. Returns the order count."""
+    count = 0
+    for ids in iter_order_id_batches(client, batch_size):
+        count += len(refresh_order_metrics(client, ids))
+    return count
+
+
+def _differs(stored, expected) -> bool:
+    if isinstance(expected, (int, float)) and isinstance(stored, (int, float)):
+        return abs(float(stored) - float(expected)) > TOLERANCE
+    return stored != expected
+
+
+def compare_order_metrics(stored: dict, expected: dict) -> list:
+    """Human readable differences between a stored row and a recomputed one."""
+    if stored is None:
+        return ["missing"]
+    problems = []
+    if stored.get("formula_version") != expected["formula_version"]:
+        problems.append(
+            f"formula_version {stored.get('formula_version')} != "
+            f"{expected['formula_version']}"
+        )
+    for field in ("item_count", "total_qty", "total_weight", "total_sqft"):
+        if _differs(stored.get(field), expected[field]):
+            problems.append(f"{field} {stored.get(field)} != {expected[field]}")
+
+    stored_items = {m.get("id"): m for m in stored.get("items") or []}
+    for metrics in expected["items"]:
+        current = stored_items.get(metrics["id"])
+        if current is None:
+            problems.append(f"item {metrics['id']} missing")
+            continue
+        for field, value in metrics.items():
+            if _differs(current.get(field), value):
+                problems.append(
+                    f"item {metrics['id']} {field} {current.get(field)} != {value}"
+                )
+    return problems
+
+
+def check_order_metrics(client: Client, batch_size: int = 200) -> dict:
+    """
+    Compare every stored order_metrics row with the current formulas.
+
+    Returns:
+        dict: order id -> list of differences, only for inconsistent orders
+    """
+    inconsistent = {}
+    for ids in iter_order_id_batches(client, batch_size):
+        items = fetch_order_items(client, ids)
+        with span("db.order_metrics"):
+            stored = {
+                row["order_id"]: row
+                for row in client.table(SUPABASE_TABLES.order_metrics)
+                .select("*")
+                .in_("order_id", ids)
+                .execute()
+                .data
+            }
+        for order_id in ids:
+            expected = compute_order_metrics(order_id, items.get(order_id, []))
+            problems = compare_order_metrics(stored.get(order_id), expected)
+            if problems:
+                inconsistent[order_id] = problems
+    return inconsistent
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Maintain the order_metrics table")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    parser.add_argument("--order-id", type=int, nargs="*", help="rebuild only these")
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+
+    admin_client = create_client(
+        supabase_url=SUPABASE_URL,
+        supabase_key=SUPABASE_SERVICE_ROLE_KEY or SUPABASE_ANON_KEY,
+    )
+    if args.command == "rebuild":
+        if args.order_id:
+            count = len(refresh_order_metrics(admin_client, args.order_id))
+        else:
+            count = rebuild_order_metrics(admin_client, args.batch_size)
+        print(f"Rebuilt metrics for {count} orders")
+        sys.exit(0)
+
+    inconsistent = check_order_metrics(admin_client, args.batch_size)
+    for order_id, problems in sorted(inconsistent.items()):
+        print(f"order {order_id}: {'; '.join(problems)}")
+    print(f"{len(inconsistent)} inconsistent orders")
+    sys.exit(1 if inconsistent else 0)
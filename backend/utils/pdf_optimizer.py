@@ -0,0 +1,282 @@
+import base64
+import re
+import time
+import zlib
+from functools import lru_cache
+from io import BytesIO
+
+import httpx
+
+from .metrics import record_cache
+from .timing import logger
+
+try:
+    import zopfli.zlib as zopfli_zlib
+except ImportError:  # pragma: no cover - zopfli is pinned in requirements.txt
+    zopfli_zlib = None
+
+
+# CSS px are defined at 96 per inch
+CSS_PX_PER_INCH = 96
+
+# Largest box the templates draw the company logo in (max-width, max-height)
+LOGO_MAX_CSS_PX = (150, 90)
+
+# image_dpi: resolution embedded images are downsampled to (None keeps source)
+# zopfli_iterations: 0 recompresses streams with zlib level 9, >0 uses zopfli
+PDF_PRESETS = {
+    "none": {"image_dpi": None, "recompress": False, "zopfli_iterations": 0},
+    "screen": {"image_dpi": 96, "recompress": True, "zopfli_iterations": 0},
+    "ebook": {"image_dpi": 150, "recompress": True, "zopfli_iterations": 0},
+    "print": {"image_dpi": 300, "recompress": True, "zopfli_iterations": 15},
+}
+
+_OBJ_HEADER = re.compile(rb"(\d+)\s+(\d+)\s+obj\b")
+_STREAM_KEYWORD = re.compile(rb"stream\r?\n")
+_LENGTH_ENTRY = re.compile(rb"/Length\s+\d+(?:\s+\d+\s+R)?")
+_FILTER_ENTRY = re.compile(rb"/Filter\s*(/\w+|\[[^\]]*\])")
+
+
+def get_preset(name: str = None) -> dict:
+    if not name:
+        return PDF_PRESETS["none"]
+    if name not in PDF_PRESETS:
+        raise ValueError(f"Unknown PDF preset: {name}")
+    return PDF_PRESETS[name]
+
+
+@lru_cache(maxsize=32)
+def _downscaled_image_data_uri(src: str, max_width: int, max_height: int) -> str:
+    from PIL import Image
+
+    response = httpx.get(src, timeout=5.0, follow_redirects=True)
+    response.raise_for_status()
+
+    image = Image.open(BytesIO(response.content))
+    if image.width <= max_width and image.height <= max_height:
+        return src
+
+    image.thumbnail((max_width, max_height), Image.LANCZOS)
+    if image.mode not in ("RGB", "RGBA", "L", "LA"):
+        image = image.convert("RGBA")
+
+    output = BytesIO()
+    image.save(output, format="PNG", optimize=True)
+    encoded = base64.b64encode(output.getvalue()).decode("ascii")
+    return f"data:image/png;base64,{encoded}"
+
+
+def downscale_image_source(
+    src: str, box_css_px: tuple = LOGO_MAX_CSS_PX, dpi: int = None
+) -> str:
+    """
+    Return an image source no larger than the printed box at the given DPI.
+
+    Args:
+        src (str): Image URL as stored in the database
+        box_css_px (tuple): (width, height) of the box the template draws it in
+        dpi (int, optional): Target resolution, None returns src unchanged
+
+    Returns:
+        str: A PNG data URI of the downscaled image, or src when it is already
+        small enough or could not be fetched
+    """
+    if not src or not dpi or src.startswith("data:"):
+        return src
+
+    max_width = max(1, round(box_css_px[0] * dpi / CSS_PX_PER_INCH))
+    max_height = max(1, round(box_css_px[1] * dpi / CSS_PX_PER_INCH))
+    try:
+        hits = _downscaled_image_data_uri.cache_info().hits
+        result = _downscaled_image_data_uri(src, max_width, max_height)
+        record_cache("logo", _downscaled_image_data_uri.cache_info().hits > hits)
+        return result
+    except Exception as e:
+        logger.warning(f"Logo downscale skipped: {e}")
+        return src
+
+
+def _compress(data: bytes, zopfli_iterations: int) -> bytes:
+    if zopfli_iterations > 0 and zopfli_zlib is not None:
+        return zopfli_zlib.compress(data, numiterations=zopfli_iterations)
+    return zlib.compress(data, 9)
+
+
+def _recompress_object(obj: bytes, zopfli_iterations: int) -> bytes:
+    stream_match = _STREAM_KEYWORD.search(obj)
+    end = obj.rfind(b"endstream")
+    if stream_match is None or end == -1:
+        return obj
+
+    dictionary = obj[: stream_match.start()]
+    raw = obj[stream_match.end() : end]
+    filter_match = _FILTER_ENTRY.search(dictionary)
+
+    if filter_match is None:
+        # Unfiltered stream: strip the EOL that precedes endstream
+        if raw.endswith(b"\r\n"):
+            raw = raw[:-2]
+        elif raw.endswith(b"\n") or raw.endswith(b"\r"):
+            raw = raw[:-1]
+        decoded = raw
+        dictionary = dictionary.replace(b"<<", b"<< /Filter /FlateDecode", 1)
+    elif filter_match.group(1).strip(b"[] ") == b"/FlateDecode":
+        try:
+            decoder = zlib.decompressobj()
+            decoded = decoder.decompress(raw)
+        except zlib.error:
+            return obj
+        raw = raw[: len(raw) - len(decoder.unused_data)]
+    else:
+        # DCT, JPX, CCITT etc. are left alone
+        return obj
+
+    compressed = _compress(decoded, zopfli_iterations)
+    if len(compressed) >= len(raw):
+        return obj
+
+    if not _LENGTH_ENTRY.search(dictionary):
+        return obj
+    dictionary = _LENGTH_ENTRY.sub(
+        b"/Length " + str(len(compressed)).encode(), dictionary, count=1
+    )
+    return dictionary + b"stream\n" + compressed + b"\nendstream\nendobj\n"
+
+
+def _parse_classic_xref(pdf: bytes, xref_offset: int):
+    trailer_at = pdf.find(b"trailer", xref_offset)
+    if trailer_at == -1:
+        return None
+
+    offsets = {}
+    tokens = pdf[xref_offset + len(b"xref") : trailer_at].split()
+    i = 0
+    while i < len(tokens):
+        start, count = int(tokens[i]), int(tokens[i + 1])
+        i += 2
+        for n in range(count):
+            offset, _, kind = tokens[i : i + 3]
+            if kind == b"n":
+                offsets[start + n] = int(offset)
+            i += 3
+
+    trailer_end = pdf.find(b"startxref", trailer_at)
+    trailer = pdf[trailer_at + len(b"trailer") : trailer_end].strip()
+    return offsets, trailer
+
+
+def recompress_pdf_streams(pdf: bytes, zopfli_iterations: int = 0) -> bytes:
+    """
+    Recompress every Flate (or unfiltered) stream of a PDF and rebuild its
+    cross-reference table.
+
+    Only single-revision files with a classic xref table are rewritten.
+    Anything else (xref streams, incremental updates, encryption) is returned
+    unchanged.
+
+    Args:
+        pdf (bytes): PDF produced by WeasyPrint
+        zopfli_iterations (int): 0 uses zlib level 9, >0 uses zopfli
+
+    Returns:
+        bytes: The recompressed PDF, never larger than the input
+    """
+    try:
+        startxref = pdf.rindex(b"startxref")
+        xref_offset = int(pdf[startxref + len(b"startxref") :].split()[0])
+        if not pdf.startswith(b"xref", xref_offset):
+            return pdf
+
+        parsed = _parse_classic_xref(pdf, xref_offset)
+        if parsed is None:
+            return pdf
+        offsets, trailer = parsed
+        if b"/Prev" in trailer or b"/Encrypt" in trailer or not offsets:
+            return pdf
+
+        ordered = sorted(offsets.items(), key=lambda item: item[1])
+        header = pdf[: ordered[0][1]]
+        boundaries = [offset for _, offset in ordered[1:]] + [xref_offset]
+
+        output = BytesIO()
+        output.write(header)
+        new_offsets = {}
+        for (number, offset), boundary in zip(ordered, boundaries):
+            obj = pdf[offset:boundary]
+            header_match = _OBJ_HEADER.match(obj)
+            if header_match is None or int(header_match.group(1)) != number:
+                return pdf
+            obj = obj[: obj.rindex(b"endobj") + len(b"endobj")] + b"\n"
+            new_offsets[number] = output.tell()
+            output.write(_recompress_object(obj, zopfli_iterations))
+
+        size = max(new_offsets) + 1
+        new_xref_offset = output.tell()
+        output.write(b"xref\n0 %d\n0000000000 65535 f \n" % size)
+        for number in range(1, size):
+            if number in new_offsets:
+                output.write(b"%010d 00000 n \n" % new_offsets[number])
+            else:
+                output.write(b"0000000000 65535 f \n")
+
+        trailer = re.sub(rb"/Size\s+\d+", b"/Size %d" % size, trailer, count=1)
+        output.write(b"trailer\n" + trailer + b"\n")
+        output.write(b"startxref\n%d\n%%%%EOF\n" % new_xref_offset)
+
+        result = output.getvalue()
+        return result if len(result) < len(pdf) else pdf
+    except (ValueError, IndexError) as e:
+        logger.warning(f"PDF recompression skipped: {e}")
+        return pdf
+
+
+def optimize_pdf(pdf: bytes, preset: str = None) -> bytes:
+    settings = get_preset(preset)
+    if not settings["recompress"]:
+        return pdf
+    return recompress_pdf_streams(pdf, settings["zopfli_iterations"])
+
+
+def preset_report(render, presets=None) -> list:
+    """
+    Measure output size and time for each preset.
+
+    Args:
+        render (callable): Takes a preset name and returns the PDF bytes
+        presets (list, optional): Preset names, defaults to all of them
+
+    Returns:
+        list: One dict per preset with bytes, ratio against "none" and ms
+    """
+    rows = []
+    baseline = None
+    for name in presets or PDF_PRESETS:
+        started = time.perf_counter()
+        pdf = render(name)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if baseline is None:
+            baseline = len(pdf)
+        rows.append(
+            {
+                "preset": name,
+                "bytes": len(pdf),
+                "ratio": round(len(pdf) / baseline, 3) if baseline else 1.0,
+                "ms": round(elapsed_ms, 1),
+            }
+        )
+    return rows
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python -m utils.pdf_optimizer invoice.pdf size_sheet.pdf
+    for path in sys.argv[1:]:
+        with open(path, "rb") as f:
+            source = f.read()
+        print(path)
+        for row in preset_report(lambda name: optimize_pdf(source, name)):
+            print(
+                f"  {row['preset']:<8} {row['bytes']:>10} bytes"
+                f"  x{row['ratio']:<6} {row['ms']:>8} ms"
+            )
@@ -0,0 +1,241 @@
+import asyncio
+import os
+import random
+import re
+import sys
+import threading
+from collections import Counter
+from typing import Optional
+from uuid import uuid4
+
+from .constants import (
+    PROFILER_ADMIN_EMAILS,
+    PROFILER_DIR,
+    PROFILER_INTERVAL_MS,
+    PROFILER_SAMPLE_RATE,
+    PROFILER_STORAGE,
+    DOCUMENT_SIGNED_URL_TTL,
+)
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+
+from .document_storage import get_document_store
+from .timing import (
+    current_timer,
+    logger,
+    reset_current_sampler,
+    set_current_sampler,
+)
+
+
+# Leaf frames of threads that are parked, not working
+_IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+}
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return (
+        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    )
+
+
+class StackSampler:
+    """
+    Samples the Python stacks of one request at a fixed interval and
+    aggregates them as collapsed stacks (flamegraph.pl / speedscope format).
+
+    Only the request's own work is sampled: the event loop thread while the
+    request's task is the one running on it, and threadpool threads while
+    they run a profiled_call() for the request (renders do). Other requests
+    on the same loop or threadpool are left out. Each stack starts with
+    "loop" or "worker" for the kind of thread it was taken on.
+
+    Nothing runs unless start() is called, so an unprofiled request pays only
+    for the should_profile() check.
+    """
+
+    def __init__(self, interval_ms: float = PROFILER_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self.samples = 0
+        self.worker_threads = set()
+        self._loop = None
+        self._task = None
+        self._loop_thread = None
+        self._context_token = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_thread(self):
+        self.worker_threads.add(threading.get_ident())
+
+    def remove_thread(self):
+        self.worker_threads.discard(threading.get_ident())
+
+    def _sample(self):
+        frames = sys._current_frames()
+        threads = [(thread_id, "worker") for thread_id in set(self.worker_threads)]
+        if self._task is not None and asyncio.current_task(self._loop) is self._task:
+            threads.append((self._loop_thread, "loop"))
+        for thread_id, kind in threads:
+            frame = frames.get(thread_id)
+            if frame is None:
+                continue
+            code = frame.f_code
+            if (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            labels.append(kind)
+            self.stacks[";".join(reversed(labels))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        """Start sampling the calling task; call from the request's task."""
+        try:
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.current_task()
+        except RuntimeError:
+            self._loop = self._task = None
+        self._loop_thread = threading.get_ident()
+        self._context_token = set_current_sampler(self)
+        self._thread = threading.Thread(
+            target=self._run, name="stack-sampler", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and not self._stop.is_set()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._context_token is not None:
+            try:
+                reset_current_sampler(self._context_token)
+            except ValueError:
+                # Stopped from another context than it was started in
+                pass
+            self._context_token = None
+
+    def collapsed(self) -> str:
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+
+def is_profiler_admin(user) -> bool:
+    # user is the gotrue UserResponse stored by jwt_middleware
+    user = getattr(user, "user", None)
+    if user is None:
+        return False
+    if (user.app_metadata or {}).get("role") == "admin":
+        return True
+    return bool(user.email) and user.email.lower() in PROFILER_ADMIN_EMAILS
+
+
+def should_profile(request) -> bool:
+    if PROFILER_SAMPLE_RATE and random.random() < PROFILER_SAMPLE_RATE:
+        return True
+    flag = request.headers.get("X-Profile") or request.query_params.get("profile")
+    if flag not in ("1", "true"):
+        return False
+    return is_profiler_admin(getattr(request.state, "user", None))
+
+
+def save_profile(
+    sampler: StackSampler, request_id: str, authenticated_client=None
+) -> Optional[str]:
+    """
+    Store a finished profile and return a link to it: a signed object storage
+    URL when PROFILER_STORAGE is "storage", otherwise a file:// URL under
+    PROFILER_DIR. Blocks on the upload, so call it off the event loop.
+
+    Returns:
+        Optional[str]: The link, or None when the profile could only be
+        logged because there was no authenticated client to upload with
+    """
+    # request_id may come from the X-Request-ID header
+    safe_id = re.sub(r"[^A-Za-z0-9_-]", "", request_id)[:64] or uuid4().hex
+    filename = f"{safe_id}.collapsed"
+    content = sampler.collapsed().encode()
+
+    if PROFILER_STORAGE == "storage":
+        # Excluded routes have no authenticated client to upload with, and a
+        # local file would be out of reach where storage is configured
+        if authenticated_client is None:
+            logger.info(
+                f"Profile {safe_id} ({sampler.samples} samples)\n{content.decode()}"
+            )
+            return None
+        path = f"profiles/{filename}"
+        store = get_document_store(authenticated_client)
+        store.upload(path, content, "text/plain")
+        return store.signed_url(path, DOCUMENT_SIGNED_URL_TTL)
+
+    os.makedirs(PROFILER_DIR, exist_ok=True)
+    path = os.path.join(PROFILER_DIR, filename)
+    with open(path, "wb") as f:
+        f.write(content)
+    logger.info(f"Profile saved to {path} ({sampler.samples} samples)")
+    return f"file://{path}"
+
+
+class ProfilerMiddleware:
+    """
+    Samples the stacks of requests that should_profile() picks, from the
+    moment auth has run until the response headers go out, and links the
+    stored profile in an X-Profile-URL header (see save_profile()). A streamed
+    body is sent after the headers and so is not profiled.
+
+    Must be added before AuthMiddleware so it runs inside it and sees the
+    authenticated user. Pure ASGI, so unprofiled requests pay only for the
+    should_profile() check.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request = Request(scope)
+        if not should_profile(request):
+            await self.app(scope, receive, send)
+            return
+
+        sampler = StackSampler()
+
+        async def send_profiled(message):
+            if message["type"] == "http.response.start" and sampler.running:
+                sampler.stop()
+                url = await run_in_threadpool(
+                    save_profile,
+                    sampler,
+                    current_timer().request_id,
+                    getattr(request.state, "authenticated_client", None),
+                )
+                if url is not None:
+                    MutableHeaders(raw=message["headers"])["X-Profile-URL"] = url
+            await send(message)
+
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_profiled)
+        finally:
+            if sampler.running:
+                sampler.stop()
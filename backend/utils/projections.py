@@ -0,0 +1,103 @@
+from .constants import SUPABASE_TABLES
+
+
+# Field maps: column name -> None, or embed ("alias:table" or "table") -> field
+# map of the embedded rows. Only what the document context actually reads is
+# listed; tests/test_projections.py fails when a document reads a field
+# that is missing here.
+INVOICE_COMPANY_FIELDS = {
+    "logo": None,
+    "company_name": None,
+    "address": None,
+    "mobile_nos": None,
+    "email_id": None,
+    "gst_no": None,
+    "pan_no": None,
+    "bank_account_name": None,
+    "bank_name": None,
+    "branch": None,
+    "bank_account_no": None,
+    "ifsc_code": None,
+    "terms_and_conditions": None,
+}
+
+INVOICE_ORDER_FIELDS = {
+    "delivery_date": None,
+    SUPABASE_TABLES.order_metrics: {"formula_version": None, "items": None},
+    SUPABASE_TABLES.customers: {
+        "name": None,
+        "company_name": None,
+        "gstin": None,
+        "phone": None,
+        "address": None,
+        "mobile": None,
+        "shipping_address": None,
+    },
+    SUPABASE_TABLES.proforma_invoices: {
+        "pi_no": None,
+        "created_at": None,
+        "payment_terms": None,
+        "destination": None,
+        "transport_info": None,
+        "unloading_info": None,
+        "is_gst": None,
+        "total_amount": None,
+        "gst_amount": None,
+        "grand_total": None,
+        "has_advanced_payment": None,
+        "advanced_payment_amount": None,
+        "advanced_payment_notes": None,
+        "remarks": None,
+        SUPABASE_TABLES.users: {"full_name": None},
+        SUPABASE_TABLES.proforma_additional_costs: {
+            "cost_name": None,
+            "amount": None,
+        },
+        SUPABASE_TABLES.proforma_invoice_items: {
+            "id": None,
+            "customer_order_no": None,
+            "quantity": None,
+            "weight": None,
+            "unit": None,
+            "size_width": None,
+            "size_height": None,
+            "size_width_fraction": None,
+            "size_height_fraction": None,
+            "width_rounding_value": None,
+            "height_rounding_value": None,
+            "rate": None,
+            "rate_type": None,
+            "amount": None,
+            SUPABASE_TABLES.products: {"name": None},
+            SUPABASE_TABLES.thickness_master: {"name": None},
+        },
+    },
+}
+
+
+def select_string(fields: dict) -> str:
+    """
+    Build a PostgREST select string from a field map.
+
+    Args:
+        fields (dict): column -> None, embed -> nested field map
+
+    Returns:
+        str: e.g. "delivery_date,customers(name,phone)"
+    """
+    parts = []
+    for name, children in fields.items():
+        if children is None:
+            parts.append(name)
+        else:
+            parts.append(f"{name}({select_string(children)})")
+    return ",".join(parts)
+
+
+def embed_key(name: str) -> str:
+    """Key an embed appears under in the response ("alias:table" -> alias)."""
+    return name.split(":", 1)[0]
+
+
+INVOICE_COMPANY_SELECT = select_string(INVOICE_COMPANY_FIELDS)
+INVOICE_ORDER_SELECT = select_string(INVOICE_ORDER_FIELDS)
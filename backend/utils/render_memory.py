@@ -0,0 +1,147 @@
+import gc
+import random
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from .admission import current_rss_mb, render_admission
+from .constants import RENDER_MEMORY_RSS_INTERVAL_MS, RENDER_MEMORY_SAMPLE_RATE
+from .metrics import record_render_memory
+from .timing import current_timer, log_json
+
+
+MB = 1024 * 1024
+
+# The list in a template context that makes a document grow
+RENDER_ITEM_KEYS = ("proforma_items", "items", "lines")
+
+# tracemalloc sees every thread's allocations, so one render is traced at a
+# time and the renders running beside it are counted in its record
+_trace_lock = threading.Lock()
+
+
+def render_item_count(data: dict) -> int:
+    """Number of items in a template context, 0 if it has no item list."""
+    form = data.get("form", {})
+    for key in RENDER_ITEM_KEYS:
+        if isinstance(form.get(key), list):
+            return len(form[key])
+    return 0
+
+
+class RssSampler:
+    """
+    Polls the process RSS from a thread and keeps the highest value seen.
+    Catches what tracemalloc cannot: cairo, pango and other C allocations.
+    """
+
+    def __init__(self, interval_ms: float = RENDER_MEMORY_RSS_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.start_mb = current_rss_mb()
+        self.peak_mb = self.start_mb
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="rss-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> float:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.peak_mb = max(self.peak_mb, current_rss_mb())
+        return self.peak_mb
+
+
+class RenderMemoryRecord:
+    def __init__(self, template: str, items: int):
+        self.template = template
+        self.items = items
+        self.output_bytes = None
+
+
+def should_measure_render() -> bool:
+    return RENDER_MEMORY_SAMPLE_RATE > 0 and random.random() < RENDER_MEMORY_SAMPLE_RATE
+
+
+@contextmanager
+def measure_render_memory(template: str, items: int):
+    """
+    Measure the memory of the render in the block for RENDER_MEMORY_SAMPLE_RATE
+    of calls, e.g.
+
+        with measure_render_memory("invoice.html", 40) as record:
+            pdf = ...
+            if record is not None:
+                record.output_bytes = len(pdf)
+
+    A measured render is logged as a render_memory event and fed into the
+    render_memory_* histograms:
+        peak_mb       Python heap high-water mark above the start
+        retained_mb   Python heap still held afterwards, after a gc.collect();
+                      includes the document the block returns and anything
+                      cached on first use (templates, fonts)
+        rss_growth_mb RSS high-water mark above the start, sampled every
+                      RENDER_MEMORY_RSS_INTERVAL_MS; includes C allocations
+                      and tracemalloc's own bookkeeping, and is shared with
+                      concurrent_renders - 1 other renders
+
+    Yields:
+        RenderMemoryRecord: set output_bytes on it; None when this render is
+        not measured, or another is already being traced
+    """
+    if not should_measure_render() or not _trace_lock.acquire(blocking=False):
+        yield None
+        return
+
+    record = RenderMemoryRecord(template, items)
+    started_tracing = not tracemalloc.is_tracing()
+    try:
+        if started_tracing:
+            tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        concurrent = render_admission.running
+        sampler = RssSampler()
+        sampler.start()
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - started
+            rss_peak_mb = sampler.stop()
+        peak_mb = (tracemalloc.get_traced_memory()[1] - baseline) / MB
+        gc.collect()
+        retained_mb = (tracemalloc.get_traced_memory()[0] - baseline) / MB
+        concurrent = max(1, concurrent, render_admission.running)
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+        _trace_lock.release()
+
+    rss_growth_mb = max(rss_peak_mb - sampler.start_mb, 0.0)
+    emf = record_render_memory(template, peak_mb, retained_mb, rss_growth_mb)
+    timer = current_timer()
+    log_json(
+        "render_memory",
+        request_id=timer.request_id if timer else None,
+        template=template,
+        items=items,
+        output_bytes=record.output_bytes,
+        seconds=round(seconds, 3),
+        peak_mb=round(peak_mb, 2),
+        retained_mb=round(retained_mb, 2),
+        rss_start_mb=round(sampler.start_mb, 1),
+        rss_peak_mb=round(rss_peak_mb, 1),
+        rss_growth_mb=round(rss_growth_mb, 1),
+        concurrent_renders=concurrent,
+        **emf,
+    )
@@ -0,0 +1,115 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+from .constants import STATS_CACHE_SCOPE, STATS_CACHE_STALE_TTL, STATS_CACHE_TTL
+from .metrics import CACHE_REQUESTS
+from .timing import logger
+
+
+CACHE_HIT = "hit"
+CACHE_STALE = "stale"
+CACHE_MISS = "miss"
+
+
+class ResponseCache:
+    """
+    Per-container cache of computed responses with stale-while-revalidate.
+
+    An entry is served as is for `ttl` seconds. For the next `stale_ttl`
+    seconds it is still served, but a single background refresh is started.
+    After that the caller waits for a fresh value. Concurrent misses for one
+    key share a single computation. invalidate() drops everything, including
+    refreshes that are still running.
+    """
+
+    def __init__(self, name: str, ttl: float, stale_ttl: float, max_entries: int = 256):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+
+    async def _compute(self, key, compute, generation: int):
+        try:
+            value = await compute()
+            if generation == self.generation:
+                self._entries[key] = (value, time.monotonic())
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return value
+        finally:
+            if self._inflight.get(key, (None, None))[1] is asyncio.current_task():
+                del self._inflight[key]
+
+    def _start(self, key, compute) -> asyncio.Task:
+        inflight = self._inflight.get(key)
+        # A task left behind by another event loop (a finished Mangum
+        # invocation, a closed test client) is never awaited again
+        if (
+            inflight is not None
+            and inflight[0] == self.generation
+            and inflight[1].get_loop() is asyncio.get_running_loop()
+        ):
+            return inflight[1]
+        task = asyncio.ensure_future(self._compute(key, compute, self.generation))
+        task.add_done_callback(self._log_failure)
+        self._inflight[key] = (self.generation, task)
+        return task
+
+    async def get(self, key, compute) -> tuple:
+        """
+        Cached value for key, computing it with `await compute()` if needed.
+
+        Returns:
+            tuple: (value, "hit" | "stale" | "miss")
+        """
+        entry = self._entries.get(key)
+        if entry is not None and self.ttl > 0:
+            value, stored_at = entry
+            age = time.monotonic() - stored_at
+            if age < self.ttl:
+                CACHE_REQUESTS.inc(self.name, CACHE_HIT)
+                return value, CACHE_HIT
+            if age < self.ttl + self.stale_ttl:
+                self._start(key, compute)
+                CACHE_REQUESTS.inc(self.name, CACHE_STALE)
+                return value, CACHE_STALE
+
+        CACHE_REQUESTS.inc(self.name, CACHE_MISS)
+        if self.ttl <= 0:
+            return await compute(), CACHE_MISS
+        return await asyncio.shield(self._start(key, compute)), CACHE_MISS
+
+    def _log_failure(self, task: asyncio.Task):
+        # Retrieves the exception so background failures are logged, not lost
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"{self.name} cache refresh failed: {task.exception()}")
+
+    def invalidate(self, reason: str = ""):
+        self.generation += 1
+        self._entries.clear()
+        self._inflight.clear()
+        logger.debug(f"{self.name} cache invalidated {reason}".strip())
+
+
+def visibility_scope(user) -> str:
+    """
+    What a caller can see through RLS. "user" (the default) gives every user
+    their own entries. "role" shares entries between users with the same
+    app_metadata.role, which is only correct when the policies depend on the
+    role alone. The same scope keys the order_monthly_stats rows.
+    """
+    # user is the gotrue UserResponse stored by jwt_middleware
+    user = getattr(user, "user", None)
+    if user is None:
+        return "anonymous"
+    if STATS_CACHE_SCOPE == "role":
+        return f"role:{(user.app_metadata or {}).get('role', 'authenticated')}"
+    return f"user:{user.id}"
+
+
+stats_cache = ResponseCache("stats", STATS_CACHE_TTL, STATS_CACHE_STALE_TTL)
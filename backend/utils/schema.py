@@ -1,5 +1,19 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional
+
+
+# ?delivery= on document endpoints; omitted means inline unless too large
+DeliveryMode = Literal["inline", "url"]
+
+# ?granularity= on /stats/series
+Granularity = Literal["day", "week", "month"]
+
+# ?format= on /export/orders
+ExportFormat = Literal["csv", "ndjson", "xlsx"]
+
+# ?format= on /size-sheet-batch: one PDF with a section per customer, or a
+# ZIP with one PDF per customer
+SizeSheetBatchFormat = Literal["pdf", "zip"]
 
 
 class UserLoginSchema(BaseModel):
@@ -7,6 +21,10 @@ class UserLoginSchema(BaseModel):
     password: str
 
 
+class RefreshTokenSchema(BaseModel):
+    refresh_token: str
+
+
 class UserSchema(BaseModel):
     id: str
     email: str
@@ -45,3 +63,11 @@ class SizeSheetRequest(BaseModel):
     title: Optional[str] = "Size Sheet"
     # Optional remarks to print at the bottom
     remarks: Optional[str] = ""
+    # Print identical lines (same product, thickness, size, fractions,
+    # rounding and unit) once, with their quantities and weights summed
+    condensed: Optional[bool] = False
+
+
+class SizeSheetBatchRequest(BaseModel):
+    # One size sheet per customer id, in the order they should appear
+    sheets: Dict[str, SizeSheetRequest]
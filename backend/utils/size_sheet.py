@@ -0,0 +1,358 @@
+import re
+import zipfile
+from io import BytesIO
+from math import ceil
+
+from natsort import natsorted
+from openpyxl import Workbook
+from supabase import Client
+
+from .constants import SUPABASE_TABLES
+from .helpers import parse_fractional_inch
+from .render_memory import measure_render_memory
+from .timing import span
+
+
+SIZE_SHEET_CUSTOMER_SELECT = (
+    "name,company_name,gstin,phone,email,address,mobile,shipping_address"
+)
+
+
+# A run of order numbers like PO-7, PO-8, PO-9 is listed as "PO-7–9"
+ORDER_NUMBER_RUN_SEPARATOR = "–"
+ORDER_NUMBER = re.compile(r"^(.*?)(\d+)$")
+
+
+def size_sheet_group_key(item) -> tuple:
+    """The fields that decide how a line prints, apart from its order number."""
+    return (
+        item.product_name or "",
+        item.thickness or "",
+        item.size_width,
+        item.size_width_fraction or "",
+        item.size_height,
+        item.size_height_fraction or "",
+        int(item.width_rounding_value or 0),
+        int(item.height_rounding_value or 0),
+        (item.unit or "ft").lower(),
+    )
+
+
+def compact_order_numbers(values) -> str:
+    """
+    Distinct order numbers in natural order, with consecutive numbers that
+    share a prefix collapsed into a range.
+
+    Args:
+        values (iterable): customer_order_no values, blanks are skipped
+
+    Returns:
+        str: e.g. "A1–3, A7, B2"
+    """
+    runs = []  # [prefix, first digits, last digits], or [value] without digits
+    for value in natsorted({value for value in values if value}):
+        match = ORDER_NUMBER.match(value)
+        if match is None:
+            runs.append([value])
+            continue
+        prefix, digits = match.groups()
+        run = runs[-1] if runs else None
+        if (
+            run is not None
+            and len(run) == 3
+            and run[0] == prefix
+            and int(run[2]) + 1 == int(digits)
+            and (len(run[2]) == len(digits) or not digits.startswith("0"))
+        ):
+            run[2] = digits
+        else:
+            runs.append([prefix, digits, digits])
+    return ", ".join(
+        (
+            run[0]
+            if len(run) == 1
+            else f"{run[0]}{run[1]}"
+            + (f"{ORDER_NUMBER_RUN_SEPARATOR}{run[2]}" if run[2] != run[1] else "")
+        )
+        for run in runs
+    )
+
+
+def condense_size_sheet_items(items) -> list:
+    """
+    Merge lines with the same size_sheet_group_key into one, summing quantity
+    and weight and listing the member order numbers with
+    compact_order_numbers. Square feet follow from the summed quantity.
+
+    Args:
+        items (list): SizeSheetItem lines
+
+    Returns:
+        list: (SizeSheetItem, number of lines merged) per distinct line
+    """
+    groups = {}
+    for item in items:
+        group = groups.setdefault(
+            size_sheet_group_key(item),
+            {"item": item, "quantity": 0, "weight": 0.0, "order_numbers": []},
+        )
+        group["quantity"] += int(item.quantity or 0)
+        group["weight"] += float(item.weight or 0)
+        group["order_numbers"].append(item.customer_order_no)
+    return [
+        (
+            group["item"].model_copy(
+                update={
+                    "quantity": group["quantity"],
+                    "weight": group["weight"],
+                    "customer_order_no": compact_order_numbers(group["order_numbers"]),
+                }
+            ),
+            len(group["order_numbers"]),
+        )
+        for group in groups.values()
+    ]
+
+
+def size_sheet_lines(payload) -> list:
+    """(SizeSheetItem, lines) to print, condensed when the payload asks for it."""
+    if payload.condensed:
+        return condense_size_sheet_items(payload.items)
+    return [(item, 1) for item in payload.items]
+
+
+def build_size_sheet_items(lines: list) -> dict:
+    """
+    Rows and totals for size_sheet.html.
+
+    Args:
+        lines (list): (SizeSheetItem, lines) from size_sheet_lines
+
+    Returns:
+        dict: items, has_inch_unit, total_qty, total_weight and total_sqft
+    """
+    processed_items = []
+    total_qty = 0
+    total_sqft = 0.0
+    total_weight = 0.0
+
+    for item, line_count in lines:
+        # Reset per-item chargeable sizes
+        chargeable_width = 0.0
+        chargeable_height = 0.0
+        unit = (item.unit or "ft").lower()
+        total_weight += float(item.weight or 0.0)
+        qty = int(item.quantity or 0)
+
+        if unit == "mm":
+            width_feet = float(item.size_width)
+            height_feet = float(item.size_height)
+            line_sqft = width_feet * height_feet * qty * 10.764 / 1000000
+            total_sqft += line_sqft
+        elif unit == "inch":
+            width_inches = parse_fractional_inch(
+                item.size_width, item.size_width_fraction or ""
+            )
+            height_inches = parse_fractional_inch(
+                item.size_height, item.size_height_fraction or ""
+            )
+
+            width_rounding_value = int(item.width_rounding_value or 0)
+            height_rounding_value = int(item.height_rounding_value or 0)
+
+            if width_rounding_value and width_rounding_value > 0:
+                width_inches = (
+                    ceil(width_inches / width_rounding_value) * width_rounding_value
+                )
+
+            if height_rounding_value and height_rounding_value > 0:
+                height_inches = (
+                    ceil(height_inches / height_rounding_value) * height_rounding_value
+                )
+
+            chargeable_width = width_inches
+            chargeable_height = height_inches
+
+            width_feet = width_inches
+            height_feet = height_inches
+            line_sqft = width_feet * height_feet * qty / 144
+            total_sqft += line_sqft
+        else:
+            width_feet = float(item.size_width)
+            height_feet = float(item.size_height)
+            line_sqft = width_feet * height_feet * qty
+            total_sqft += line_sqft
+
+        total_qty += qty
+
+        processed_items.append(
+            {
+                "customer_order_no": item.customer_order_no or "",
+                "name": item.product_name or "",
+                "thickness": item.thickness or "",
+                "chargeable_width": chargeable_width,
+                "chargeable_height": chargeable_height,
+                "width": (int(item.size_width) if unit == "inch" else item.size_width),
+                "height": (
+                    int(item.size_height) if unit == "inch" else item.size_height
+                ),
+                "unit": unit,
+                "qty": qty,
+                "lines": line_count,
+                "weight": f"{(item.weight or 0):.2f}",
+                "size_width_fraction": item.size_width_fraction or "",
+                "size_height_fraction": item.size_height_fraction or "",
+                "total_sqft": f"{line_sqft:.2f}",
+            }
+        )
+
+    return {
+        "items": natsorted(
+            processed_items, key=lambda x: x.get("customer_order_no", "")
+        ),
+        "has_inch_unit": any((item.unit or "").lower() == "inch" for item, _ in lines),
+        "total_qty": total_qty,
+        "total_weight": f"{total_weight:.2f}",
+        "total_sqft": f"{total_sqft:.2f}",
+    }
+
+
+def fetch_size_sheet_customers(client: Client, customer_ids: list) -> dict:
+    """customers rows for customer_ids in one query, keyed by id as a string."""
+    with span("db.customers"):
+        rows = (
+            client.table(SUPABASE_TABLES.customers)
+            .select(f"id,{SIZE_SHEET_CUSTOMER_SELECT}")
+            .in_("id", customer_ids)
+            .execute()
+        ).data
+    return {str(row["id"]): row for row in rows}
+
+
+def build_size_sheet_context(
+    company_details: dict, customer: dict, payload, bookmark: bool = False
+) -> dict:
+    """
+    Build the size_sheet.html context.
+
+    Args:
+        company_details (dict): company_master row
+        customer (dict): customers row
+        payload (SizeSheetRequest): The request body
+        bookmark (bool): Add a PDF bookmark with the customer's name, for
+            sheets combined into one document
+
+    Returns:
+        dict: {"form": ...} template context
+    """
+    return {
+        "form": {
+            "company_logo": company_details.get("logo"),
+            "company_name": company_details.get("company_name"),
+            "company_address": company_details.get("address"),
+            "company_mobile": ", ".join(company_details.get("mobile_nos", [])),
+            "company_email": company_details.get("email_id"),
+            "company_gst": company_details.get("gst_no"),
+            "company_pan": company_details.get("pan_no"),
+            "title": payload.title or "Size Sheet",
+            "bill_to": {
+                "name": customer.get("company_name", "") or customer.get("name", ""),
+                "address": customer.get("address", ""),
+                "phone": customer.get("phone", ""),
+                "mobile": customer.get("mobile", ""),
+                "gst": customer.get("gstin", ""),
+            },
+            "ship_to": {
+                "name": customer.get("company_name", "") or customer.get("name", ""),
+                "address": customer.get("shipping_address", "")
+                or customer.get("address", ""),
+                "phone": customer.get("phone", ""),
+                "mobile": customer.get("mobile", ""),
+            },
+            **build_size_sheet_items(size_sheet_lines(payload)),
+            "condensed": bool(payload.condensed),
+            "bookmark": bookmark,
+            "remarks": payload.remarks or "",
+        }
+    }
+
+
+def build_size_str(value: float, fraction: str, unit: str) -> str:
+    unit_l = (unit or "ft").lower()
+    if unit_l == "inch":
+        whole = int(value) if value is not None else 0
+        frac = (fraction or "").strip()
+        return f"{whole} {frac}".strip()
+    return f"{value}" if value is not None else ""
+
+
+def build_size_sheet_workbook(payload) -> Workbook:
+    """The size sheet as a workbook, one row per (condensed) line."""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Size Sheet"
+
+    # Headers
+    headers = ["Sr No", "Customer Order No", "Size1", "Size2", "Qnt"]
+    if payload.condensed:
+        headers.append("Lines")
+    ws.append(headers)
+
+    # Sort items by customer_order_no like PDF endpoint
+    lines = natsorted(
+        size_sheet_lines(payload), key=lambda line: (line[0].customer_order_no or "")
+    )
+
+    # Fill rows
+    for idx, (item, line_count) in enumerate(lines, start=1):
+        size1 = build_size_str(
+            item.size_width, item.size_width_fraction or "", item.unit
+        )
+        size2 = build_size_str(
+            item.size_height, item.size_height_fraction or "", item.unit
+        )
+        row = [
+            idx,
+            item.customer_order_no or "",
+            size1,
+            size2,
+            int(item.quantity or 0),
+        ]
+        if payload.condensed:
+            row.append(line_count)
+        ws.append(row)
+
+    # Autosize columns (simple heuristic)
+    for column_cells in ws.columns:
+        max_length = 0
+        col = column_cells[0].column_letter
+        for cell in column_cells:
+            try:
+                cell_length = len(str(cell.value)) if cell.value is not None else 0
+                if cell_length > max_length:
+                    max_length = cell_length
+            except Exception:
+                pass
+        ws.column_dimensions[col].width = max(10, min(50, max_length + 2))
+
+    return wb
+
+
+def write_size_sheet_workbook(payload) -> bytes:
+    """The size sheet workbook as XLSX bytes, built and saved in one go."""
+    with measure_render_memory("size_sheet.xlsx", len(payload.items)) as memory:
+        output = BytesIO()
+        build_size_sheet_workbook(payload).save(output)
+        content = output.getvalue()
+        if memory is not None:
+            memory.output_bytes = len(content)
+    return content
+
+
+def zip_documents(files: dict) -> bytes:
+    """A ZIP of {filename: bytes}, stored as is since PDFs are compressed."""
+    output = BytesIO()
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_STORED) as archive:
+        for filename, content in files.items():
+            archive.writestr(filename, content)
+    return output.getvalue()
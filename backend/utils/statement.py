@@ -0,0 +1,168 @@
+from supabase import Client
+
+from .constants import STATEMENT_PAGE_ORDERS, SUPABASE_TABLES
+from .helpers import convertDateToProperFormat
+from .order_listing import decode_cursor, encode_cursor
+from .projections import select_string
+from .timing import span
+
+
+# Only what a statement line prints: the order and its proforma totals
+STATEMENT_ORDER_FIELDS = {
+    "id": None,
+    "created_at": None,
+    "status": None,
+    SUPABASE_TABLES.proforma_invoices: {
+        "pi_no": None,
+        "created_at": None,
+        "grand_total": None,
+        "has_advanced_payment": None,
+        "advanced_payment_amount": None,
+    },
+}
+STATEMENT_ORDER_SELECT = select_string(STATEMENT_ORDER_FIELDS)
+
+
+def fetch_statement_page(
+    client: Client,
+    customer_id: str,
+    start,
+    end,
+    after: str = None,
+    limit: int = STATEMENT_PAGE_ORDERS,
+) -> list:
+    """
+    Up to limit of the customer's active orders created in [start, end),
+    oldest first, after the cursor. Keyset on (created_at, id) like
+    utils.export.fetch_export_page.
+    """
+    query = (
+        client.table(SUPABASE_TABLES.orders)
+        .select(STATEMENT_ORDER_SELECT)
+        .eq("customer_id", customer_id)
+        .gte("created_at", start.isoformat())
+        .lt("created_at", end.isoformat())
+        .eq("active", True)
+    )
+    if after:
+        created_at, order_id = decode_cursor(after)
+        query = query.or_(
+            f'created_at.gt."{created_at}",'
+            f'and(created_at.eq."{created_at}",id.gt.{order_id})'
+        )
+    with span("db.orders"):
+        return (query.order("created_at").order("id").limit(limit).execute()).data
+
+
+def iter_statement_orders(client: Client, customer_id: str, start, end):
+    """Every order of the statement, one page held at a time."""
+    after = None
+    while True:
+        page = fetch_statement_page(client, customer_id, start, end, after)
+        yield from page
+        if len(page) < STATEMENT_PAGE_ORDERS:
+            return
+        after = encode_cursor(page[-1])
+
+
+def build_statement_lines(orders) -> dict:
+    """
+    Statement lines and totals in one pass over the orders. The balance of
+    an order is its grand total less the advance, as on its invoice.
+    Cancelled orders are listed but left out of the totals and the running
+    balance, as they are left out of revenue in /stats. Orders without a
+    proforma invoice have nothing to bill and are skipped.
+
+    Args:
+        orders (iterable): orders rows with STATEMENT_ORDER_FIELDS, oldest first
+
+    Returns:
+        dict: lines, order_count, cancelled_count, total_billed,
+            total_advance and total_balance
+    """
+    lines = []
+    order_count = 0
+    cancelled_count = 0
+    total_billed = 0.0
+    total_advance = 0.0
+    running_balance = 0.0
+
+    for order in orders:
+        proforma = order.get(SUPABASE_TABLES.proforma_invoices)
+        if not proforma:
+            continue
+        grand_total = float(proforma.get("grand_total") or 0)
+        advance = (
+            float(proforma.get("advanced_payment_amount") or 0)
+            if proforma.get("has_advanced_payment")
+            else 0.0
+        )
+        balance = grand_total - advance
+        cancelled = order.get("status") == "cancelled"
+        if cancelled:
+            cancelled_count += 1
+        else:
+            order_count += 1
+            total_billed += grand_total
+            total_advance += advance
+            running_balance += balance
+
+        created_at = proforma.get("created_at") or order.get("created_at")
+        lines.append(
+            {
+                "date": convertDateToProperFormat(created_at) if created_at else "",
+                "pi_no": proforma.get("pi_no") or "",
+                "status": order.get("status") or "",
+                "cancelled": cancelled,
+                "grand_total": f"{grand_total:.2f}",
+                "advance": f"{advance:.2f}",
+                "balance": f"{balance:.2f}",
+                "running_balance": f"{running_balance:.2f}",
+            }
+        )
+
+    return {
+        "lines": lines,
+        "order_count": order_count,
+        "cancelled_count": cancelled_count,
+        "total_billed": f"{total_billed:.2f}",
+        "total_advance": f"{total_advance:.2f}",
+        "total_balance": f"{running_balance:.2f}",
+    }
+
+
+def build_statement_context(
+    company_details: dict, customer: dict, fy: str, orders
+) -> dict:
+    """
+    Build the statement.html context.
+
+    Args:
+        company_details (dict): company_master row
+        customer (dict): customers row
+        fy (str): Financial year the statement covers, e.g. "2025-26"
+        orders (iterable): Orders from iter_statement_orders
+
+    Returns:
+        dict: {"form": ...} template context
+    """
+    return {
+        "form": {
+            "company_logo": company_details.get("logo"),
+            "company_name": company_details.get("company_name"),
+            "company_address": company_details.get("address"),
+            "company_mobile": ", ".join(company_details.get("mobile_nos", [])),
+            "company_email": company_details.get("email_id"),
+            "company_gst": company_details.get("gst_no"),
+            "company_pan": company_details.get("pan_no"),
+            "fy": fy,
+            "customer": {
+                "name": customer.get("company_name", "") or customer.get("name", ""),
+                "address": customer.get("address", ""),
+                "phone": customer.get("phone", ""),
+                "mobile": customer.get("mobile", ""),
+                "gst": customer.get("gstin", ""),
+            },
+            **build_statement_lines(orders),
+        }
+    }
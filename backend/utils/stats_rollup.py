@@ -0,0 +1,382 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from supabase import Client, create_client
+
+from .constants import (
+    STATS_ROLLUP_SCAN_SECONDS,
+    SUPABASE_SERVICE_ROLE_KEY,
+    SUPABASE_TABLES,
+    SUPABASE_URL,
+)
+from .stats_series import IST
+from .timing import span
+
+
+# order_monthly_stats holds one row per visibility scope and IST calendar
+# month of orders.created_at, see
+# supabase/migrations/20261019000100_order_monthly_stats_scope.sql:
+#
+#   scope             text         -- response_cache.visibility_scope()
+#   month_key         text         -- "2025-04"
+#   order_count       int          -- active orders, any status
+#   revenue           numeric      -- grand_total of non-cancelled orders
+#   delivered_count   int
+#   pending_count     int
+#   total_sqft        numeric      -- order_metrics, non-cancelled orders
+#   total_weight      numeric
+#   closed            bool         -- the month is over
+#   scanned_until     timestamptz  -- delta scan watermark: orders.updated_at
+#   scanned_until_id  bigint       --   and orders.id of the last order seen
+#   refreshed_at      timestamptz
+#   primary key (scope, month_key)
+#
+# A scope's months are aggregated with the client of a caller in that scope,
+# so RLS decides what they count, but the table is only read and written
+# with the service role key: callers need no access to it and cannot see or
+# change another scope's rows. Without SUPABASE_SERVICE_ROLE_KEY there is no
+# store and the months /stats shows are aggregated on every computation.
+#
+# A month is aggregated one last time once it is over and is not recomputed
+# on a schedule after that. The delta scan over (orders.updated_at, id), at
+# most every STATS_ROLLUP_SCAN_SECONDS per scope and container, re-aggregates
+# every month with a changed order, closed or not, so late status changes
+# and edits still land. Rebuild a scope from scratch with
+#   python -m utils.stats_rollup rebuild --scope role:admin [--month 2025-04]
+STATS_ROLLUP_ORDER_SELECT = (
+    f"id,created_at,status,"
+    f"{SUPABASE_TABLES.proforma_invoices}(grand_total),"
+    f"{SUPABASE_TABLES.order_metrics}(total_sqft,total_weight)"
+)
+
+# PostgREST caps responses at max-rows (1000 by default)
+STATS_ROLLUP_PAGE_SIZE = 1000
+
+# scope -> time.monotonic() of its last delta scan
+_last_scan = {}
+_store = None
+
+
+def month_key(value: datetime) -> str:
+    """IST calendar month of a timestamp, e.g. "2025-04"; naive means UTC."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(IST).strftime("%Y-%m")
+
+
+def created_month_key(created_at: str) -> str:
+    return month_key(datetime.fromisoformat(created_at))
+
+
+def current_month_key() -> str:
+    return month_key(datetime.now(timezone.utc))
+
+
+def month_range(key: str) -> tuple:
+    """[start, end) of a month, as IST midnights."""
+    start = datetime.strptime(f"{key}-01", "%Y-%m-%d")
+    end = (start + timedelta(days=32)).replace(day=1)
+    return IST.localize(start), IST.localize(end)
+
+
+def previous_month_key(key: str) -> str:
+    return month_key(month_range(key)[0] - timedelta(days=1))
+
+
+def last_month_keys(key: str, count: int) -> list:
+    """count calendar months ending with key, oldest first."""
+    keys = [key]
+    while len(keys) < count:
+        keys.append(previous_month_key(keys[-1]))
+    return keys[::-1]
+
+
+def rollup_store():
+    """
+    Service role client that reads and writes order_monthly_stats.
+
+    Returns:
+        Client: None without SUPABASE_SERVICE_ROLE_KEY
+    """
+    global _store
+    if _store is None and SUPABASE_SERVICE_ROLE_KEY:
+        _store = create_client(
+            supabase_url=SUPABASE_URL, supabase_key=SUPABASE_SERVICE_ROLE_KEY
+        )
+    return _store
+
+
+def iter_month_orders(client: Client, key: str, page_size: int):
+    """
+    Pages of a month's active orders, keyset-paginated on (created_at, id).
+
+    Yields:
+        tuple: (page, exact count of the month's orders on the first page)
+    """
+    start, end = month_range(key)
+    last = None
+    while True:
+        query = (
+            client.table(SUPABASE_TABLES.orders)
+            .select(STATS_ROLLUP_ORDER_SELECT, count="exact" if last is None else None)
+            .gte("created_at", start.isoformat())
+            .lt("created_at", end.isoformat())
+            .eq("active", True)
+            .order("created_at")
+            .order("id")
+            .limit(page_size)
+        )
+        if last is not None:
+            created_at, order_id = last
+            query = query.or_(
+                f'created_at.gt."{created_at}",'
+                f'and(created_at.eq."{created_at}",id.gt.{order_id})'
+            )
+        with span("db.orders"):
+            response = query.execute()
+        yield response.data, response.count
+        if len(response.data) < page_size:
+            return
+        last = (response.data[-1]["created_at"], response.data[-1]["id"])
+
+
+def aggregate_month(
+    client: Client, scope: str, key: str, page_size: int = STATS_ROLLUP_PAGE_SIZE
+) -> dict:
+    """Aggregate one month straight from the orders client can see."""
+    row = {
+        "scope": scope,
+        "month_key": key,
+        "order_count": 0,
+        "revenue": 0.0,
+        "delivered_count": 0,
+        "pending_count": 0,
+        "total_sqft": 0.0,
+        "total_weight": 0.0,
+        "closed": key < current_month_key(),
+        "refreshed_at": datetime.now(timezone.utc).isoformat(),
+    }
+    for orders, count in iter_month_orders(client, key, page_size):
+        if count is not None:
+            row["order_count"] = count
+        aggregate_orders(row, orders)
+    row["revenue"] = round(row["revenue"], 2)
+    return row
+
+
+def aggregate_orders(row: dict, orders: list):
+    """Add a page of orders to a month's row, in place."""
+    for order in orders:
+        status = order.get("status")
+        if status == "delivered":
+            row["delivered_count"] += 1
+        elif status == "pending":
+            row["pending_count"] += 1
+        if status == "cancelled":
+            continue
+        proforma = order.get(SUPABASE_TABLES.proforma_invoices) or {}
+        metrics = order.get(SUPABASE_TABLES.order_metrics) or {}
+        row["revenue"] += float(f"{proforma.get('grand_total') or 0:.2f}")
+        row["total_sqft"] += metrics.get("total_sqft") or 0
+        row["total_weight"] += metrics.get("total_weight") or 0
+
+
+def save_rollup(store: Client, rows: list):
+    if rows:
+        with span("db.order_monthly_stats"):
+            store.table(SUPABASE_TABLES.order_monthly_stats).upsert(
+                rows, on_conflict="scope,month_key"
+            ).execute()
+
+
+def read_rollup(store: Client, scope: str) -> dict:
+    with span("db.order_monthly_stats"):
+        rows = (
+            store.table(SUPABASE_TABLES.order_monthly_stats)
+            .select("*")
+            .eq("scope", scope)
+            .order("month_key")
+            .execute()
+        ).data
+    return {row["month_key"]: row for row in rows}
+
+
+def watermark(rows: dict):
+    """(updated_at, id) of the last order the delta scan saw, or None."""
+    marks = [
+        (row["scanned_until"], row.get("scanned_until_id") or 0)
+        for row in rows.values()
+        if row.get("scanned_until")
+    ]
+    return max(marks) if marks else None
+
+
+def set_watermark(row: dict, mark: tuple):
+    row["scanned_until"], row["scanned_until_id"] = mark
+
+
+def rebuild_rollup(client: Client, store: Client, scope: str, keys: list = None):
+    """
+    Recompute the given months of a scope, or every month since its first
+    order. A full rebuild also moves the delta scan watermark to the newest
+    (orders.updated_at, id), by the database clock, not ours.
+    """
+    full = keys is None
+    if full:
+        with span("db.orders"):
+            latest = (
+                client.table(SUPABASE_TABLES.orders)
+                .select("id,updated_at")
+                .order("updated_at", desc=True)
+                .order("id", desc=True)
+                .limit(1)
+                .execute()
+            ).data
+        with span("db.orders"):
+            first = (
+                client.table(SUPABASE_TABLES.orders)
+                .select("created_at")
+                .eq("active", True)
+                .order("created_at")
+                .limit(1)
+                .execute()
+            ).data
+        current = current_month_key()
+        keys = [current]
+        if first:
+            oldest = created_month_key(first[0]["created_at"])
+            while keys[-1] > oldest:
+                keys.append(previous_month_key(keys[-1]))
+
+    rows = [aggregate_month(client, scope, key) for key in sorted(keys)]
+    if full and latest:
+        set_watermark(rows[-1], (latest[0]["updated_at"], latest[0]["id"]))
+    save_rollup(store, rows)
+    return {row["month_key"]: row for row in rows}
+
+
+def scan_order_changes(
+    client: Client, store: Client, scope: str, rows: dict, page_size: int = 1000
+) -> dict:
+    """
+    Delta scan: re-aggregate the months, closed or open, that have orders
+    updated after the watermark, keyset-paginated on (updated_at, id) so
+    orders sharing an updated_at across a page boundary are not skipped.
+    """
+    since = watermark(rows)
+    changed, newest = set(), since
+    while True:
+        query = (
+            client.table(SUPABASE_TABLES.orders)
+            .select("id,created_at,updated_at")
+            .order("updated_at")
+            .order("id")
+            .limit(page_size)
+        )
+        if newest:
+            updated_at, order_id = newest
+            query = query.or_(
+                f'updated_at.gt."{updated_at}",'
+                f'and(updated_at.eq."{updated_at}",id.gt.{order_id})'
+            )
+        with span("db.orders"):
+            page = query.execute().data
+        changed.update(created_month_key(order["created_at"]) for order in page)
+        if page:
+            newest = (page[-1]["updated_at"], page[-1]["id"])
+        if len(page) < page_size:
+            break
+
+    if newest == since:
+        return {}
+
+    refreshed = [
+        aggregate_month(client, scope, key)
+        for key in sorted(changed | {current_month_key()})
+    ]
+    set_watermark(refreshed[-1], newest)
+    save_rollup(store, refreshed)
+    return {row["month_key"]: row for row in refreshed}
+
+
+def request_rollup_scan():
+    """Run the delta scan on the next ensure_rollup(), e.g. after a change event."""
+    _last_scan.clear()
+
+
+def ensure_rollup(client: Client, scope: str, months: int = 13) -> dict:
+    """
+    Rollup rows of a visibility scope for /stats: backfills an empty scope,
+    closes months that have ended, fills gaps in the last `months` months and
+    runs the delta scan when it is due. In steady state this is a single read.
+
+    Args:
+        client (Client): a caller's authenticated client; what it can see is
+            what the scope's rows count
+        scope (str): response_cache.visibility_scope() of that caller
+        months (int): months up to the current one that must be present
+
+    Returns:
+        dict: month_key -> order_monthly_stats row
+    """
+    store = rollup_store()
+    current = current_month_key()
+    if store is None:
+        return {
+            key: aggregate_month(client, scope, key)
+            for key in last_month_keys(current, months)
+        }
+
+    rows = read_rollup(store, scope)
+    if not rows:
+        _last_scan[scope] = time.monotonic()
+        return rebuild_rollup(client, store, scope)
+
+    stale = [
+        key
+        for key in last_month_keys(current, months)
+        if key not in rows or (key < current and not rows[key].get("closed"))
+    ]
+    if stale:
+        stale_rows = [aggregate_month(client, scope, key) for key in stale]
+        save_rollup(store, stale_rows)
+        rows.update({row["month_key"]: row for row in stale_rows})
+
+    if time.monotonic() - _last_scan.get(scope, float("-inf")) >= (
+        STATS_ROLLUP_SCAN_SECONDS
+    ):
+        _last_scan[scope] = time.monotonic()
+        rows.update(scan_order_changes(client, store, scope, rows))
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Maintain order_monthly_stats")
+    parser.add_argument("command", choices=["rebuild", "scan"])
+    parser.add_argument(
+        "--scope",
+        required=True,
+        help="Scope to refresh, e.g. role:admin; the service role sees every "
+        "order, so only for scopes whose callers do too",
+    )
+    parser.add_argument("--month", nargs="*", help="YYYY-MM, default all months")
+    args = parser.parse_args()
+
+    admin_client = rollup_store()
+    if admin_client is None:
+        sys.exit("SUPABASE_SERVICE_ROLE_KEY is required")
+    if args.command == "rebuild":
+        result = rebuild_rollup(
+            admin_client, admin_client, args.scope, args.month or None
+        )
+    else:
+        result = scan_order_changes(
+            admin_client,
+            admin_client,
+            args.scope,
+            read_rollup(admin_client, args.scope),
+        )
+    print(f"Refreshed {len(result)} months: {', '.join(sorted(result))}")
@@ -0,0 +1,174 @@
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+
+import pytz
+from supabase import Client
+
+from .constants import SUPABASE_TABLES
+from .helpers import compute_item_metrics
+from .order_metrics import ORDER_METRICS_ITEM_FIELDS
+from .projections import select_string
+from .timing import span
+
+
+IST = pytz.timezone("Asia/Kolkata")
+# Guards against e.g. ten years of daily buckets
+STATS_SERIES_MAX_BUCKETS = 1000
+# PostgREST caps responses at max-rows (1000 by default)
+STATS_SERIES_PAGE_SIZE = 1000
+
+STATS_SERIES_SELECT = (
+    f"id,created_at,status,"
+    f"{SUPABASE_TABLES.proforma_invoices}(grand_total),"
+    f"{SUPABASE_TABLES.order_metrics}(total_sqft)"
+)
+# With a product filter only that product's lines are counted
+STATS_SERIES_PRODUCT_SELECT = (
+    f"id,created_at,status,"
+    f"{SUPABASE_TABLES.proforma_invoices}!inner("
+    f"{SUPABASE_TABLES.proforma_invoice_items}!inner("
+    + select_string({"product_id": None, "amount": None, **ORDER_METRICS_ITEM_FIELDS})
+    + "))"
+)
+
+
+def bucket_start(day: date, granularity: str) -> date:
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(start: date, granularity: str) -> date:
+    if granularity == "week":
+        return start + timedelta(days=7)
+    if granularity == "month":
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def bucket_edges(from_date: date, to_date: date, granularity: str) -> list:
+    """
+    IST calendar bucket starts covering [from_date, to_date], plus the end of
+    the last bucket. Weeks start on Monday.
+
+    Returns:
+        list: dates, one more than the number of buckets
+    """
+    edges = [bucket_start(from_date, granularity)]
+    while edges[-1] <= to_date:
+        edges.append(next_bucket(edges[-1], granularity))
+        if len(edges) > STATS_SERIES_MAX_BUCKETS + 1:
+            raise ValueError(
+                f"More than {STATS_SERIES_MAX_BUCKETS} {granularity} buckets, "
+                "narrow the range or use a coarser granularity"
+            )
+    return edges
+
+
+def ist_midnight(day: date) -> datetime:
+    return IST.localize(datetime(day.year, day.month, day.day))
+
+
+def fetch_series_rows(
+    client: Client,
+    start: datetime,
+    end: datetime,
+    customer_id: int = None,
+    product_id: int = None,
+) -> list:
+    """
+    Minimal order rows created in [start, end), usually in one request, keyset
+    paginated on (created_at, id) so orders sharing a created_at across a
+    page boundary are neither skipped nor repeated.
+    """
+    rows, last = [], None
+    while True:
+        query = (
+            client.table(SUPABASE_TABLES.orders)
+            .select(STATS_SERIES_PRODUCT_SELECT if product_id else STATS_SERIES_SELECT)
+            .gte("created_at", start.isoformat())
+            .lt("created_at", end.isoformat())
+            .eq("active", True)
+        )
+        if customer_id is not None:
+            query = query.eq("customer_id", customer_id)
+        if product_id is not None:
+            query = query.eq(
+                f"{SUPABASE_TABLES.proforma_invoices}."
+                f"{SUPABASE_TABLES.proforma_invoice_items}.product_id",
+                product_id,
+            )
+        if last is not None:
+            created_at, order_id = last
+            query = query.or_(
+                f'created_at.gt."{created_at}",'
+                f'and(created_at.eq."{created_at}",id.gt.{order_id})'
+            )
+        with span("db.orders"):
+            page = (
+                query.order("created_at")
+                .order("id")
+                .limit(STATS_SERIES_PAGE_SIZE)
+                .execute()
+            ).data
+        rows.extend(page)
+        if len(page) < STATS_SERIES_PAGE_SIZE:
+            return rows
+        last = (page[-1]["created_at"], page[-1]["id"])
+
+
+def _order_values(order: dict, by_product: bool) -> tuple:
+    """(revenue, sqft) an order contributes."""
+    proforma = order.get(SUPABASE_TABLES.proforma_invoices) or {}
+    if by_product:
+        items = proforma.get(SUPABASE_TABLES.proforma_invoice_items) or []
+        return (
+            sum(item.get("amount") or 0 for item in items),
+            sum(compute_item_metrics(item)["sqft"] for item in items),
+        )
+    metrics = order.get(SUPABASE_TABLES.order_metrics) or {}
+    return proforma.get("grand_total") or 0, metrics.get("total_sqft") or 0
+
+
+def build_series(
+    rows: list, edges: list, granularity: str, by_product: bool = False
+) -> list:
+    """
+    Bucket order rows in one pass: each created_at is placed with a binary
+    search over the bucket edges, no per-bucket filtering.
+    """
+    edge_times = [ist_midnight(edge).timestamp() for edge in edges]
+    buckets = [
+        {
+            "bucket": edge.isoformat(),
+            "order_count": 0,
+            "cancelled_count": 0,
+            "delivered_count": 0,
+            "revenue": 0.0,
+            "total_sqft": 0.0,
+        }
+        for edge in edges[:-1]
+    ]
+    for order in rows:
+        created = datetime.fromisoformat(order["created_at"]).timestamp()
+        index = bisect_right(edge_times, created) - 1
+        if index < 0 or index >= len(buckets):
+            continue
+        bucket = buckets[index]
+        bucket["order_count"] += 1
+        status = order.get("status")
+        if status == "cancelled":
+            bucket["cancelled_count"] += 1
+            continue
+        if status == "delivered":
+            bucket["delivered_count"] += 1
+        revenue, sqft = _order_values(order, by_product)
+        bucket["revenue"] += revenue
+        bucket["total_sqft"] += sqft
+
+    for bucket in buckets:
+        bucket["revenue"] = round(bucket["revenue"], 2)
+        bucket["total_sqft"] = round(bucket["total_sqft"], 2)
+    return buckets
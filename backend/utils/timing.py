@@ -0,0 +1,202 @@
+import json
+import logging
+import random
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from uuid import uuid4
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from .constants import LOG_LEVEL, LOG_DEBUG_SAMPLE_RATE
+from .metrics import record_request
+
+
+def _build_logger() -> logging.Logger:
+    # Own handler so JSON lines reach CloudWatch whatever the Lambda runtime
+    # configured on the root logger
+    log = logging.getLogger("mirror")
+    if not log.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        log.addHandler(handler)
+    log.setLevel(LOG_LEVEL)
+    log.propagate = False
+    return log
+
+
+logger = _build_logger()
+
+
+def log_json(event: str, **fields):
+    logger.info(json.dumps({"event": event, **fields}, default=str))
+
+
+def debug_sampled(message: str, payload=None):
+    """
+    Debug log that is only formatted for LOG_DEBUG_SAMPLE_RATE of calls, so
+    large payloads cost nothing when debug logging is off.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if random.random() >= LOG_DEBUG_SAMPLE_RATE:
+        return
+    timer = _current_timer.get()
+    logger.debug(
+        json.dumps(
+            {
+                "event": "debug",
+                "request_id": timer.request_id if timer else None,
+                "message": message,
+                "payload": payload,
+            },
+            default=str,
+        )
+    )
+
+
+class RequestTimer:
+    def __init__(self, request_id: str = None):
+        self.request_id = request_id or uuid4().hex
+        self.started = time.perf_counter()
+        self.spans = []
+
+    def add(self, name: str, duration_ms: float):
+        self.spans.append((name, duration_ms))
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self) -> str:
+        entries = [f"{name};dur={duration:.1f}" for name, duration in self.spans]
+        entries.append(f"total;dur={self.elapsed_ms():.1f}")
+        return ", ".join(entries)
+
+
+_current_timer: ContextVar = ContextVar("request_timer", default=None)
+
+
+def start_request_timer(request_id: str = None) -> RequestTimer:
+    timer = RequestTimer(request_id)
+    _current_timer.set(timer)
+    return timer
+
+
+def current_timer() -> RequestTimer:
+    return _current_timer.get()
+
+
+# The StackSampler of the request being profiled, see utils.profiler
+_current_sampler: ContextVar = ContextVar("stack_sampler", default=None)
+
+
+def set_current_sampler(sampler):
+    return _current_sampler.set(sampler)
+
+
+def reset_current_sampler(token):
+    _current_sampler.reset(token)
+
+
+def profiled_call(func, *args, **kwargs):
+    """
+    Call func, on a threadpool thread, and let the sampler of the request
+    being profiled (if any) sample that thread while it runs.
+    """
+    sampler = _current_sampler.get()
+    if sampler is None:
+        return func(*args, **kwargs)
+    sampler.add_thread()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        sampler.remove_thread()
+
+
+def record_span(name: str, started: float):
+    """
+    Attach a span that began at time.perf_counter() value `started`, for
+    blocks too long to wrap in `with span(...)`.
+    """
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.add(name, (time.perf_counter() - started) * 1000)
+
+
+@contextmanager
+def span(name: str):
+    """
+    Time a block and attach it to the current request, e.g.
+    `with span("db.orders"):`. A no-op outside a request.
+    """
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, (time.perf_counter() - started) * 1000)
+
+
+class RequestTimingMiddleware:
+    """
+    Starts the request timer, adds Server-Timing and X-Request-ID to the
+    response and, once the body has been sent, feeds the request into the
+    metrics registry and logs it as a "request" event.
+
+    Pure ASGI like AuthMiddleware, so streamed bodies pass straight through.
+    Server-Timing is fixed when the headers go out; the logged duration
+    also covers sending the body.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        aws_context = scope.get("aws.context")
+        request_id = Headers(scope=scope).get("x-request-id") or getattr(
+            aws_context, "aws_request_id", None
+        )
+        timer = start_request_timer(request_id)
+        status = 500
+        content_length = None
+
+        async def send_timed(message):
+            nonlocal status, content_length
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(raw=message["headers"])
+                content_length = headers.get("content-length")
+                headers["Server-Timing"] = timer.server_timing()
+                headers["X-Request-ID"] = timer.request_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            duration_ms = timer.elapsed_ms()
+            route = getattr(scope.get("route"), "path", "unmatched")
+            emf = record_request(
+                route,
+                scope["method"],
+                duration_ms,
+                int(content_length) if content_length else None,
+                timer.spans,
+            )
+            log_json(
+                "request",
+                request_id=timer.request_id,
+                method=scope["method"],
+                path=scope["path"],
+                status=status,
+                duration_ms=round(duration_ms, 1),
+                spans=[{"name": name, "ms": round(ms, 1)} for name, ms in timer.spans],
+                **emf,
+            )
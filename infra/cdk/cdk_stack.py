@@ -11,6 +11,25 @@ import os
 # Default to ap-south-1 if not set
 DEFAULT_REGION = os.getenv("DEFAULT_AWS_REGION", "ap-south-1")
 
+# Types API Gateway passes through as binary: base64 bodies from Mangum are
+# decoded when the request's Accept matches one of these (API Gateway does not
+# look at the response's Content-Type). The documents, and the compressed
+# JSON, NDJSON, CSV, metrics text and docs page the app returns to such
+# requests; the app reads the same list from API_BINARY_MEDIA_TYPES and leaves
+# responses to other requests uncompressed. Request bodies of these types
+# reach the Lambda base64 encoded, which Mangum decodes.
+BINARY_MEDIA_TYPES = [
+    "application/json",
+    "application/x-ndjson",
+    "text/csv",
+    "text/plain",
+    "text/html",
+    "application/pdf",
+    "application/octet-stream",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "application/zip",
+]
+
 
 class CdkStack(Stack):
     def __init__(self, scope: Construct, construct_id: str, **kwargs):
@@ -26,11 +45,21 @@ class CdkStack(Stack):
                 "../backend",
                 file="Dockerfile",
             ),
+            # Size from render_memory logs, see benchmarks/render_memory.py
             memory_size=1024,
             timeout=Duration.seconds(30),
             environment={
                 "SUPABASE_URL": os.getenv("SUPABASE_URL", ""),
                 "SUPABASE_ANON_KEY": os.getenv("SUPABASE_ANON_KEY", ""),
+                "SUPABASE_SERVICE_ROLE_KEY": os.getenv("SUPABASE_SERVICE_ROLE_KEY", ""),
+                "PDF_OPTIMIZE_PRESET": os.getenv("PDF_OPTIMIZE_PRESET", "ebook"),
+                "DOCUMENT_STORAGE_BUCKET": os.getenv(
+                    "DOCUMENT_STORAGE_BUCKET", "documents"
+                ),
+                "RENDER_MEMORY_SAMPLE_RATE": os.getenv(
+                    "RENDER_MEMORY_SAMPLE_RATE", "0"
+                ),
+                "API_BINARY_MEDIA_TYPES": ",".join(BINARY_MEDIA_TYPES),
             },
         )
 
@@ -53,11 +82,7 @@ class CdkStack(Stack):
             "MirrorManagementApi",
             rest_api_name="Mirror Management API",
             description="API for Mirror Management System",
-            binary_media_types=[
-                "application/pdf",
-                "application/octet-stream",
-                "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            ],
+            binary_media_types=BINARY_MEDIA_TYPES,
             default_cors_preflight_options=apigw.CorsOptions(
                 allow_origins=apigw.Cors.ALL_ORIGINS,
                 allow_methods=apigw.Cors.ALL_METHODS,
@@ -194,3 +219,11 @@ class CdkStack(Stack):
             excel_lambda_integration,
             method_responses=excel_method_response,
         )
+
+        # The CORS preflight mock integration renders its response from a
+        # text template, keep it text whatever the preflight's Accept says
+        for method in api.methods:
+            if method.http_method == "OPTIONS":
+                method.node.default_child.add_property_override(
+                    "Integration.ContentHandling", "CONVERT_TO_TEXT"
+                )
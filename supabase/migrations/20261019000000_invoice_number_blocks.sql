@@ -0,0 +1,52 @@
+-- Invoice number blocks for utils.invoice_numbers (INVOICE_GAP_POLICY=release)
+-- and /latest-invoice-number?peek=true, which needs this migration under
+-- either policy. Every number comes from get_next_invoice_number itself, so
+-- numbers issued from blocks are formatted exactly like the ones it returns
+-- one at a time.
+
+drop function if exists format_invoice_number(text, int);
+
+-- Reserves block_size numbers and returns them, formatted, in order. The
+-- first get_next_invoice_number call locks the fy's invoice_counters row
+-- until the transaction ends, so the block is contiguous.
+drop function if exists reserve_invoice_numbers(text, int);
+create function reserve_invoice_numbers(fy_param text, block_size int)
+returns table (number int, invoice_number text) language plpgsql as $$
+begin
+  for i in 1..block_size loop
+    invoice_number := get_next_invoice_number(fy_param);
+    select c.last_number into number from invoice_counters c where c.fy = fy_param;
+    return next;
+  end loop;
+end;
+$$;
+
+-- Gives back the tail of a block, only if nothing was reserved after it
+create or replace function release_invoice_numbers(
+  fy_param text, first_number int, last_number int
+) returns boolean language sql as $$
+  with released as (
+    update invoice_counters c set last_number = first_number - 1
+    where c.fy = fy_param and c.last_number = release_invoice_numbers.last_number
+    returning 1
+  )
+  select exists (select 1 from released);
+$$;
+
+-- What the next get_next_invoice_number call would return. The call is made
+-- in a subtransaction that is rolled back, which undoes the increment and
+-- releases the row lock; the returned value survives in the variable.
+create or replace function peek_invoice_number(fy_param text)
+returns text language plpgsql as $$
+declare
+  next_number text;
+begin
+  begin
+    next_number := get_next_invoice_number(fy_param);
+    raise exception using errcode = 'P0001', message = 'peek_invoice_number';
+  exception when raise_exception then
+    null;
+  end;
+  return next_number;
+end;
+$$;
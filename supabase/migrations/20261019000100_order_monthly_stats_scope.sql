@@ -0,0 +1,27 @@
+-- order_monthly_stats, one row per visibility scope and IST calendar month,
+-- see backend/utils/stats_rollup.py. The rows are derived data, rebuilt by
+-- /stats for a scope that has none, so the old per-month table is dropped.
+-- Only the service role reads and writes it: RLS is on with no policies.
+
+drop table if exists order_monthly_stats;
+
+create table order_monthly_stats (
+  scope text not null,
+  month_key text not null,
+  order_count int not null default 0,
+  revenue numeric not null default 0,
+  delivered_count int not null default 0,
+  pending_count int not null default 0,
+  total_sqft numeric not null default 0,
+  total_weight numeric not null default 0,
+  closed boolean not null default false,
+  scanned_until timestamptz,
+  scanned_until_id bigint,
+  refreshed_at timestamptz,
+  primary key (scope, month_key)
+);
+
+alter table order_monthly_stats enable row level security;
+
+-- The delta scan's keyset
+create index if not exists orders_updated_at_id_idx on orders (updated_at, id);
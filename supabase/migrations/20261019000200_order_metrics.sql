@@ -0,0 +1,28 @@
+-- order_metrics, the derived metrics of one order per row, see
+-- backend/utils/order_metrics.py. INVOICE_ORDER_SELECT embeds
+-- order_metrics(formula_version,items) and /stats reads the totals, so
+-- PostgREST rejects both without these columns. Columns are added one by one
+-- so a database with an earlier order_metrics table is brought up to date.
+
+create table if not exists order_metrics (
+  order_id bigint primary key references orders (id) on delete cascade
+);
+
+alter table order_metrics
+  add column if not exists formula_version int not null default 0,
+  add column if not exists item_count int not null default 0,
+  add column if not exists total_qty int not null default 0,
+  add column if not exists total_weight numeric not null default 0,
+  add column if not exists total_sqft numeric not null default 0,
+  add column if not exists items jsonb not null default '[]'::jsonb,
+  add column if not exists updated_at timestamptz not null default now();
+
+-- POST /orders/{order_id}/metrics writes rows with the caller's client: a row
+-- is visible and writable exactly when its order is, under orders' own RLS
+alter table order_metrics enable row level security;
+
+drop policy if exists order_metrics_follow_orders on order_metrics;
+create policy order_metrics_follow_orders on order_metrics
+  for all to authenticated
+  using (exists (select 1 from orders o where o.id = order_metrics.order_id))
+  with check (exists (select 1 from orders o where o.id = order_metrics.order_id));